@@ -0,0 +1,101 @@
+# Filename: synthetic_eog.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Synthetic LOC/ROC generator for tests and benchmarks — saccades, slow rolling
+#              eye movements and stage-dependent background noise on a configurable night.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import numpy as np
+
+# =====================================================================
+# Constants
+# =====================================================================
+EPOCH_SEC = 30
+
+# One ~90 min cycle of 30 s epochs (W, N1, N2, N3, N2, REM), repeated to fill the night
+CYCLE = [0] * 4 + [1] * 10 + [2] * 40 + [3] * 40 + [2] * 30 + [4] * 56
+
+# Background noise std [µV] and slow-wave amplitude [µV] per stage (0: W, 1: N1, 2: N2, 3: N3, 4: REM)
+NOISE_STD   = {0: 12.0, 1: 8.0, 2: 9.0, 3: 10.0, 4: 7.0}
+DELTA_AMP   = {0: 0.0,  1: 5.0, 2: 15.0, 3: 45.0, 4: 3.0}
+
+# Event rates per second, per stage
+SACCADE_RATE = {0: 0.3, 1: 0.02, 2: 0.0, 3: 0.0, 4: 0.6}
+ROLLING_RATE = {0: 0.02, 1: 0.08, 2: 0.01, 3: 0.0, 4: 0.0}
+
+# =====================================================================
+# Function
+# =====================================================================
+def synthetic_eog(
+        duration_s: float = 3600.0,
+        fs:         float = 128.0,
+        hypno:      np.ndarray | None = None,
+        seed:       int = 0,
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Generate a synthetic EOG night with a matching 30 s hypnogram.
+
+    - **Saccades**: fast anti-phase deflections on LOC/ROC (0.1–0.4 s, 50–250 µV), mostly in REM and W.
+    - **Slow rolling movements**: anti-phase half-sine excursions (1–4 s, 40–100 µV), mostly in N1 and W.
+    - **Background**: stage-dependent white noise plus in-phase slow-wave activity (strongest in N3).
+
+    Parameters
+    ----------
+    duration_s : float
+        Length of the night in seconds. Default is **3600 [s]**.
+    fs : float
+        Sampling frequency in Hz. Default is **128 [Hz]**.
+    hypno : np.ndarray | None
+        Integer hypnogram (0: W, 1: N1, 2: N2, 3: N3, 4: REM), one value per 30 s epoch. \\
+        Default is **None** (repeat ``CYCLE`` to cover ``duration_s``).
+    seed : int
+        Seed for the random generator. Default is **0**.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        ``(loc, roc, hypno_int)`` — signals in µV (float64) and the hypnogram used.
+    """
+    rng = np.random.default_rng(seed)
+    n   = int(round(duration_s * fs))
+    n_epochs = int(np.ceil(n / (EPOCH_SEC * fs)))
+
+    if hypno is None:
+        hypno = np.resize(np.asarray(CYCLE), n_epochs)
+    hypno = np.asarray(hypno, dtype=int)
+    if len(hypno) < n_epochs:
+        raise ValueError(f"hypno covers {len(hypno)} epochs, need {n_epochs} for {duration_s} s.")
+
+    stage = np.repeat(hypno, int(EPOCH_SEC * fs))[:n]
+    t     = np.arange(n) / fs
+
+    # --- 1) Background: stage-dependent white noise + in-phase slow waves ---
+    noise_std = np.vectorize(NOISE_STD.get)(stage)
+    delta_amp = np.vectorize(DELTA_AMP.get)(stage)
+    slow_wave = delta_amp * np.sin(2 * np.pi * 1.2 * t + rng.uniform(0, 2 * np.pi))
+    loc = slow_wave + rng.normal(0, 1, n) * noise_std
+    roc = slow_wave + rng.normal(0, 1, n) * noise_std
+
+    # --- 2) Eye movements (anti-phase on LOC/ROC) ---
+    def _add_events(rate: dict, width_s: tuple[float, float], amp: tuple[float, float], shape) -> None:
+        for s, r in rate.items():
+            if r <= 0:
+                continue
+            idx = np.flatnonzero(stage == s)
+            if len(idx) == 0:
+                continue
+            n_events = rng.poisson(r * len(idx) / fs)
+            for onset in rng.choice(idx, size=n_events):
+                width = int(rng.uniform(*width_s) * fs)
+                end   = min(n, onset + width)
+                bump  = rng.uniform(*amp) * shape(end - onset) * rng.choice([-1, 1])
+                loc[onset:end] += bump
+                roc[onset:end] -= bump
+
+    _add_events(SACCADE_RATE, (0.1, 0.4), (50, 250), np.hanning)
+    _add_events(ROLLING_RATE, (1.0, 4.0), (40, 100), lambda m: np.sin(np.linspace(0, np.pi, m)))
+
+    return loc, roc, hypno[:n_epochs]
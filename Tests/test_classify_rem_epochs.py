@@ -0,0 +1,94 @@
+# Filename: test_classify_rem_epochs.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks that the vectorised classify_rem_epochs_Umaer gives exactly the same
+#              sub-epoch table as the original while-loop / DataFrame.apply implementation.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from analysis.detect_em import classify_rem_epochs_Umaer, sweep_col
+
+# =====================================================================
+# Reference (original loop implementation)
+# =====================================================================
+def _classify_reference(df, loc, hypno_int, sf, epoch_len=30, sub_epoch_len=4.0, phasic_dur_thresh=1.0):
+    total_duration = len(loc) / sf
+    rem_epoch_indices = set(np.where(hypno_int == 4)[0])
+
+    sub_epochs = []
+    t = 0.0
+    while t + sub_epoch_len <= total_duration:
+        parent_epoch = int(t // epoch_len)
+        if parent_epoch in rem_epoch_indices:
+            sub_epochs.append({'SubEpochStart': t, 'SubEpochEnd': t + sub_epoch_len,
+                               'EpochIdx': parent_epoch, 'EpochType': 'Unclassified'})
+        t = round(t + sub_epoch_len, 6)
+
+    result_df = pd.DataFrame(sub_epochs)
+    if result_df.empty:
+        return result_df
+
+    def classify_sub_epoch(row):
+        t0, t1 = row["SubEpochStart"], row["SubEpochEnd"]
+        ems_in_epoch = df[(df['Peak'] >= t0) & (df['Peak'] < t1)]
+        return 'Phasic' if ems_in_epoch['Duration'].sum() >= phasic_dur_thresh else 'Tonic'
+
+    result_df['EpochType'] = result_df.apply(classify_sub_epoch, axis=1)
+    return result_df.reset_index(drop=True)
+
+
+def _random_night(seed: int, n_epochs: int = 120, sf: float = 128, n_em: int = 600):
+    rng   = np.random.default_rng(seed)
+    hypno = rng.choice([0, 1, 2, 3, 4], size=n_epochs, p=[0.1, 0.1, 0.3, 0.2, 0.3])
+    n     = int(n_epochs * 30 * sf) - int(rng.integers(0, 200))
+    start = np.sort(rng.integers(0, n - 64, n_em)) / sf
+    dur   = rng.integers(4, 128, n_em) / sf
+    peak  = start + dur / 2
+    peak[:20] = np.round(peak[:20] / 4) * 4   # peaks exactly on sub-epoch edges
+    df = pd.DataFrame({
+        "Start": start, "Peak": peak, "End": start + dur, "Duration": dur,
+        "MeanAbsValPeak": rng.uniform(20, 200, n_em),
+        "EM_Type": np.where(dur > 0.5, "SEM", "REM"),
+    })
+    return df, np.zeros(n), hypno
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_identical_to_loop_implementation():
+    for seed in range(5):
+        for sub_epoch_len, thresh in [(4.0, 1.0), (3.0, 0.5), (2.5, 0.75)]:
+            df, loc, hypno = _random_night(seed)
+            expected = _classify_reference(df, loc, hypno, 128, sub_epoch_len=sub_epoch_len, phasic_dur_thresh=thresh)
+            got = classify_rem_epochs_Umaer(df, loc, loc, hypno, 128, sub_epoch_len=sub_epoch_len, phasic_dur_thresh=thresh)
+            pdt.assert_frame_equal(got, expected)
+
+
+def test_threshold_sweep_matches_single_runs():
+    df, loc, hypno = _random_night(1)
+    thresholds = [0.25, 0.5, 1.0, 1.5]
+    swept = classify_rem_epochs_Umaer(df, loc, loc, hypno, 128, sweep_phasic_thresh=thresholds)
+    for t in thresholds:
+        single = classify_rem_epochs_Umaer(df, loc, loc, hypno, 128, phasic_dur_thresh=t)
+        np.testing.assert_array_equal(swept[sweep_col("EpochType", t)].to_numpy(), single["EpochType"].to_numpy())
+
+
+def test_no_rem():
+    df, loc, hypno = _random_night(0)
+    got = classify_rem_epochs_Umaer(df, loc, loc, np.zeros_like(hypno), 128)
+    assert got.empty
+
+
+if __name__ == "__main__":
+    test_identical_to_loop_implementation()
+    test_threshold_sweep_matches_single_runs()
+    test_no_rem()
+    print("OK")
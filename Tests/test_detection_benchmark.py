@@ -0,0 +1,258 @@
+# Filename: test_detection_benchmark.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Micro-benchmarks for the detection stage on synthetic EOG — detect_rem_jaec
+#              (per sub-step), detect_em and classify_rem_epochs_Umaer. Results are saved
+#              as JSON so runs on different commits can be compared.
+#
+# Usage:
+#   python -m Tests.test_detection_benchmark                       # 8 h night, 3 repeats
+#   python -m Tests.test_detection_benchmark --minutes 60 --fs 256 # 1 h night generated at 256 Hz
+#   python -m Tests.test_detection_benchmark --compare             # flag regressions vs the previous JSON
+#   python -m pytest Tests/test_detection_benchmark.py             # quick smoke run
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import copy
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from extract_rems import detect_rem_jaec
+from preprocessing.resample import resample_signal
+from analysis.detect_em import detect_em, classify_rem_epochs_Umaer
+from Tests.synthetic_eog import synthetic_eog
+
+# =====================================================================
+# Constants
+# =====================================================================
+BENCH_DIR  = Path("reports") / "benchmarks"
+DETECT_FS  = 128                     # detect_rem_jaec is hard-wired to 128 Hz
+JAEC_STEPS = ["dtcwt_forward", "angle_mask", "dtcwt_inverse", "threshold", "peak_base_search", "rem_results"]
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def _stats(samples: list[float]) -> dict[str, float]:
+    return {
+        "min":    float(np.min(samples)),
+        "median": float(np.median(samples)),
+        "mean":   float(np.mean(samples)),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# =====================================================================
+# Functions
+# =====================================================================
+def run_detection_benchmark(
+        minutes: float = 480.0,
+        fs:      float = DETECT_FS,
+        repeats: int = 3,
+        seed:    int = 0,
+        dtype:   type | None = None,
+        ) -> dict:
+    """
+    Time the detection stage on a synthetic night.
+
+    Parameters
+    ----------
+    minutes : float
+        Length of the synthetic night. Default is **480 [min]**.
+    fs : float
+        Sampling rate the night is generated at. Signals are resampled to 128 Hz
+        (timed as ``resample``) before detection if this differs. Default is **128 [Hz]**.
+    repeats : int
+        Number of timed repeats per step. Default is **3**.
+    seed : int
+        Seed for :func:`synthetic_eog`. Default is **0**.
+    dtype : type | None
+        Working precision passed to the detection (e.g. ``np.float32``). Default is **None**.
+
+    Returns
+    -------
+    dict
+        ``{"meta": {...}, "timings": {step: {"min", "median", "mean"}}}`` with times in seconds.
+    """
+    loc, roc, hypno = synthetic_eog(duration_s=minutes * 60, fs=fs, seed=seed)
+
+    resample_times = []
+    if fs != DETECT_FS:
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            loc_r = resample_signal(loc, fs, DETECT_FS)
+            roc_r = resample_signal(roc, fs, DETECT_FS)
+            resample_times.append(time.perf_counter() - t0)
+        loc, roc = loc_r, roc_r
+
+    # Same trimming as the pipeline (multiple of 2^14 for the 14-level DTCWT)
+    hypno_up = np.repeat(hypno, DETECT_FS * 30)
+    trim     = (min(len(loc), len(hypno_up)) // 2 ** 14) * 2 ** 14
+    if trim == 0:
+        raise ValueError("Synthetic night too short for dtcwt — use at least ~3 minutes.")
+    loc, roc, hypno_up = loc[:trim], roc[:trim], hypno_up[:trim]
+
+    samples: dict[str, list[float]] = {k: [] for k in JAEC_STEPS + ["detect_rem_jaec", "detect_em", "classify_rem_epochs_Umaer"]}
+    if resample_times:
+        samples["resample"] = resample_times
+
+    for _ in range(repeats):
+        steps = {}
+        t0 = time.perf_counter()
+        detect_rem_jaec(loc, roc, hypno_up, method='ssc_threshold', dtype=dtype, timings=steps)
+        samples["detect_rem_jaec"].append(time.perf_counter() - t0)
+        for k in JAEC_STEPS:
+            samples[k].append(steps.get(k, 0.0))
+
+        t0 = time.perf_counter()
+        em_df = detect_em(loc, roc, hypno_up, fs=DETECT_FS, dtype=dtype)
+        samples["detect_em"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        classify_rem_epochs_Umaer(em_df, loc, roc, hypno, sf=DETECT_FS)
+        samples["classify_rem_epochs_Umaer"].append(time.perf_counter() - t0)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit":    _git_commit(),
+            "minutes":   minutes,
+            "fs":        fs,
+            "n_samples": int(trim),
+            "n_events":  int(len(em_df)),
+            "repeats":   repeats,
+            "dtype":     np.dtype(dtype).name if dtype is not None else "float64",
+            "python":    platform.python_version(),
+            "numpy":     np.__version__,
+            "machine":   platform.machine(),
+        },
+        "timings": {k: _stats(v) for k, v in samples.items()},
+    }
+
+
+def save_benchmark(results: dict, out_dir: Path = BENCH_DIR) -> Path:
+    """Save benchmark results as ``detection_<timestamp>_<commit>.json`` in ``out_dir``."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = results["meta"]["timestamp"].replace(":", "").replace("-", "")
+    out_path = out_dir / f"detection_{stamp}_{results['meta']['commit']}.json"
+    out_path.write_text(json.dumps(results, indent=2))
+    return out_path
+
+
+def compare_benchmarks(current: dict, baseline: dict, tolerance: float = 0.25) -> list[str]:
+    """
+    Compare median step times against a baseline run.
+
+    Returns one message per step that is more than ``tolerance`` (fraction) slower than the baseline.
+    Runs with a different night length, sampling rate or dtype are not comparable and raise ValueError.
+    """
+    keys = ("minutes", "fs", "dtype")
+    if any(current["meta"][k] != baseline["meta"][k] for k in keys):
+        raise ValueError(f"Benchmarks not comparable — {keys} differ: "
+                         f"{[current['meta'][k] for k in keys]} vs {[baseline['meta'][k] for k in keys]}")
+
+    regressions = []
+    for step, cur in current["timings"].items():
+        base = baseline["timings"].get(step)
+        if base is None or base["median"] <= 0:
+            continue
+        ratio = cur["median"] / base["median"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{step}: {base['median']:.3f}s -> {cur['median']:.3f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def print_benchmark(results: dict) -> None:
+    """Print the timing table of a benchmark run."""
+    meta = results["meta"]
+    print(f"\nDetection benchmark — {meta['minutes']:g} min @ {meta['fs']:g} Hz, "
+          f"{meta['n_events']} events, {meta['dtype']}, commit {meta['commit']}")
+    for step, st in results["timings"].items():
+        print(f"  {step:<28} median {st['median']:8.3f} s   min {st['min']:8.3f} s")
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_detection_benchmark(tmp_path):
+    results = run_detection_benchmark(minutes=100, repeats=1)   # first REM period starts at ~62 min
+    print_benchmark(results)
+    timings = results["timings"]
+    assert results["meta"]["n_events"] > 0
+    for step in JAEC_STEPS + ["detect_rem_jaec", "detect_em", "classify_rem_epochs_Umaer"]:
+        assert timings[step]["median"] > 0, step
+
+    # One repeat: the sub-steps are parts of the same detect_rem_jaec call
+    assert sum(timings[step]["median"] for step in JAEC_STEPS) <= timings["detect_rem_jaec"]["median"]
+
+    # Stored baseline vs a copy with one step twice as slow
+    baseline = json.loads(save_benchmark(results, tmp_path).read_text())
+    assert compare_benchmarks(results, baseline) == []
+
+    slowed = copy.deepcopy(results)
+    slowed["timings"]["dtcwt_forward"]["median"] *= 2
+    regressions = compare_benchmarks(slowed, baseline)
+    assert len(regressions) == 1 and regressions[0].startswith("dtcwt_forward:")
+    assert compare_benchmarks(slowed, baseline, tolerance=1.5) == []
+
+    # Runs on another night length / rate / dtype are not comparable
+    for key, value in [("minutes", 480.0), ("fs", 256.0), ("dtype", "float32")]:
+        other = copy.deepcopy(results)
+        other["meta"][key] = value
+        with pytest.raises(ValueError, match="not comparable"):
+            compare_benchmarks(other, baseline)
+
+# =====================================================================
+# Entry point
+# =====================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the EM detection stage on synthetic EOG.")
+    parser.add_argument("--minutes", type=float, default=480.0, help="Night length in minutes (default: 480)")
+    parser.add_argument("--fs", type=float, default=DETECT_FS, help="Generation sampling rate in Hz (default: 128)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repeats per step (default: 3)")
+    parser.add_argument("--float32", action="store_true", help="Run detection in float32")
+    parser.add_argument("--compare", action="store_true", help="Compare against the most recent JSON in --out-dir")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown fraction (default: 0.25)")
+    parser.add_argument("--out-dir", type=str, default=str(BENCH_DIR))
+    args = parser.parse_args()
+
+    out_dir  = Path(args.out_dir)
+    previous = sorted(out_dir.glob("detection_*.json")) if out_dir.is_dir() else []
+
+    results = run_detection_benchmark(
+        minutes=args.minutes, fs=args.fs, repeats=args.repeats,
+        dtype=np.float32 if args.float32 else None,
+    )
+    print_benchmark(results)
+    print(f"\nSaved: {save_benchmark(results, out_dir)}")
+
+    if args.compare:
+        if not previous:
+            print("No previous benchmark to compare against.")
+        else:
+            regressions = compare_benchmarks(results, json.loads(previous[-1].read_text()), args.tolerance)
+            print(f"Compared against {previous[-1].name}")
+            for msg in regressions:
+                print(f"  REGRESSION  {msg}")
+            if regressions:
+                sys.exit(1)
+            print("  No regressions.")
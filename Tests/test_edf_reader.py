@@ -0,0 +1,137 @@
+# Filename: test_edf_reader.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the channel-selective EDF reader against mne.io.read_raw_edf on small
+#              synthetic EDF files with DCSM-style EOG labels and mixed sampling rates, and the
+#              EDF two-digit year pivot of the recording start (85-99 -> 19xx, 00-84 -> 20xx).
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from pathlib import Path
+
+import mne
+import numpy as np
+import pytest
+
+from preprocessing.edf_reader import read_edf_header, read_edf_signals, read_raw_eog
+from preprocessing.channel_standardization import build_rename_map
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def write_edf(path: Path, channels: list[tuple[str, int, np.ndarray]], record_duration: int = 1) -> None:
+    """
+    Write a minimal EDF file. ``channels`` holds ``(label, samples_per_record, signal_uV)``;
+    signals must cover the same number of whole records.
+    """
+    ns        = len(channels)
+    n_records = len(channels[0][2]) // channels[0][1]
+    phys_min, phys_max, dig_min, dig_max = -3200.0, 3200.0, -32768, 32767
+
+    def _pad(value, width: int) -> bytes:
+        return str(value).ljust(width)[:width].encode("ascii")
+
+    header = b"".join([
+        _pad("0", 8), _pad("X X X X", 80), _pad("Startdate 01-JAN-2020 X X X", 80),
+        _pad("01.01.20", 8), _pad("22.30.00", 8), _pad(256 * (ns + 1), 8), _pad("", 44),
+        _pad(n_records, 8), _pad(record_duration, 8), _pad(ns, 4),
+    ])
+    fields = [
+        [_pad(label, 16) for label, _, _ in channels],
+        [_pad("AgAgCl electrode", 80)] * ns,
+        [_pad("uV", 8)] * ns,
+        [_pad(phys_min, 8)] * ns, [_pad(phys_max, 8)] * ns,
+        [_pad(dig_min, 8)] * ns, [_pad(dig_max, 8)] * ns,
+        [_pad("HP:0.1Hz LP:70Hz", 80)] * ns,
+        [_pad(spr, 8) for _, spr, _ in channels],
+        [_pad("", 32)] * ns,
+    ]
+    header += b"".join(b"".join(f) for f in fields)
+
+    gain = (phys_max - phys_min) / (dig_max - dig_min)
+    digital = [np.round((sig - phys_min) / gain + dig_min).astype("<i2").reshape(n_records, spr)
+               for _, spr, sig in channels]
+    path.write_bytes(header + np.hstack(digital).tobytes())
+
+
+def _night(n_records: int, spr: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, 80, n_records * spr)
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_matches_mne_when_eog_has_max_rate(tmp_path):
+    n = 60
+    edf = tmp_path / "contiguous.edf"
+    write_edf(edf, [
+        ("EEG C3-M2", 128, _night(n, 128, 0)),
+        ("EOG V-M2",  256, _night(n, 256, 1)),
+        ("EOG H-M1",  256, _night(n, 256, 2)),
+        ("EMG chin",  64,  _night(n, 64, 3)),
+    ])
+
+    ref = mne.io.read_raw_edf(edf, preload=True, verbose=False)
+    ref.rename_channels(build_rename_map(ref.ch_names))
+
+    raw = read_raw_eog(edf)
+    assert raw.ch_names == ["LOC", "ROC"]
+    assert raw.info["sfreq"] == ref.info["sfreq"] == 256
+    np.testing.assert_allclose(raw.get_data(), ref.get_data(picks=["LOC", "ROC"]), rtol=0, atol=1e-12)
+    assert raw.info["meas_date"] == ref.info["meas_date"]
+
+
+def test_keeps_native_rate_next_to_faster_channels(tmp_path):
+    n = 30
+    edf = tmp_path / "contiguous.edf"
+    loc, roc = _night(n, 256, 1), _night(n, 256, 2)
+    write_edf(edf, [
+        ("EOG V-M2", 256, loc),
+        ("ECG",      1024, _night(n, 1024, 4)),
+        ("EOG H-M1", 256, roc),
+    ])
+
+    header = read_edf_header(edf)
+    assert header.n_records == n and header.duration == n
+    np.testing.assert_array_equal(header.sfreqs, [256, 1024, 256])
+
+    signals, sfreqs, _ = read_edf_signals(edf)
+    assert sfreqs == {"LOC": 256.0, "ROC": 256.0}
+    assert signals["LOC"].flags["C_CONTIGUOUS"] and len(signals["LOC"]) == n * 256
+    np.testing.assert_allclose(signals["LOC"] * 1e6, loc, atol=0.1)   # 16-bit quantisation
+    np.testing.assert_allclose(signals["ROC"] * 1e6, roc, atol=0.1)
+
+
+def test_missing_eog_channels(tmp_path):
+    edf = tmp_path / "contiguous.edf"
+    write_edf(edf, [("EEG C3-M2", 128, _night(10, 128, 0))])
+    with pytest.raises(ValueError, match="Missing expected channels"):
+        read_edf_signals(edf)
+
+
+@pytest.mark.parametrize("date, year", [("01.01.84", 2084), ("31.12.85", 1985), ("15.06.69", 2069), ("01.01.20", 2020)])
+def test_start_year_uses_edf_pivot(tmp_path, date, year):
+    edf = tmp_path / "contiguous.edf"
+    write_edf(edf, [("EOG V-M2", 128, _night(10, 128, 0)), ("EOG H-M1", 128, _night(10, 128, 1))])
+    with open(edf, "r+b") as f:
+        f.seek(168)
+        f.write(date.encode("ascii"))
+
+    start = read_edf_header(edf).start
+    assert (start.year, start.strftime("%d.%m.%y %H.%M.%S")) == (year, f"{date} 22.30.00")
+    assert read_raw_eog(edf).info["meas_date"].year == year
+
+
+if __name__ == "__main__":
+    import tempfile
+    for test in (test_matches_mne_when_eog_has_max_rate, test_keeps_native_rate_next_to_faster_channels,
+                 test_missing_eog_channels):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    for date, year in (("01.01.84", 2084), ("31.12.85", 1985)):
+        with tempfile.TemporaryDirectory() as tmp:
+            test_start_year_uses_edf_pivot(Path(tmp), date, year)
+    print("OK")
@@ -1,6 +1,7 @@
 # Filename: test_eeg_signals_from_eog.py
 # Authors: Adam Klovborg & Rasmus Kleffel
 # Description: File to test extracting eeg signals from EM_detect by subtracting mask applied in extract_rems.py provided by our main supervisor Andreas Brink-Kjaer.
+#              The algorithm itself lives in analysis/eeg_from_eog.py.
 
 # =====================================================================
 # Imports
@@ -9,79 +10,42 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from preprocessing.extract_rems_n import extract_rems_from_edf
 import numpy as np
-import dtcwt
-from pathlib import Path
+import pytest
 
+from analysis.eeg_from_eog import eeg_signals_from_eog
 
 # =====================================================================
-# Constants
+# TEST
 # =====================================================================
-EXTRACT_REMS_DIR = Path("extracted_rems")
-EXTRACT_REMS_DIR.mkdir(parents=True, exist_ok=True)
+def test_subtract_removes_clean_signal():
+    rng = np.random.default_rng(0)
+    loc, roc = rng.normal(0, 20, (2, 4096))
+    loc_clean, roc_clean = 0.5 * loc, 0.25 * roc
 
+    loc_eeg, roc_eeg = eeg_signals_from_eog(loc, roc, loc_clean, roc_clean, method='subtract')
+    np.testing.assert_allclose(loc_eeg, loc - loc_clean)
+    np.testing.assert_allclose(roc_eeg, roc - roc_clean)
 
-def eeg_signals_from_eog(loc: np.ndarray, roc:np.ndarray,loc_clean: np.ndarray, roc_clean: np.ndarray, method: str = 'subtract')-> tuple[np.ndarray, np.ndarray]:
 
-    """
-    Extract EEG signals by removing EOG activity from LOC and ROC signals.
+def test_mask_keeps_length():
+    rng = np.random.default_rng(1)
+    loc, roc = rng.normal(0, 20, (2, 2 ** 14))
 
-    Parameters
-    ----------
-    loc : np.ndarray
-        Raw LOC signal in µV.
-    roc : np.ndarray
-        Raw ROC signal in µV.
-    loc_clean : np.ndarray
-        EOG-filtered LOC signal in µV.
-    roc_clean : np.ndarray
-        EOG-filtered ROC signal in µV.
-    method : Literal['subtract', 'mask'], optional
-        Method used to extract EEG signal.
-        - 'subtract' : Subtracts the EOG-filtered signal from the raw signal.
-        - 'mask'     : Reconstructs signal using the inverse DTCWT gain mask.
-        Default is 'subtract'.
+    loc_eeg, roc_eeg = eeg_signals_from_eog(loc, roc, loc, roc, method='mask')
+    assert loc_eeg.shape == loc.shape and roc_eeg.shape == roc.shape
 
-    Returns
-    -------
-    tuple[np.ndarray, np.ndarray]
-        loc_eeg : EEG-like signal extracted from LOC in µV.
-        roc_eeg : EEG-like signal extracted from ROC in µV.
-    """
 
+def test_invalid_inputs():
+    x = np.zeros(16)
+    with pytest.raises(ValueError):
+        eeg_signals_from_eog(x, np.zeros(8), x, x)
+    with pytest.raises(ValueError):
+        eeg_signals_from_eog(x, x, x, x, method='bandpass')
 
-    # --- Validate inputs --- 
 
-    if not isinstance (loc, np.ndarray) or not isinstance (roc, np.ndarray): 
-        raise TypeError ("loc and roc must me numpy arrays.")
-    if loc.shape != roc.shape:
-        raise ValueError (f"loc and roc must be the same shape. loc shape:{loc.shape}\\roc shape: {roc.shape}")
-    if method not in ('subtract', 'mask'):
-        raise ValueError (f"method must be either 'mask' or 'subtract', got {method}")
-
-    # --- Extract EEG singals ---
-
-    dtcwt_transform = dtcwt.Transform1d(biort='near_sym_b', qshift='qshift_b')
-
-
-    if method == 'subtract':
-
-        loc_eeg = loc - loc_clean
-        roc_eeg = roc - roc_clean
-
-    elif method == 'mask': 
-        
-        inverted_mask = [1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1] # Inverse of mask in `extract_rems.py`
-        
-        loc_dtcwt = dtcwt_transform.forward(loc, nlevels=14)
-        roc_dtcwt = dtcwt_transform.forward(roc, nlevels=14)
-
-        loc_eeg = dtcwt_transform.inverse(loc_dtcwt, inverted_mask)
-        roc_eeg = dtcwt_transform.inverse(roc_dtcwt, inverted_mask)
-
-    # --- Amplitude characteristic of the EEG signals ---
-    print(f"LOC EEG — min: {loc_eeg.min():.2f}, max: {loc_eeg.max():.2f}, mean: {loc_eeg.mean():.2f}")
-    print(f"ROC EEG — min: {roc_eeg.min():.2f}, max: {roc_eeg.max():.2f}, mean: {roc_eeg.mean():.2f}")
-
-    return loc_eeg, roc_eeg 
\ No newline at end of file
+if __name__ == "__main__":
+    test_subtract_removes_clean_signal()
+    test_mask_keeps_length()
+    test_invalid_inputs()
+    print("OK")
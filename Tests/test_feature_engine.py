@@ -0,0 +1,440 @@
+# Filename: test_feature_engine.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the shared feature loader in analysis/feat_report.py on small synthetic merged
+#              CSVs: every merged CSV is read once for all modules, the per-module CSVs match the
+#              per-module batch functions, and a process pool of workers gives the same tables with
+#              per-subject failures skipped. The feature cache (features/cache.py) serves valid
+#              cells without reading the merged CSV again and only recomputes cells that are missing
+#              or whose merged file content, group version or fs changed. All groups of a subject
+#              share one SubjectContext (and one EEG spectrogram), and the run-length hypnogram
+#              matches the per-sample stage column.
+#              The merged features table built in one float32 matrix equals the old pairwise outer merges,
+#              and integer and 4-decimal feature values are written to features.csv unchanged.
+#              Also checks the feature-group registry (features/registry.py) against the functions.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import dataclasses
+import shutil
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import feat_report
+from features.cache import CACHE_NAME
+from features.context import REM, SLEEP_CODES, STAGES, Hypnogram, SubjectContext
+from features.spectral import Spectrogram
+from features.registry import FEATURE_GROUPS, GROUPS, MODULE_CSVS, group_usecols, load_group, select_groups
+
+# =====================================================================
+# Helpers
+# =====================================================================
+FS = 16.0   # low rate keeps the synthetic nights small; passed as fs to every module
+
+
+def write_merged_csv(path: Path, minutes: int = 60, fs: float = FS, seed: int = 0) -> pd.DataFrame:
+    """Write a merged CSV with the columns of merge_all (GSSC stages, REM/EM events, sub-epochs, EEG)."""
+    rng = np.random.default_rng(seed)
+    n   = int(minutes * 60 * fs)
+    t   = np.arange(n) / fs
+
+    # 30-s GSSC epochs: W -> N1/N2/N3 -> REM cycles
+    cycle  = ["W"] * 2 + ["N1"] * 2 + ["N2"] * 8 + ["N3"] * 6 + ["N2"] * 4 + ["REM"] * 10
+    epochs = np.array((cycle * (minutes * 2 // len(cycle) + 1))[: minutes * 2])
+    epochs[rng.random(len(epochs)) < 0.05] = "W"
+    stage  = epochs[(t // 30).astype(int)]
+
+    probs = rng.dirichlet(np.ones(5), size=len(epochs))[(t // 30).astype(int)]
+
+    df = pd.DataFrame({
+        "time_sec": t,
+        "LOC":      rng.normal(0, 40, n),
+        "ROC":      rng.normal(0, 40, n),
+        "stage":    stage,
+        "prob_w":   probs[:, 0], "prob_n1": probs[:, 1], "prob_n2": probs[:, 2],
+        "prob_n3":  probs[:, 3], "prob_rem": probs[:, 4],
+    })
+
+    # REM events (event_*) and EMs (em_*), 1 s long
+    for prefix, n_events in [("event_", minutes // 2), ("em_", minutes)]:
+        starts = np.sort(rng.choice(np.arange(0, n - int(fs), int(fs)), n_events, replace=False))
+        ids    = np.full(n, np.nan)
+        for i, s in enumerate(starts):
+            ids[s:s + int(fs)] = i
+        inside = ~np.isnan(ids)
+        ev     = ids[inside].astype(int)
+        df[f"{prefix}event_id"]       = ids
+        df[f"{prefix}Peak"]           = np.where(inside, t[starts][np.nan_to_num(ids).astype(int)] + 0.5, np.nan)
+        df[f"{prefix}Duration"]       = np.where(inside, 1.0, np.nan)
+        for col in ["LOCAbsValPeak", "ROCAbsValPeak", "MeanAbsValPeak", "LOCAbsRiseSlope", "ROCAbsRiseSlope"]:
+            vals = rng.uniform(20, 200, n_events)
+            df[f"{prefix}{col}"] = np.nan
+            df.loc[inside, f"{prefix}{col}"] = vals[ev]
+        if prefix == "event_":
+            df["is_rem_event"] = inside
+        else:
+            types = rng.choice(["SEM", "REM"], n_events)
+            for col in ["LOCAbsFallSlope", "ROCAbsFallSlope"]:
+                vals = rng.uniform(20, 200, n_events)
+                df[f"em_{col}"] = np.nan
+                df.loc[inside, f"em_{col}"] = vals[ev]
+            df["em_EM_Type"]  = pd.Series(np.where(inside, types[np.nan_to_num(ids).astype(int)], None), dtype=object)
+            df["EM_Type"]     = df["em_EM_Type"]
+            df["is_em_event"] = inside
+            df["em_is_peak"]  = inside & (np.r_[True, np.diff(ids) != 0])
+            df["Start_x"]     = np.where(inside, t[starts][np.nan_to_num(ids).astype(int)], np.nan)
+
+    # Phasic/Tonic 4-s sub-epochs inside REM
+    sub   = (t // 4).astype(int)
+    kinds = rng.choice(["Phasic", "Tonic"], sub.max() + 1, p=[0.3, 0.7])
+    df["EpochType"] = pd.Series(np.where(stage == "REM", kinds[sub], None), dtype=object)
+
+    df["EEG_LOC"] = rng.normal(0, 20, n)
+    df["EEG_ROC"] = rng.normal(0, 20, n)
+
+    df.to_csv(path, index=False)
+    return df
+
+
+@pytest.fixture(scope="module")
+def merged_template(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("merged_csv_eog")
+    for i, minutes in enumerate([50, 70]):
+        write_merged_csv(folder / f"DCSM_{i + 1}_a_contiguous_eog_merged.csv", minutes=minutes, seed=i)
+    return folder
+
+
+@pytest.fixture
+def merged_dir(merged_template, tmp_path):
+    return Path(shutil.copytree(merged_template, tmp_path / "merged_csv_eog"))
+
+
+@pytest.fixture
+def features_dir(tmp_path, monkeypatch):
+    out = tmp_path / "features_csv"
+    monkeypatch.setattr(feat_report, "FEATURES_DIR", out)
+    return out
+
+
+@pytest.fixture
+def merged_reads(monkeypatch):
+    """Record the usecols of every full read of a merged CSV (header peeks are not counted)."""
+    reads = []
+    original = pd.read_csv
+
+    def counting_read_csv(path, *args, **kwargs):
+        if "_merged" in str(path) and kwargs.get("nrows") != 0:
+            reads.append((Path(path).name, kwargs.get("usecols")))
+        return original(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", counting_read_csv)
+    return reads
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_each_merged_csv_is_read_once(merged_dir, features_dir, merged_reads):
+    modules = list(MODULE_CSVS)
+    tables  = feat_report._run_modules(modules, merged_dir, fs=FS, pattern="*_merged.csv")
+
+    assert set(tables) == set(modules)
+    assert sorted(name for name, _ in merged_reads) == sorted(p.name for p in merged_dir.iterdir())
+    for name in modules:
+        csv_name = MODULE_CSVS[name]
+        assert (features_dir / csv_name).exists()
+        assert list(tables[name]["subject_id"]) == ["DCSM_1_a", "DCSM_2_a"]
+
+
+def test_matches_per_module_batch_functions(merged_dir, features_dir, tmp_path):
+    from features.bout_feats import extract_bout_features_batch
+    from features.eeg_feats import extract_eeg_features_batch
+    from features.eog_feats import extract_features_batch
+    from features.extra_feats import extract_extra_features_batch
+    from features.gssc_feats import extract_gssc_features_batch
+
+    batch = {
+        "eog":   extract_features_batch,
+        "gssc":  extract_gssc_features_batch,
+        "eeg":   extract_eeg_features_batch,
+        "bout":  extract_bout_features_batch,
+        "extra": extract_extra_features_batch,
+    }
+    feat_report._run_modules(list(batch), merged_dir, fs=FS, pattern="*_merged.csv")
+
+    for name, batch_fn in batch.items():
+        reference = tmp_path / f"reference_{name}.csv"
+        batch_fn(merged_dir, output_file=reference, fs=FS, pattern="*_merged.csv")
+        csv_name = MODULE_CSVS[name]
+        pd.testing.assert_frame_equal(pd.read_csv(features_dir / csv_name), pd.read_csv(reference))
+
+
+def test_valid_cache_cells_are_not_recomputed(merged_dir, features_dir, merged_reads):
+    feat_report._run_modules(["eog"], merged_dir, fs=FS, pattern="*_merged.csv")
+    merged_reads.clear()
+
+    # eog cells are valid for both subjects: only the gssc columns are read
+    feat_report._run_modules(["eog", "gssc"], merged_dir, fs=FS, pattern="*_merged.csv")
+    assert len(merged_reads) == 2
+    assert all("LOC" not in usecols and "prob_rem" in usecols for _, usecols in merged_reads)
+    assert len(pd.read_csv(features_dir / "eog_features.csv")) == 2
+
+    # Every cell is valid: no merged CSV is read
+    merged_reads.clear()
+    feat_report._run_modules(["eog", "gssc"], merged_dir, fs=FS, pattern="*_merged.csv")
+    assert merged_reads == []
+
+
+def test_missing_required_columns_skip_only_that_module(merged_dir, features_dir):
+    f = merged_dir / "DCSM_1_a_contiguous_eog_merged.csv"
+    pd.read_csv(f, low_memory=False).drop(columns=["EEG_LOC", "EEG_ROC"]).to_csv(f, index=False)
+
+    tables = feat_report._run_modules(["eeg", "gssc"], merged_dir, fs=FS, pattern="*_merged.csv")
+    assert list(tables["eeg"]["subject_id"]) == ["DCSM_2_a"]
+    assert list(tables["gssc"]["subject_id"]) == ["DCSM_1_a", "DCSM_2_a"]
+
+
+def test_workers_match_sequential_and_isolate_failures(merged_dir, features_dir, tmp_path):
+    (merged_dir / "DCSM_3_a_contiguous_eog_merged.csv").write_text("not,a\nmerged,csv\n")
+    modules = ["eog", "gssc", "bout"]
+
+    parallel = feat_report._run_modules(modules, merged_dir, fs=FS, pattern="*_merged.csv", workers=2)
+    for name in modules:
+        (features_dir / MODULE_CSVS[name]).unlink()
+    (features_dir / CACHE_NAME).unlink()
+    sequential = feat_report._run_modules(modules, merged_dir, fs=FS, pattern="*_merged.csv", workers=1)
+
+    for name in modules:
+        assert list(parallel[name]["subject_id"]) == ["DCSM_1_a", "DCSM_2_a"]     # DCSM_3_a skipped
+        pd.testing.assert_frame_equal(parallel[name], sequential[name])
+
+
+@pytest.mark.parametrize("degenerate", [False, True])
+def test_registry_declares_columns_and_outputs(merged_template, degenerate):
+    df = pd.read_csv(merged_template / "DCSM_1_a_contiguous_eog_merged.csv", low_memory=False)
+    if degenerate:      # no REM, no EEG, no sub-epochs: the NaN-default branches
+        df = df.assign(stage="N2").drop(columns=["EEG_LOC", "EEG_ROC", "EpochType"])
+
+    for g in FEATURE_GROUPS:
+        if any(c not in df.columns for c in g.required):
+            continue
+        fn = load_group(g)
+        on_all  = fn(df, FS) if g.uses_fs else fn(df)
+        view    = df[group_usecols([g], df.columns)]
+        on_view = fn(view, FS) if g.uses_fs else fn(view)
+        if degenerate:      # some groups return fewer keys here; the engine fills the rest with NaN
+            assert set(on_all) <= set(g.outputs), g.name
+        else:
+            assert set(on_all) == set(g.outputs), g.name
+        pd.testing.assert_series_equal(pd.Series(on_view, dtype=object), pd.Series(on_all, dtype=object),
+                                       obj=g.name)
+
+
+def test_context_is_shared_by_all_groups(merged_template, monkeypatch):
+    f  = merged_template / "DCSM_1_a_contiguous_eog_merged.csv"
+    df = pd.read_csv(f, low_memory=False)
+
+    ctx = SubjectContext(df)
+    pd.testing.assert_frame_equal(ctx.rem, df[df["stage"] == "REM"])
+    blocks = df.groupby((df["stage"] != df["stage"].shift()).cumsum())["stage"].agg(["first", "size"])
+    assert [STAGES[c] for c in ctx.hypnogram.stage] == list(blocks["first"])
+    assert list(ctx.hypnogram.length) == list(blocks["size"])
+
+    # One extraction selects the REM rows and transforms the EEG once for all groups
+    calls, original = [], SubjectContext.rem.func
+    rem = cached_property(lambda self: calls.append(1) or original(self))
+    rem.__set_name__(SubjectContext, "rem")
+    monkeypatch.setattr(SubjectContext, "rem", rem)
+    spectrograms, compute = [], Spectrogram.compute
+    monkeypatch.setattr(Spectrogram, "compute",
+                        classmethod(lambda cls, *a, **kw: spectrograms.append(1) or compute(*a, **kw)))
+    results = feat_report._extract_subject(f, "DCSM_1_a", list(GROUPS), FS)
+    assert all(isinstance(feats, dict) for feats in results.values())
+    assert len(calls) == 1
+    assert len(spectrograms) == 1
+
+
+def test_hypnogram_matches_sample_level_stages(merged_template):
+    labels = pd.Series(["W"] * 5 + ["N1"] * 3 + [np.nan] * 2 + ["rem "] * 4 + ["N2"] * 2 + ["REM"] * 3 + ["W"])
+    hyp = Hypnogram.from_labels(labels)
+    assert hyp.n_samples == len(labels)
+    assert list(hyp.stage_samples()) == [6, 3, 2, 0, 7]
+    assert list(hyp.runs(REM)) == [4, 3]
+    assert hyp.onset(SLEEP_CODES) == 5
+    assert [STAGES[c] for c in hyp.next_stage(REM)] == ["N2", "W"]
+
+    # WASO from the stage runs equals the per-sample count
+    from add_waso import compute_waso
+    f     = merged_template / "DCSM_1_a_contiguous_eog_merged.csv"
+    stage = pd.read_csv(f, usecols=["stage"])["stage"]
+    first = stage[stage.isin(["N1", "N2", "N3", "REM"])].index.min()
+    assert compute_waso(f, fs=FS)["waso_min"] == round((stage.iloc[first:] == "W").sum() / FS / 60.0, 4)
+
+
+def test_group_selection_and_force(merged_dir, features_dir, merged_reads):
+    assert [g.name for g in select_groups(["gssc"])] == ["gssc_probability", "gssc_rem_stability"]
+    assert {g.module for g in select_groups(["em_morphology", "eog"])} == {"eog", "extra"}
+    with pytest.raises(ValueError):
+        select_groups(["nope"])
+
+    # Single group: reads only its columns, writes only its outputs
+    feat_report._run_modules(["em_morphology"], merged_dir, fs=FS, pattern="*_merged.csv")
+    extra = pd.read_csv(features_dir / "extra_features.csv")
+    assert list(extra.columns) == ["subject_id", *GROUPS["em_morphology"].outputs]
+    assert all(set(usecols) <= set(GROUPS["em_morphology"].optional) for _, usecols in merged_reads)
+
+    # The whole module: only the missing groups are computed, columns end up in registry order
+    merged_reads.clear()
+    feat_report._run_modules(["extra"], merged_dir, fs=FS, pattern="*_merged.csv")
+    extra_all = pd.read_csv(features_dir / "extra_features.csv")
+    expected = [k for g in select_groups(["extra"]) for k in g.outputs]
+    assert list(extra_all.columns) == ["subject_id", *expected]
+    assert all("em_LOCAbsRiseSlope" not in usecols for _, usecols in merged_reads)
+    pd.testing.assert_frame_equal(extra_all[extra.columns], extra)
+
+    # --force on one group clears only its cells; rerun recomputes it with the same values
+    feat_report._drop_cached(["em_morphology"])
+    merged_reads.clear()
+    feat_report._run_modules(["extra"], merged_dir, fs=FS, pattern="*_merged.csv")
+    assert len(merged_reads) == 2
+    assert all(set(usecols) <= set(GROUPS["em_morphology"].optional) for _, usecols in merged_reads)
+    pd.testing.assert_frame_equal(pd.read_csv(features_dir / "extra_features.csv"), extra_all)
+
+
+def test_cache_recomputes_only_changed_files(merged_dir, features_dir, merged_reads):
+    modules = ["eog", "gssc"]
+    first = feat_report._run_modules(modules, merged_dir, fs=FS, pattern="*_merged.csv")
+
+    # Touching a file without changing its content keeps its cells
+    f1 = merged_dir / "DCSM_1_a_contiguous_eog_merged.csv"
+    os.utime(f1, ns=(f1.stat().st_atime_ns, f1.stat().st_mtime_ns + 10**9))
+    merged_reads.clear()
+    feat_report._run_modules(modules, merged_dir, fs=FS, pattern="*_merged.csv")
+    assert merged_reads == []
+
+    # Re-merged session: only that subject is recomputed; a deleted module CSV is rebuilt from the cache
+    df = pd.read_csv(f1, low_memory=False)
+    df.loc[df["stage"] == "N2", "stage"] = "N3"
+    df.to_csv(f1, index=False)
+    (features_dir / MODULE_CSVS["gssc"]).unlink()
+    merged_reads.clear()
+    second = feat_report._run_modules(modules, merged_dir, fs=FS, pattern="*_merged.csv")
+    assert [name for name, _ in merged_reads] == [f1.name]
+
+    eog_1, eog_2 = (second["eog"].set_index("subject_id").loc[sid] for sid in ("DCSM_1_a", "DCSM_2_a"))
+    assert eog_1["n3_duration_min"] > first["eog"].set_index("subject_id").loc["DCSM_1_a", "n3_duration_min"]
+    pd.testing.assert_series_equal(eog_2, first["eog"].set_index("subject_id").loc["DCSM_2_a"])
+    assert list(second["gssc"]["subject_id"]) == ["DCSM_1_a", "DCSM_2_a"]
+
+
+def test_cache_recomputes_only_bumped_group_version(merged_dir, features_dir, merged_reads, monkeypatch):
+    feat_report._run_modules(["extra"], merged_dir, fs=FS, pattern="*_merged.csv")
+    before = pd.read_csv(features_dir / "extra_features.csv")
+
+    bumped = dataclasses.replace(GROUPS["sleep_architecture"], version="2")
+    monkeypatch.setitem(GROUPS, "sleep_architecture", bumped)
+    monkeypatch.setattr("features.registry.FEATURE_GROUPS",
+                        [bumped if g.name == bumped.name else g for g in FEATURE_GROUPS])
+    merged_reads.clear()
+    feat_report._run_modules(["extra"], merged_dir, fs=FS, pattern="*_merged.csv")
+    assert len(merged_reads) == 2
+    assert all(set(usecols) == {"stage", "time_sec"} for _, usecols in merged_reads)
+    pd.testing.assert_frame_equal(pd.read_csv(features_dir / "extra_features.csv"), before)
+
+
+def test_cache_recomputes_when_fs_changes(merged_dir, features_dir, merged_reads):
+    groups = ["stage_distribution", "gssc_probability"]          # the second does not take fs
+    first  = feat_report._run_modules(groups, merged_dir, fs=FS, pattern="*_merged.csv")
+
+    merged_reads.clear()
+    second = feat_report._run_modules(groups, merged_dir, fs=2 * FS, pattern="*_merged.csv")
+    assert sorted(name for name, _ in merged_reads) == sorted(p.name for p in merged_dir.iterdir())
+    assert all("prob_rem" not in usecols for _, usecols in merged_reads)
+
+    minutes = lambda tables: tables["eog"].set_index("subject_id")["total_recording_min"]
+    pd.testing.assert_series_equal(minutes(second), minutes(first) / 2)
+    pd.testing.assert_frame_equal(second["gssc"], first["gssc"])
+
+    # Back at the first rate: recomputed again, not served from the 2 * FS cells
+    merged_reads.clear()
+    third = feat_report._run_modules(groups, merged_dir, fs=FS, pattern="*_merged.csv")
+    assert len(merged_reads) == 2
+    pd.testing.assert_series_equal(minutes(third), minutes(first))
+
+
+
+def test_merged_table_matches_pairwise_outer_merge(merged_dir, features_dir):
+    from functools import reduce
+
+    tables = feat_report._run_modules(list(MODULE_CSVS), merged_dir, fs=FS, pattern="*_merged.csv")
+    patient = pd.DataFrame({"subject_id": ["DCSM_2_a", "DCSM_9_z"], "DCSM_ID": ["DCSM_2", "DCSM_9"],
+                            "Control": [1, 0], "iRBD": [0, 1],
+                            "total_recording_min": [-1.0, -2.0]})      # also in eog: eog's column wins
+    patient.to_csv(features_dir / "patient_features.csv", index=False)
+
+    # Reference: the pairwise outer merges and _dup cleanup used before
+    dfs = [pd.read_csv(f, low_memory=False) for f in sorted(features_dir.glob("*_features.csv"))]
+    reference = reduce(lambda l, r: pd.merge(l, r, on="subject_id", how="outer", suffixes=("", "_dup")), dfs)
+    reference = reference.drop(columns=[c for c in reference.columns if c.endswith("_dup")])
+
+    out = features_dir / "features.csv"
+    combined = feat_report.merge_feature_csvs(features_dir, output_file=out,
+                                              tables={MODULE_CSVS[m]: t for m, t in tables.items()})
+    assert list(combined.columns) == list(reference.columns)
+    assert list(combined["subject_id"]) == ["DCSM_1_a", "DCSM_2_a", "DCSM_9_z"]
+    integer = ["Control", "iRBD"] + [c for t in tables.values() for c in t.columns
+                                     if c != "subject_id" and pd.api.types.is_integer_dtype(t[c])]
+    assert (combined[integer].dtypes == "Int64").all()
+    assert set(combined.drop(columns=["subject_id", "DCSM_ID", *integer]).dtypes) <= {np.dtype("float32"),
+                                                                                 np.dtype("float64")}
+    assert list(combined["DCSM_ID"].fillna("")) == ["", "DCSM_2", "DCSM_9"]
+    numeric = [c for c in reference.columns if c not in ("subject_id", "DCSM_ID")]
+    np.testing.assert_allclose(combined[numeric].to_numpy(float), reference[numeric].to_numpy(float),
+                               rtol=1e-6, equal_nan=True)
+    pd.testing.assert_frame_equal(pd.read_csv(out), reference, check_dtype=False, rtol=1e-6)
+
+
+def test_merged_table_keeps_integers_and_decimals_exact(features_dir):
+    features_dir.mkdir()
+    pd.DataFrame({"subject_id": ["DCSM_1_a", "DCSM_2_a"], "rem_event_count": [3, 5],
+                  "total_recording_min": [28800.1234, 0.5], "rem_ratio": [0.1234, 0.25]}).to_csv(
+        features_dir / "eog_features.csv", index=False)
+    pd.DataFrame({"subject_id": ["DCSM_3_a"], "n_rem_epochs": [7]}).to_csv(
+        features_dir / "sleep_features.csv", index=False)
+
+    out = features_dir / "features.csv"
+    combined = feat_report.merge_feature_csvs(features_dir, output_file=out)
+    assert combined["rem_event_count"].dtype == "Int64"
+    assert combined["rem_event_count"].isna().tolist() == [False, False, True]
+    assert combined["total_recording_min"].dtype == np.float64
+    assert combined["rem_ratio"].dtype == np.float32                # float32 writes 0.1234 exactly
+
+    lines = out.read_text().splitlines()
+    assert lines[0] == "subject_id,rem_event_count,total_recording_min,rem_ratio,n_rem_epochs"
+    assert lines[1:] == ["DCSM_1_a,3,28800.1234,0.1234,", "DCSM_2_a,5,0.5,0.25,", "DCSM_3_a,,,,7"]
+
+
+def test_merged_table_parquet_is_optional(features_dir):
+    import importlib.util
+
+    features_dir.mkdir()
+    pd.DataFrame({"subject_id": ["DCSM_1_a"], "rem_event_count": [3]}).to_csv(
+        features_dir / "eog_features.csv", index=False)
+    out = features_dir / "features.parquet"
+    if importlib.util.find_spec("pyarrow") is None and importlib.util.find_spec("fastparquet") is None:
+        with pytest.raises(ImportError, match="pyarrow"):
+            feat_report.merge_feature_csvs(features_dir, output_file=out)
+    else:
+        combined = feat_report.merge_feature_csvs(features_dir, output_file=out)
+        pd.testing.assert_frame_equal(pd.read_parquet(out), combined)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
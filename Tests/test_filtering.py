@@ -0,0 +1,134 @@
+# Filename: test_filtering.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the shared 0.1–30 Hz EOG band-pass (preprocessing/filtering.py): cached SOS
+#              design, pass/stop band, and that the filtered night is computed once per session
+#              and sampling rate and reused by later stages, with the band recorded in its info.
+#              em_to_csv event counts on a synthetic night stay close to the old path (crop,
+#              resample to 128 Hz, then raw.filter).
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import mne
+import numpy as np
+import pytest
+
+from preprocessing import em_to_csv as em_module
+from preprocessing import filtering
+from preprocessing.filtering import bandpass, clear_filter_cache, filtered_eog, sos_bandpass
+from preprocessing.resample import resample_raw
+from Tests.synthetic_eog import synthetic_eog
+
+# =====================================================================
+# Helpers
+# =====================================================================
+FS = 256
+
+
+def _sines(freqs, seconds: float = 300, fs: float = FS) -> np.ndarray:
+    t = np.arange(int(fs * seconds)) / fs
+    return np.vstack([np.sin(2 * np.pi * f * t) for f in freqs]) * 50e-6
+
+
+def _raw(data: np.ndarray, fs: float = FS) -> mne.io.RawArray:
+    return mne.io.RawArray(data, mne.create_info(["LOC", "ROC"], fs, "eeg"), verbose=False)
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_pass_and_stop_band():
+    x = _sines([0.5, 2, 10, 15, 60, 90])
+    y = bandpass(x, FS)
+    edge = 60 * FS
+    gain = np.abs(y[:, edge:-edge]).max(axis=1) / 50e-6
+    np.testing.assert_allclose(gain[:4], 1, atol=0.01)
+    assert (gain[4:] < 0.02).all()
+
+
+def test_matches_mne_fir_in_pass_band():
+    x   = _sines([0.5, 3])
+    ref = _raw(x).filter(0.1, 30, picks=["LOC", "ROC"], verbose=False).get_data()
+    out = bandpass(x, FS)
+    edge = 60 * FS
+    assert np.abs(out - ref)[:, edge:-edge].max() < 0.01 * 50e-6
+
+
+def test_sos_design_is_cached():
+    sos_bandpass.cache_clear()
+    x = _sines([5], seconds=30)
+    bandpass(x, FS)
+    bandpass(x, FS)
+    bandpass(x, 128)
+    info = sos_bandpass.cache_info()
+    assert (info.misses, info.hits) == (2, 1)
+
+
+def test_filtered_once_per_session_and_rate(monkeypatch):
+    clear_filter_cache()
+    calls = []
+    monkeypatch.setattr(filtering, "bandpass", lambda data, **kw: calls.append(kw["sfreq"]) or data)
+
+    raw = _raw(_sines([1, 2]))
+    first = filtered_eog(raw, session_key="night_a")
+    assert filtered_eog(raw, session_key="night_a") is first          # e.g. GSSC, then EM detection
+    assert raw.get_channel_types() == ["eeg", "eeg"]                  # caller's Raw untouched
+    assert first.get_channel_types() == ["eog", "eog"]
+    assert (first.info["highpass"], first.info["lowpass"]) == (0.1, 30.0)   # as raw.filter(0.1, 30)
+    assert (raw.info["highpass"], raw.info["lowpass"]) == (0.0, FS / 2)
+
+    filtered_eog(raw.copy().resample(128, verbose=False), session_key="night_a")
+    filtered_eog(raw, session_key="night_b")
+    assert calls == [FS, 128, FS]
+
+    clear_filter_cache()
+    filtered_eog(raw, session_key="night_a")
+    assert len(calls) == 4
+
+
+def test_cache_is_bounded():
+    clear_filter_cache()
+    raw = _raw(_sines([1, 2], seconds=10))
+    for i in range(filtering.MAX_CACHED_SESSIONS + 2):
+        filtered_eog(raw, session_key=f"night_{i}")
+    assert len(filtering._FILTERED) == filtering.MAX_CACHED_SESSIONS
+    clear_filter_cache()
+
+
+
+def test_em_counts_close_to_old_filter_path(tmp_path, monkeypatch):
+    loc, roc, hypno = synthetic_eog(duration_s=100 * 60, fs=FS, seed=0)   # first REM period at ~62 min
+    raw = _raw(np.vstack([loc, roc]) * 1e-6)
+    edf = tmp_path / "DCSM_1_a" / "night.edf"
+
+    def counts(out_dir):
+        em_df, sub_df = em_module.em_to_csv(edf, hypno, raw=raw, out_dir=out_dir)
+        return {
+            "em":     len(em_df),
+            "rem":    int((em_df["EM_Type"] == "REM").sum()),
+            "sem":    int((em_df["EM_Type"] == "SEM").sum()),
+            "phasic": int((sub_df["EpochType"] == "Phasic").sum()),
+        }
+
+    clear_filter_cache()
+    new = counts(tmp_path / "new")
+
+    # Old path: no shared filter; raw.filter(0.1, 30) after the crop and the 128 Hz resample
+    monkeypatch.setattr(em_module, "filtered_eog",
+                        lambda raw, session_key: raw.copy().set_channel_types({"LOC": "eog", "ROC": "eog"}))
+    monkeypatch.setattr(em_module, "resample_raw",
+                        lambda raw, fs: resample_raw(raw, fs).filter(0.1, 30, picks=["LOC", "ROC"], verbose=False))
+    old = counts(tmp_path / "old")
+    clear_filter_cache()
+
+    assert old["em"] > 1000 and old["phasic"] > 100
+    tolerance = {"em": 0.03, "rem": 0.03, "sem": 0.15, "phasic": 0.10}   # measured: 1.7 %, 1.1 %, 6.5 %, 2 %
+    for key, rel in tolerance.items():
+        assert new[key] == pytest.approx(old[key], rel=rel), (key, old, new)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,52 @@
+# Filename: test_float32_detection.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks that the opt-in float32 detection path gives the same events as float64
+#              on a synthetic EOG night, and prints the numerical-equivalence report.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from extract_rems import detect_rem_jaec
+from analysis.precision_report import compare_precision, print_precision_report
+from Tests.synthetic_eog import synthetic_eog
+
+# =====================================================================
+# Helpers
+# =====================================================================
+FS = 128
+
+def _synthetic_night() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """~17 min synthetic night with REM in the middle third."""
+    hypno = np.array([2] * 11 + [4] * 12 + [2] * 11)
+    return synthetic_eog(duration_s=len(hypno) * 30, fs=FS, hypno=hypno)
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_dtcwt_runs_in_float32():
+    loc, roc, hypno = _synthetic_night()
+    hypno_up = np.repeat(hypno, 30 * FS)[: 2 ** 16]
+    result = detect_rem_jaec(loc[: 2 ** 16], roc[: 2 ** 16], hypno_up, method='ssc_threshold', dtype=np.float32)
+    assert result._data_filt.dtype == np.float32
+
+
+def test_float32_matches_float64():
+    loc, roc, hypno = _synthetic_night()
+    summary, deltas = compare_precision(loc, roc, hypno, fs=FS)
+    print_precision_report(summary, deltas)
+
+    assert summary["n_events_float64"] > 0
+    assert abs(summary["n_events_float64"] - summary["n_events_float32"]) <= 0.01 * summary["n_events_float64"] + 1
+    assert summary["n_matched"] >= 0.99 * summary["n_events_float64"]
+    assert summary["subepoch_agreement"] >= 0.99
+
+
+if __name__ == "__main__":
+    test_dtcwt_runs_in_float32()
+    test_float32_matches_float64()
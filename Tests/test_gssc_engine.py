@@ -0,0 +1,178 @@
+# Filename: test_gssc_engine.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the GSSC inference engine in preprocessing/GSSC_to_csv.py on short synthetic
+#              EDF nights: the engine is built once per (process, use_cuda, precision) and reused
+#              by GSSC_to_csv and extract_rems_from_edf, and batched multi-night staging
+#              (GSSC_batch_to_csv) gives the same stages and probabilities as EEGInfer.mne_infer,
+#              night by night and with batches spanning nights. The reduced-precision modes: an
+#              unknown precision is rejected, int8 is a separate quantized engine that leaves fp32
+#              untouched, and int8/bf16 stages agree with fp32 (analysis/gssc_precision_report.py).
+#              Tests that run the networks are skipped if the GSSC weights cannot be loaded.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("gssc")
+import torch
+
+from analysis.gssc_precision_report import compare_gssc_precision
+from preprocessing import GSSC_to_csv as gssc_to_csv
+from preprocessing.extract_rems_n import extract_rems_from_edf
+from preprocessing.filtering import clear_filter_cache
+from Tests.synthetic_eog import CYCLE, synthetic_eog
+from Tests.test_edf_reader import write_edf
+
+# =====================================================================
+# Helpers
+# =====================================================================
+FS = 128
+MIN_AGREEMENT = 0.95    # epoch agreement of int8/bf16 with fp32 (about 0.996 on the 2-h night)
+
+
+def write_night(folder: Path, hypno: list[int], seed: int = 0) -> Path:
+    """Write a synthetic LOC/ROC night as ``folder/<session>.edf`` (the session id is the folder name)."""
+    loc, roc, _ = synthetic_eog(duration_s=30 * len(hypno), fs=FS, hypno=np.asarray(hypno), seed=seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    edf = folder / f"{folder.name}.edf"
+    write_edf(edf, [("EOG V-M2", FS, loc), ("EOG H-M1", FS, roc)])
+    return edf
+
+
+@pytest.fixture(autouse=True)
+def fresh_filter_cache():
+    clear_filter_cache()
+    yield
+    clear_filter_cache()
+
+
+@pytest.fixture(scope="module")
+def engine():
+    """The real fp32 engine; skips the test if the network weights cannot be loaded."""
+    try:
+        return gssc_to_csv.get_gssc_engine(precision="fp32")
+    except Exception as e:
+        pytest.skip(f"GSSC weights cannot be loaded: {type(e).__name__}: {str(e).splitlines()[0]}")
+
+
+@pytest.fixture(scope="module")
+def nights(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("nights")
+    return [
+        write_night(folder / "DCSM_1_a", [0] * 4 + [1] * 4 + [2] * 8 + [4] * 8, seed=1),
+        write_night(folder / "DCSM_2_a", [0] * 2 + [2] * 10 + [3] * 8 + [2] * 6 + [4] * 14, seed=2),
+    ]
+
+
+@pytest.fixture(scope="module")
+def long_night(tmp_path_factory):
+    """Two hours of the synthetic W-N1-N2-N3-N2-REM cycle, so fp32 predicts several stages."""
+    return write_night(tmp_path_factory.mktemp("long") / "DCSM_3_a", list(np.resize(CYCLE, 240)), seed=3)
+
+
+def mne_infer_reference(engine, edf: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Stages, epoch times and probabilities of one night from ``EEGInfer.mne_infer``, as GSSC_to_csv runs it."""
+    raw    = gssc_to_csv._load_eog_raw(edf)
+    result = engine.mne_infer(inst=raw, eeg=[], eog=gssc_to_csv.EOG_CHANS, eog_drop=False, filter=False)
+    if len(result) != 3:
+        pytest.skip("installed gssc returns no probabilities from mne_infer; install it from GitHub (see README)")
+    return result
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_engine_is_built_once_per_process_and_precision(tmp_path, monkeypatch):
+    hypno = [0] * 4 + [2] * 6 + [4] * 12
+    edf   = write_night(tmp_path / "DCSM_1_a", hypno)
+    built, staged = [], []
+
+    class CountingInfer:
+        """Stands in for EEGInfer: counts constructions and returns the night's hypnogram."""
+        def __init__(self, use_cuda=False):
+            built.append(use_cuda)
+            self.use_cuda = False
+
+        def mne_infer(self, inst, eeg, eog, eog_drop, filter):
+            staged.append(self)
+            stages = np.asarray(hypno)
+            return stages, 30.0 * np.arange(len(stages)), np.eye(5)[stages]
+
+    monkeypatch.chdir(tmp_path)         # extract_rems_from_edf stages into the default gssc_csv/
+    monkeypatch.setattr(gssc_to_csv, "EEGInfer", CountingInfer)
+    monkeypatch.setattr(gssc_to_csv, "_ENGINES", {})
+    monkeypatch.setattr(gssc_to_csv, "_warm_up", lambda engine, precision="fp32": None)
+
+    df = gssc_to_csv.GSSC_to_csv(edf, out_dir=tmp_path / "gssc_csv")
+    assert list(df["stage"]) == [gssc_to_csv.STAGE_NAMES[s] for s in hypno]
+    extract_rems_from_edf(edf, out_dir=tmp_path / "extracted_rems")      # stages the night again
+
+    engine = gssc_to_csv.get_gssc_engine()
+    assert built == [False]
+    assert staged == [engine, engine]
+    assert list(gssc_to_csv._ENGINES) == [(os.getpid(), False, "fp32")]
+    assert gssc_to_csv._ENGINES[(os.getpid(), False, "fp32")] is engine
+
+    # Another precision is another engine
+    assert gssc_to_csv.get_gssc_engine(precision="bf16") is not engine
+    assert len(built) == 2
+
+
+def test_batched_staging_matches_mne_infer(engine, nights, tmp_path):
+    reference = {edf.parent.name: mne_infer_reference(engine, edf) for edf in nights}
+
+    single = {}
+    for edf in nights:
+        single.update(gssc_to_csv.GSSC_batch_to_csv([(edf, None)], out_dir=tmp_path / "single"))
+    # 16 epochs per forward pass: batches span both channels and both nights
+    batched = gssc_to_csv.GSSC_batch_to_csv([(edf, None) for edf in nights], out_dir=tmp_path / "batched",
+                                            batch_epochs=16)
+
+    for session, (stages, times, probs) in reference.items():
+        for df in (single[session], batched[session]):
+            assert list(df["stage"]) == [gssc_to_csv.STAGE_NAMES[s] for s in stages]
+            np.testing.assert_allclose(df["epoch_start"], times)
+            np.testing.assert_allclose(df[gssc_to_csv.PROB_COLS].to_numpy(), probs, atol=1e-5)
+
+
+def test_unknown_precision_is_rejected():
+    with pytest.raises(ValueError, match="precision must be one of"):
+        gssc_to_csv.get_gssc_engine(precision="fp16")
+
+
+def test_int8_is_a_separate_engine_and_leaves_fp32_untouched(engine):
+    before = {name: {k: v.clone() for k, v in net.state_dict().items()}
+              for name, net in (("net", engine.net), ("con_net", engine.con_net))}
+
+    int8 = gssc_to_csv.get_gssc_engine(precision="int8")
+    assert int8 is not engine
+    assert int8.net is not engine.net and int8.con_net is not engine.con_net
+    assert gssc_to_csv.get_gssc_engine(precision="int8") is int8
+
+    quantized = torch.ao.nn.quantized.dynamic.GRU
+    assert any(isinstance(m, quantized) for m in int8.con_net.modules())
+    assert not any(isinstance(m, quantized) for m in engine.con_net.modules())
+    for name, net in (("net", engine.net), ("con_net", engine.con_net)):
+        after = net.state_dict()
+        assert after.keys() == before[name].keys()
+        assert all(torch.equal(after[k], v) for k, v in before[name].items())
+    assert gssc_to_csv.get_gssc_engine(precision="fp32") is engine
+
+
+@pytest.mark.filterwarnings("ignore:bf16 requested")
+@pytest.mark.parametrize("precision", ["int8", "bf16"])
+def test_reduced_precision_agrees_with_fp32(engine, long_night, precision):
+    [row] = compare_gssc_precision([long_night], precision=precision).to_dict("records")
+    assert row["agreement"] >= MIN_AGREEMENT
+
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,132 @@
+# Filename: test_import_time.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Import-time guard for the main.py subcommands. Runs `python -X importtime`
+#              on what each subcommand imports at startup and checks that the light ones
+#              (merge, report, cleanup, extract) neither pull in torch/GSSC/MNE/YASA/dtcwt
+#              nor exceed a time budget. Also checks that each stage module only loads its
+#              own heavy dependencies and creates no directories at import, and that the GSSC
+#              settings main.py mirrors to avoid importing torch equal preprocessing.GSSC_to_csv's.
+#
+# Usage:
+#   python -m pytest Tests/test_import_time.py
+#   python -m Tests.test_import_time               # print the slowest imports per subcommand
+#   IMPORT_BUDGET_S=1.0 python -m pytest Tests/test_import_time.py
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import importlib.util
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# =====================================================================
+# Constants
+# =====================================================================
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Modules each subcommand imports before doing any work
+SUBCOMMAND_IMPORTS = {
+    "cleanup": ["main"],
+    "merge":   ["main", "analysis.feat_report"],
+    "report":  ["main", "analysis.feat_report"],
+    "extract": ["main", "analysis.feat_report"],   # feature modules are loaded per module run
+}
+
+# Heavy dependencies that only the processing stages may import
+HEAVY = ["torch", "gssc", "mne", "yasa", "dtcwt"]
+
+# Heavy dependencies each stage module must NOT import (it may import the others)
+STAGE_FORBIDDEN = {
+    "preprocessing.edf_to_csv":     ["torch", "gssc", "yasa", "dtcwt"],
+    "preprocessing.em_to_csv":      ["torch", "gssc"],
+    "preprocessing.extract_rems_n": ["torch", "gssc"],
+    "preprocessing.eeg_to_csv":     ["torch", "gssc", "mne", "yasa"],
+    "preprocessing.merge":          HEAVY,
+    "analysis.feat_report":         HEAVY,
+}
+
+# Total cumulative import time allowed per subcommand (generous: pandas alone is ~0.3 s)
+IMPORT_BUDGET_S = float(os.environ.get("IMPORT_BUDGET_S", "3.0"))
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def import_profile(modules: list[str], cwd: Path) -> dict[str, float]:
+    """
+    Import ``modules`` in a fresh interpreter under ``-X importtime``.
+
+    Returns
+    -------
+    dict[str, float]
+        Cumulative import time in seconds per imported module (top-level and nested).
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    env  = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+    out  = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+    profile = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line.split("|"))
+        if cumulative.isdigit():                            # skip the header line
+            profile[name] = int(cumulative) / 1e6
+    return profile
+
+# =====================================================================
+# TEST
+# =====================================================================
+@pytest.mark.parametrize("subcommand", sorted(SUBCOMMAND_IMPORTS))
+def test_subcommand_startup(subcommand, tmp_path):
+    modules = SUBCOMMAND_IMPORTS[subcommand]
+    profile = import_profile(modules, cwd=tmp_path)
+
+    heavy = [m for m in profile if m.split(".")[0] in HEAVY]
+    assert not heavy, f"'{subcommand}' imports heavy dependencies at startup: {sorted(heavy)[:10]}"
+
+    total = sum(profile[m] for m in modules if m in profile)
+    assert total < IMPORT_BUDGET_S, f"'{subcommand}' startup imports took {total:.2f}s (budget {IMPORT_BUDGET_S}s)"
+
+
+@pytest.mark.parametrize("module", sorted(STAGE_FORBIDDEN))
+def test_stage_imports_only_its_dependencies(module, tmp_path):
+    profile = import_profile([module], cwd=tmp_path)
+
+    forbidden = [m for m in profile if m.split(".")[0] in STAGE_FORBIDDEN[module]]
+    assert not forbidden, f"{module} imports {sorted(forbidden)[:10]}"
+    assert not any(tmp_path.iterdir()), f"{module} created {[p.name for p in tmp_path.iterdir()]} at import"
+
+
+def test_main_mirrors_gssc_settings(tmp_path):
+    missing = [m for m in ("torch", "gssc", "mne") if importlib.util.find_spec(m) is None]
+    if missing:
+        pytest.skip(f"preprocessing.GSSC_to_csv needs {missing}")
+
+    # Compared in a fresh interpreter, so this test process does not load torch
+    code = ("import main, preprocessing.GSSC_to_csv as g; "
+            "assert tuple(main.GSSC_PRECISIONS) == tuple(g.PRECISIONS), (main.GSSC_PRECISIONS, g.PRECISIONS); "
+            "assert main.GSSC_BATCH_EPOCHS == g.BATCH_EPOCHS, (main.GSSC_BATCH_EPOCHS, g.BATCH_EPOCHS)")
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT)}
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr.strip().splitlines()[-1]
+
+# =====================================================================
+# Entry point
+# =====================================================================
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for subcommand, modules in SUBCOMMAND_IMPORTS.items():
+            profile = import_profile(modules, cwd=Path(tmp))
+            total   = sum(profile[m] for m in modules if m in profile)
+            print(f"\n{subcommand:<8} {total:6.3f} s")
+            for name, t in sorted(profile.items(), key=lambda kv: -kv[1])[:8]:
+                print(f"    {t:6.3f} s  {name}")
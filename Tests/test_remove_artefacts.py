@@ -0,0 +1,70 @@
+# Filename: test_remove_artefacts.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the difference-array interval masking in remove_artefacts against
+#              the original per-event loop, and the zero-copy path when nothing is masked.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+
+from preprocessing.remove_artefacts import remove_artefacts, interval_mask
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_interval_mask_matches_loop():
+    rng = np.random.default_rng(0)
+    n = 5000
+    starts = rng.integers(-50, n, 300)
+    ends   = starts + rng.integers(-5, 80, 300)
+
+    expected = np.zeros(n, dtype=bool)
+    for s, e in zip(starts, ends):
+        expected[max(0, s):max(0, min(n, e))] = True
+
+    np.testing.assert_array_equal(interval_mask(starts, ends, n), expected)
+
+
+def test_remove_artefacts_masks_event_spans():
+    fs  = 128.0
+    loc = np.random.default_rng(1).normal(0, 10, 20_000)
+    roc = -loc
+    df  = pd.DataFrame({
+        "Start":         [1.0,  10.0, 100.0, 150.0],
+        "Peak":          [1.2,  10.1, 100.5, 155.9],
+        "End":           [1.5,  10.3, 101.0, 200.0],   # last event runs past the signal end
+        "LOCAbsValPeak": [50.0, 400.0, 20.0, 500.0],
+        "ROCAbsValPeak": [50.0, 30.0,  20.0, 10.0],
+    })
+
+    clean_df, loc_m, roc_m = remove_artefacts(df, loc, roc, fs=fs)
+
+    expected = np.zeros(len(loc), dtype=bool)
+    for _, ev in df[df["LOCAbsValPeak"] > 300].iterrows():
+        expected[max(0, int(np.floor(ev["Start"] * fs))):min(len(loc), int(np.ceil(ev["End"] * fs)))] = True
+
+    assert len(clean_df) == 2
+    np.testing.assert_array_equal(np.isnan(loc_m), expected)
+    np.testing.assert_array_equal(np.isnan(roc_m), expected)
+    assert not np.isnan(loc).any()   # caller's array untouched
+
+
+def test_remove_artefacts_zero_copy_when_clean():
+    loc = np.ones(1000, dtype=np.float32)
+    df  = pd.DataFrame({"Start": [1.0], "Peak": [1.1], "End": [1.2],
+                        "LOCAbsValPeak": [10.0], "ROCAbsValPeak": [10.0]})
+    _, loc_m, roc_m = remove_artefacts(df, loc, loc)
+    assert loc_m is loc and roc_m is loc
+
+
+if __name__ == "__main__":
+    test_interval_mask_matches_loop()
+    test_remove_artefacts_masks_event_spans()
+    test_remove_artefacts_zero_copy_when_clean()
+    print("OK")
@@ -0,0 +1,167 @@
+# Filename: test_resample.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the polyphase resampler (preprocessing/resample.py) against MNE's FFT
+#              resampler for the stage conversions (native -> 250 Hz, native -> 128 Hz), and
+#              benchmarks both paths on a synthetic night.
+#
+# Usage:
+#   python -m pytest Tests/test_resample.py
+#   python -m Tests.test_resample --minutes 480      # benchmark an 8 h night
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+
+import mne
+import numpy as np
+import pytest
+from scipy.signal import resample
+
+from preprocessing.resample import fir_design, rational_factors, resample_raw, resample_signal
+from Tests.synthetic_eog import synthetic_eog
+
+# =====================================================================
+# Constants
+# =====================================================================
+# (fs_in, fs_out) pairs seen in the DCSM data and used by the stages
+RATE_PAIRS = [(256, 128), (256, 250), (512, 128), (512, 250), (1000, 250), (200, 128)]
+
+# MNE's padded FFT resampler is itself off by several % at 200 -> 128 Hz, so that pair
+# is only checked against the exact (whole-signal) FFT resample
+MNE_PAIRS = RATE_PAIRS[:-1]
+
+# Max interior difference vs MNE, relative to the signal std (the two anti-aliasing
+# filters differ only in the transition band; 2 s at each edge are excluded)
+REL_TOL = 0.01
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def _band_limited(fs: float, seconds: float, seed: int = 0) -> np.ndarray:
+    """Two channels of summed sines below 25 Hz (in volts), so both resamplers see the same band."""
+    rng   = np.random.default_rng(seed)
+    t     = np.arange(int(fs * seconds)) / fs
+    freqs = rng.uniform(0.2, 25, (2, 12))
+    amps  = rng.uniform(5, 80, (2, 12)) * 1e-6
+    return np.stack([(a[:, None] * np.sin(2 * np.pi * f[:, None] * t)).sum(0) for f, a in zip(freqs, amps)])
+
+
+def _raw(data: np.ndarray, fs: float) -> mne.io.RawArray:
+    return mne.io.RawArray(data, mne.create_info(["LOC", "ROC"], fs, "eog"), verbose=False)
+
+
+def run_resample_benchmark(minutes: float = 60, pairs: list[tuple[int, int]] = RATE_PAIRS,
+                           repeats: int = 3) -> dict[tuple[int, int], dict[str, float]]:
+    """
+    Median seconds for MNE ``Raw.resample`` vs :func:`resample_raw` on a synthetic LOC/ROC night.
+
+    Returns ``{(fs_in, fs_out): {"mne": s, "polyphase": s, "speedup": x}}``.
+    """
+    results = {}
+    for fs_in, fs_out in pairs:
+        loc, roc, _ = synthetic_eog(duration_s=minutes * 60, fs=fs_in)
+        raw = _raw(np.vstack([loc, roc]) * 1e-6, fs_in)
+
+        t_mne, t_poly = [], []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            raw.copy().resample(fs_out, verbose=False)
+            t_mne.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            resample_raw(raw, fs_out)
+            t_poly.append(time.perf_counter() - t0)
+
+        results[(fs_in, fs_out)] = {
+            "mne":       float(np.median(t_mne)),
+            "polyphase": float(np.median(t_poly)),
+            "speedup":   float(np.median(t_mne) / np.median(t_poly)),
+        }
+    return results
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_rational_factors():
+    assert rational_factors(256, 128) == (1, 2)
+    assert rational_factors(256, 250) == (125, 128)
+    assert rational_factors(200, 128) == (16, 25)
+    assert rational_factors(1000, 250) == (1, 4)
+    with pytest.raises(ValueError):
+        rational_factors(200.03, 128)
+
+
+def test_fir_design_is_cached():
+    fir_design.cache_clear()
+    x = _band_limited(256, 60)
+    resample_signal(x, 256, 128)
+    resample_signal(x, 256, 128)
+    info = fir_design.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+    assert not fir_design(256.0, 128.0)[2].flags.writeable
+
+
+@pytest.mark.parametrize("fs_in, fs_out", MNE_PAIRS)
+def test_matches_mne_resample(fs_in, fs_out):
+    x   = _band_limited(fs_in, 120)
+    ref = _raw(x, fs_in).resample(fs_out, verbose=False)
+    out = resample_raw(_raw(x, fs_in), fs_out)
+
+    assert out.info["sfreq"] == fs_out and out.ch_names == ref.ch_names
+    assert out.n_times == ref.n_times
+    edge = 2 * fs_out
+    diff = np.abs(out.get_data() - ref.get_data())[:, edge:-edge]
+    assert diff.max() < REL_TOL * x.std()
+
+
+@pytest.mark.parametrize("fs_in, fs_out", RATE_PAIRS)
+def test_matches_exact_fft_resample(fs_in, fs_out):
+    x   = _band_limited(fs_in, 120)
+    out = resample_signal(x, fs_in, fs_out)
+    ref = resample(x, out.shape[1], axis=-1)
+
+    edge = 2 * fs_out
+    assert np.abs(out - ref)[:, edge:-edge].max() < REL_TOL * x.std()
+
+
+def test_same_rate_and_float32():
+    x = _band_limited(128, 30)
+    assert resample_signal(x, 128, 128) is x
+
+    y = resample_signal(x.astype(np.float32), 256, 128)
+    assert y.dtype == np.float32 and y.shape == (2, x.shape[1] // 2)
+
+
+def test_non_rational_rate_falls_back_to_mne():
+    raw = _raw(_band_limited(200.03, 30), 200.03)
+    out = resample_raw(raw, 128)
+    assert out.info["sfreq"] == 128 and raw.info["sfreq"] == 200.03
+
+
+def test_resample_benchmark():
+    results = run_resample_benchmark(minutes=5, pairs=[(256, 128)], repeats=1)
+    assert results[(256, 128)]["polyphase"] > 0
+
+# =====================================================================
+# Entry point
+# =====================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark polyphase vs MNE resampling.")
+    parser.add_argument("--minutes", type=float, default=60, help="Synthetic night length in minutes")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    mne.set_log_level("ERROR")
+    print(f"\nResampling benchmark — {args.minutes:g} min, 2 channels (median of {args.repeats})")
+    for (fs_in, fs_out), r in run_resample_benchmark(args.minutes, repeats=args.repeats).items():
+        print(f"  {fs_in:>5} -> {fs_out:<4} Hz   MNE {r['mne']:7.3f} s   polyphase {r['polyphase']:7.3f} s   "
+              f"({r['speedup']:.1f}x)")
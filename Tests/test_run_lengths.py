@@ -0,0 +1,82 @@
+# Filename: test_run_lengths.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the shared run-length utilities (features/context.py) against the previous
+#              element-by-element bout loop and the pandas shift-based transition count, and the
+#              phasic/tonic bout features built on them.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features.bout_feats import _bout_stats
+from features.context import label_runs, run_lengths
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def _loop_bouts(types: pd.Series, label: str) -> list[int]:
+    """Reference: the per-element loop the bout features used before."""
+    bouts, count = [], 0
+    for t in types:
+        if t == label:
+            count += 1
+        else:
+            if count > 0:
+                bouts.append(count)
+            count = 0
+    if count > 0:
+        bouts.append(count)
+    return bouts
+
+
+def _sequences():
+    rng = np.random.default_rng(0)
+    yield pd.Series([], dtype=str)
+    yield pd.Series(["Phasic"])
+    yield pd.Series(["Tonic", np.nan, np.nan, "Tonic", "Tonic", "Phasic"])
+    for n in (2, 17, 500):
+        for p_nan in (0.0, 0.1):
+            labels = rng.choice(["Phasic", "Tonic"], n, p=[0.3, 0.7]).astype(object)
+            labels[rng.random(n) < p_nan] = np.nan
+            yield pd.Series(labels)
+
+# =====================================================================
+# TEST
+# =====================================================================
+@pytest.mark.parametrize("types", list(_sequences()), ids=lambda t: f"n{len(t)}")
+def test_label_runs_match_loop_and_shift(types):
+    starts, lengths, labels = label_runs(types)
+
+    assert lengths.sum() == len(types)
+    assert list(starts) == list(np.cumsum(np.r_[0, lengths])[:-1])
+    for label in ("Phasic", "Tonic"):
+        assert list(lengths[labels == label]) == _loop_bouts(types, label)
+
+    transitions = int((types != types.shift()).sum()) - 1
+    assert len(labels) - 1 == transitions
+
+
+@pytest.mark.parametrize("types", list(_sequences())[3:], ids=lambda t: f"n{len(t)}")
+def test_bout_stats_unchanged(types):
+    _, lengths, labels = label_runs(types)
+    for label in ("Phasic", "Tonic"):
+        assert _bout_stats(lengths[labels == label], label, 30.0) == _bout_stats(_loop_bouts(types, label), label, 30.0)
+
+
+def test_run_lengths_of_codes():
+    starts, lengths, values = run_lengths(np.array([4, 4, 2, 2, 2, -1, 4]))
+    assert list(starts) == [0, 2, 5, 6]
+    assert list(lengths) == [2, 3, 1, 1]
+    assert list(values) == [4, 2, -1, 4]
+    assert all(len(a) == 0 for a in run_lengths(np.array([], dtype=np.int8)))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,117 @@
+# Filename: test_scheduling.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the longest-expected-first session ordering (preprocessing/scheduling.py):
+#              header-only prior, per-stage cost fit from recorded timings, and the makespan gain
+#              over folder order on a pool of workers.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing.scheduling import COST_FEATURES, cost_features, expected_seconds, fit_stage_costs, longest_first, makespan
+from preprocessing.session_catalog import load_stage_timings, record_stage_timings
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def _catalog(n: int = 24, seed: int = 0) -> pd.DataFrame:
+    """Catalog rows with DCSM-like header fields (6-12 h nights, mixed EOG/max rates)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "patient_id": [f"DCSM_{i}_a" for i in range(n)],
+        "duration":   rng.uniform(6, 12, n) * 3600,
+        "eog_sfreq":  rng.choice([128.0, 256.0, 512.0], n),
+        "max_sfreq":  rng.choice([256.0, 512.0, 1000.0], n),
+        "n_channels": rng.integers(8, 40, n),
+    })
+
+
+# Seconds per unit of COST_FEATURES for a few stages
+TRUE_COEFS = {
+    "gssc": np.array([2e-3, 0.0, 0.0]),
+    "rems": np.array([5e-3, 0.0, 0.0]),
+    "load": np.array([0.0, 1e-7, 2e-9]),
+}
+
+
+def _timings(catalog: pd.DataFrame, noise: float = 0.02, seed: int = 1) -> pd.DataFrame:
+    rng   = np.random.default_rng(seed)
+    feats = cost_features(catalog)
+    rows  = []
+    for stage, coef in TRUE_COEFS.items():
+        seconds = feats.to_numpy(float) @ coef * rng.normal(1, noise, len(feats))
+        rows += [{"patient_id": pid, "stage": stage, "seconds": s} for pid, s in zip(feats.index, seconds)]
+    return pd.DataFrame(rows)
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_prior_puts_long_high_rate_recordings_first():
+    catalog = pd.DataFrame({
+        "patient_id": ["DCSM_1_a", "DCSM_2_a", "DCSM_3_a"],
+        "duration":   [8 * 3600, 12 * 3600, 8 * 3600],
+        "eog_sfreq":  [256.0, 1000.0, 256.0],
+        "max_sfreq":  [256.0, 1000.0, 512.0],
+        "n_channels": [10, 30, 30],
+    })
+    order = longest_first(catalog)
+    assert list(order["patient_id"]) == ["DCSM_2_a", "DCSM_3_a", "DCSM_1_a"]
+    assert (np.diff(order["expected_s"]) <= 0).all()
+
+
+def test_fit_recovers_stage_costs():
+    catalog = _catalog()
+    coefs = fit_stage_costs(catalog, _timings(catalog))
+    assert set(coefs) == set(TRUE_COEFS)
+
+    feats = cost_features(catalog).to_numpy(float)
+    for stage, coef in TRUE_COEFS.items():
+        np.testing.assert_allclose(feats @ coefs[stage], feats @ coef, rtol=0.1)
+
+    expected = expected_seconds(catalog, _timings(catalog))
+    np.testing.assert_allclose(expected, feats @ sum(TRUE_COEFS.values()), rtol=0.1)
+
+
+def test_stages_with_little_history_are_ignored():
+    catalog = _catalog()
+    timings = _timings(catalog)
+    timings = timings[(timings["stage"] != "gssc") | timings["patient_id"].isin(catalog["patient_id"][:3])]
+    assert "gssc" not in fit_stage_costs(catalog, timings)
+
+
+def test_longest_first_shortens_makespan():
+    catalog = _catalog(n=16, seed=3)
+    true_s  = expected_seconds(catalog, _timings(catalog, noise=0.0))
+
+    folder_order = makespan(list(true_s), workers=4)
+    ljf          = makespan(list(true_s[longest_first(catalog, _timings(catalog))["patient_id"]]), workers=4)
+    assert ljf <= folder_order
+
+    # One long night scheduled last keeps the pool waiting
+    assert makespan([1.0] * 8 + [8.0], workers=4) == 10.0
+    assert makespan([8.0] + [1.0] * 8, workers=4) == 8.0
+
+
+def test_record_and_load_stage_timings(tmp_path):
+    db = tmp_path / "catalog.sqlite"
+    assert load_stage_timings(db).empty
+
+    record_stage_timings("DCSM_1_a", {"gssc": 12.5, "rems": 30.0}, db_path=db)
+    record_stage_timings("DCSM_2_a", {"gssc": 10.0}, db_path=db)
+    record_stage_timings("DCSM_1_a", {"gssc": 11.0}, db_path=db)      # rerun replaces
+
+    timings = load_stage_timings(db).sort_values("patient_id")
+    assert list(timings["patient_id"]) == ["DCSM_1_a", "DCSM_2_a"]
+    assert list(timings["seconds"]) == [11.0, 10.0]
+    assert list(COST_FEATURES) == list(cost_features(_catalog(2)).columns)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,163 @@
+# Filename: test_session_catalog.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the SQLite session catalog (preprocessing/session_catalog.py) on a small
+#              synthetic raw root: header/lights fields, the usable-session filter, and that
+#              reruns only rescan folders whose mtime changed or whose EDF or lights.txt was
+#              overwritten in place.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from preprocessing import session_catalog
+from preprocessing.session_catalog import catalog_records, update_catalog, usable_sessions
+from Tests.test_edf_reader import write_edf
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def _session(root: Path, name: str, labels=("EOG V-M2", "EOG H-M1"), minutes: int = 5,
+             lights: str | None = "Lights_off,Lights_on\n30,240\n", hypnogram: bool = True) -> Path:
+    folder = root / name
+    folder.mkdir()
+    n = minutes * 60
+    write_edf(folder / "contiguous.edf", [(lab, 128, np.zeros(n * 128)) for lab in labels])
+    if hypnogram:
+        (folder / "hypnogram.csv").write_text("stage\nW\n")
+    if lights is not None:
+        (folder / "lights.txt").write_text(lights)
+    return folder
+
+
+def _bump_mtime(path: Path, seconds: float = 10) -> None:
+    st = path.stat()
+    os.utime(path, (st.st_atime, st.st_mtime + seconds))
+
+
+@pytest.fixture
+def raw_root(tmp_path):
+    root = tmp_path / "raw"
+    root.mkdir()
+    _session(root, "DCSM_1_a")
+    _session(root, "DCSM_2_a", minutes=20)
+    _session(root, "DCSM_3_b", labels=("EEG C3-M2", "EMG chin"))
+    _session(root, "DCSM_4_a", hypnogram=False)
+    _session(root, "DCSM_5_a", minutes=1)
+    (root / "notes").mkdir()
+    return root
+
+
+@pytest.fixture
+def header_reads(monkeypatch):
+    calls = []
+    original = session_catalog.read_edf_header
+    monkeypatch.setattr(session_catalog, "read_edf_header", lambda p: calls.append(Path(p).parent.name) or original(p))
+    return calls
+
+# =====================================================================
+# TEST
+# =====================================================================
+def test_catalog_fields_and_usable_filter(raw_root, tmp_path):
+    catalog = update_catalog(raw_root, db_path=tmp_path / "catalog.sqlite")
+    assert list(catalog["patient_id"]) == ["DCSM_1_a", "DCSM_2_a", "DCSM_3_b", "DCSM_4_a", "DCSM_5_a"]
+
+    row = catalog.set_index("patient_id").loc["DCSM_2_a"]
+    assert row["duration"] == 20 * 60 and row["n_channels"] == 2 and row["eog_sfreq"] == 128
+    assert json.loads(row["rename_map"]) == {"EOG V-M2": "LOC", "EOG H-M1": "ROC"}
+    assert (row["lights_off"], row["lights_on"]) == (30, 240)
+    assert row["edf_size"] == (raw_root / "DCSM_2_a" / "contiguous.edf").stat().st_size
+
+    usable, skipped = usable_sessions(catalog)
+    assert list(usable["patient_id"]) == ["DCSM_1_a", "DCSM_2_a"]
+    assert set(skipped) == {"DCSM_3_b", "DCSM_4_a", "DCSM_5_a"}
+    assert "LOC/ROC" in skipped["DCSM_3_b"] and "hypnogram.csv" in skipped["DCSM_4_a"]
+    assert "too short" in skipped["DCSM_5_a"]
+
+    records = catalog_records(usable.sort_values("edf_size", ascending=False))
+    assert [r.patient_id for r in records] == ["DCSM_2_a", "DCSM_1_a"]
+    assert records[0].edf_path == raw_root / "DCSM_2_a" / "contiguous.edf"
+
+
+def test_rerun_rescans_only_changed_folders(raw_root, tmp_path, header_reads):
+    db = tmp_path / "catalog.sqlite"
+    first = update_catalog(raw_root, db_path=db)
+    assert len(header_reads) == 5
+
+    # Unchanged tree: nothing is re-read
+    again = update_catalog(raw_root, db_path=db)
+    assert len(header_reads) == 5
+    assert again.drop(columns="folder_mtime").equals(first.drop(columns="folder_mtime"))
+
+    # A new lights.txt changes the folder mtime: rescanned, but the unchanged EDF header is reused
+    (raw_root / "DCSM_1_a" / "lights.txt").write_text("Lights_off,Lights_on\n60,200\n")
+    _bump_mtime(raw_root / "DCSM_1_a")
+    row = update_catalog(raw_root, db_path=db).set_index("patient_id").loc["DCSM_1_a"]
+    assert row["lights_off"] == 60 and len(header_reads) == 5
+
+    # New session folder changes the root mtime: only the new EDF is read
+    _session(raw_root, "DCSM_6_c")
+    _bump_mtime(raw_root)
+    catalog = update_catalog(raw_root, db_path=db)
+    assert "DCSM_6_c" in set(catalog["patient_id"]) and header_reads[5:] == ["DCSM_6_c"]
+
+
+def test_files_overwritten_in_place_are_rescanned(raw_root, tmp_path, header_reads):
+    db = tmp_path / "catalog.sqlite"
+    update_catalog(raw_root, db_path=db)
+    folder = raw_root / "DCSM_1_a"
+    folder_mtime = folder.stat().st_mtime
+
+    # Same inode, folder mtime untouched: the new lights times are still picked up
+    with open(folder / "lights.txt", "r+") as fh:
+        fh.write("Lights_off,Lights_on\n90,180\n")
+    _bump_mtime(folder / "lights.txt")
+    assert folder.stat().st_mtime == folder_mtime
+    row = update_catalog(raw_root, db_path=db).set_index("patient_id").loc["DCSM_1_a"]
+    assert (row["lights_off"], row["lights_on"]) == (90, 180) and len(header_reads) == 5
+
+    # EDF rewritten in place with a longer night: its header is re-read
+    with open(folder / "contiguous.edf", "r+b") as fh:
+        fh.truncate(0)
+    write_edf(folder / "contiguous.edf", [(lab, 128, np.zeros(10 * 60 * 128)) for lab in ("EOG V-M2", "EOG H-M1")])
+    assert folder.stat().st_mtime == folder_mtime
+    row = update_catalog(raw_root, db_path=db).set_index("patient_id").loc["DCSM_1_a"]
+    assert row["duration"] == 10 * 60 and header_reads[5:] == ["DCSM_1_a"]
+
+    # Nothing changed since: no rescan
+    update_catalog(raw_root, db_path=db)
+    assert len(header_reads) == 6
+
+
+def test_no_rescan_uses_stored_catalog(raw_root, tmp_path, header_reads):
+    db = tmp_path / "catalog.sqlite"
+    update_catalog(raw_root, db_path=db)
+    _session(raw_root, "DCSM_7_a")
+    _bump_mtime(raw_root)
+
+    stored = update_catalog(raw_root, db_path=db, rescan=False)
+    assert "DCSM_7_a" not in set(stored["patient_id"]) and len(header_reads) == 5
+    usable, _ = usable_sessions(stored)
+    assert list(usable["patient_id"]) == ["DCSM_1_a", "DCSM_2_a"]
+
+
+def test_other_root_rebuilds(raw_root, tmp_path):
+    db = tmp_path / "catalog.sqlite"
+    update_catalog(raw_root, db_path=db)
+
+    other = tmp_path / "other"
+    other.mkdir()
+    _session(other, "DCSM_9_a")
+    assert list(update_catalog(other, db_path=db)["patient_id"]) == ["DCSM_9_a"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
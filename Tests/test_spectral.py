@@ -0,0 +1,146 @@
+# Filename: test_spectral.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Checks the per-subject EEG spectrogram (features/spectral.py): segments sit on the
+#              4-s sub-epoch grid, the mean of contiguous segments equals Welch without overlap on
+#              the same samples, segments with missing samples or outside the mask are left out,
+#              and band power of a sine lands in its band. The run-wise masked Welch PSD equals
+#              the length-weighted Welch PSDs of its runs and has no leakage from the joins that
+#              concatenating the masked samples would create.
+
+# =====================================================================
+# Imports
+# =====================================================================
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import periodogram, welch
+
+from features.spectral import Spectrogram, band_power, eeg_signal, masked_psd
+
+# =====================================================================
+# Helpers
+# =====================================================================
+FS = 64.0
+
+
+def _noise(seconds: float, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, 20, int(seconds * FS))
+
+# =====================================================================
+# TEST
+# =====================================================================
+@pytest.mark.parametrize("t0", [0.0, 1.5, 8.0])
+def test_segments_follow_sub_epoch_grid(t0):
+    x    = _noise(120)
+    spec = Spectrogram.compute(x, FS, t0=t0)
+    t    = t0 + np.arange(len(x)) / FS
+
+    first = spec.offset
+    assert t[first] % 4.0 == pytest.approx(0.0) and t[first] - t0 < 4.0
+    assert spec.nperseg == int(4 * FS)
+    assert spec.offset + spec.n_segments * spec.nperseg <= len(x)
+
+    # Segment k is exactly sub-epoch (t // 4) == t[first] // 4 + k
+    k = 3
+    seg = x[first + k * spec.nperseg:first + (k + 1) * spec.nperseg]
+    assert set(t[first + k * spec.nperseg:first + (k + 1) * spec.nperseg] // 4) == {t[first] // 4 + k}
+    _, p = periodogram(seg, fs=FS, window="hann", detrend="constant")
+    np.testing.assert_allclose(spec.psd[k], p)
+
+
+def test_mean_psd_matches_welch_without_overlap():
+    x    = _noise(300, seed=1)
+    spec = Spectrogram.compute(x, FS)
+    f, p = welch(x[:spec.n_segments * spec.nperseg], fs=FS, nperseg=spec.nperseg, noverlap=0)
+    psd, n = spec.mean_psd()
+
+    assert n == spec.n_segments
+    np.testing.assert_allclose(spec.freqs, f)
+    np.testing.assert_allclose(psd, p)
+
+
+def test_mask_and_missing_samples_select_segments():
+    x    = _noise(80, seed=2)
+    nper = int(4 * FS)
+    x[5 * nper + 10] = np.nan                      # segment 5 has a gap
+    mask = np.zeros(len(x), dtype=bool)
+    mask[2 * nper:8 * nper] = True                 # segments 2..7
+    mask[9 * nper:10 * nper - 1] = True            # segment 9 only partly inside
+
+    spec = Spectrogram.compute(x, FS)
+    assert list(np.flatnonzero(spec.segments_in(mask))) == [2, 3, 4, 6, 7]
+
+    psd, n = spec.mean_psd(mask)
+    assert n == 5
+    np.testing.assert_allclose(psd, spec.psd[[2, 3, 4, 6, 7]].mean(axis=0))
+
+    empty, n = spec.mean_psd(np.zeros(len(x), dtype=bool))
+    assert n == 0 and np.isnan(empty).all()
+    assert Spectrogram.compute(x[:10], FS).n_segments == 0
+
+
+def test_band_power_and_eeg_signal():
+    t    = np.arange(int(60 * FS)) / FS
+    sine = 10 * np.sin(2 * np.pi * 6.0 * t)        # theta
+    df   = pd.DataFrame({"EEG_LOC": sine, "EEG_ROC": sine})
+    df.loc[100, "EEG_ROC"] = np.nan
+
+    sig = eeg_signal(df)
+    assert np.isnan(sig[100]) and np.isfinite(np.delete(sig, 100)).all()
+    np.testing.assert_array_equal(eeg_signal(df.drop(columns="EEG_ROC")), sine)
+    assert eeg_signal(pd.DataFrame({"EEG_LOC": [np.nan] * 4})) is None
+
+    spec   = Spectrogram.compute(sig, FS)
+    psd, _ = spec.mean_psd()
+    theta  = band_power(spec.freqs, psd, 4.0, 8.0)
+    delta  = band_power(spec.freqs, psd, 0.5, 4.0)
+    assert theta == pytest.approx(np.var(sine), rel=0.05)  # a sine's power is its variance
+    assert delta < 0.01 * theta
+    assert np.isnan(band_power(spec.freqs, psd, 40.0, 45.0))  # above Nyquist
+
+
+
+def test_masked_psd_weights_runs_by_length():
+    x    = _noise(200, seed=3)
+    nper = int(4 * FS)
+    mask = np.zeros(len(x), dtype=bool)
+    mask[100:100 + 30 * int(FS)]   = True          # 30-s run
+    mask[4000:4000 + 12 * int(FS)] = True          # 12-s run ...
+    x[4000 + 5 * int(FS)]          = np.nan        # ... split by a gap into 5 s and ~7 s
+    mask[9000:9000 + nper - 1]     = True          # shorter than nperseg: skipped
+
+    f, psd, n = masked_psd(x, mask, FS, nper)
+
+    runs = [(100, 30 * int(FS)), (4000, 5 * int(FS)), (4000 + 5 * int(FS) + 1, 7 * int(FS) - 1)]
+    assert n == sum(length for _, length in runs)
+    expected = sum(length * welch(x[a:a + length], fs=FS, nperseg=nper)[1] for a, length in runs) / n
+    np.testing.assert_allclose(psd, expected)
+    np.testing.assert_allclose(f, welch(x[:nper], fs=FS, nperseg=nper)[0])
+
+    _, _, n_all = masked_psd(x, None, FS, nper)
+    assert n_all == len(x) - 1
+
+    _, none, n = masked_psd(x, np.zeros(len(x), dtype=bool), FS, nper)
+    assert n == 0 and np.isnan(none).all()
+
+
+def test_masked_psd_has_no_join_artefacts():
+    t    = np.arange(int(120 * FS)) / FS
+    x    = 10 * np.sin(2 * np.pi * 6.0 * t) + np.where(t < 60, 0.0, 200.0)   # level shift between halves
+    mask = (t < 50) | (t >= 70)                                            # two runs, 20 s apart
+    nper = int(4 * FS)
+
+    f, psd, _ = masked_psd(x, mask, FS, nper)
+    f, concat = welch(x[mask], fs=FS, nperseg=nper)                         # the old concatenation
+
+    delta = lambda p: band_power(f, p, 0.5, 4.0)
+    assert delta(psd) < 1e-3 * band_power(f, psd, 4.0, 8.0)
+    assert delta(concat) > 100 * delta(psd)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
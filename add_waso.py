@@ -17,11 +17,12 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from features.context import SLEEP_CODES, STAGES, Hypnogram
+
 # =====================================================================
 # Constants
 # =====================================================================
 DCSM_PATTERN = re.compile(r"(DCSM_\d+_[a-zA-Z])")
-SLEEP_STAGES  = {"N1", "N2", "N3", "REM"}
 
 # =====================================================================
 # Functions
@@ -49,20 +50,20 @@ def compute_waso(merged_file: Path, fs: float = 250.0) -> dict:
     m        = DCSM_PATTERN.match(raw_stem)
     sid      = m.group(1) if m else raw_stem
 
-    # ---- Load only the stage column ----
-    df    = pd.read_csv(merged_file, usecols=["stage"], low_memory=False)
-    stage = df["stage"].reset_index(drop=True)
+    # ---- Load only the stage column and collapse it to stage runs ----
+    df  = pd.read_csv(merged_file, usecols=["stage"], low_memory=False)
+    hyp = Hypnogram.from_labels(df["stage"])
 
     # ---- Find first sleep epoch ----
-    first_sleep_idx = stage[stage.isin(SLEEP_STAGES)].index.min()
+    first_sleep_idx = hyp.onset(SLEEP_CODES)
 
-    if pd.isna(first_sleep_idx):
+    if first_sleep_idx is None:
         print(f"  [WARN] {sid} — no sleep epochs found, WASO = NaN")
         return {"subject_id": sid, "waso_min": np.nan}
 
     # ---- Sum wake samples after first sleep epoch ----
-    post_sleep      = stage.iloc[first_sleep_idx:]
-    wake_samples    = (post_sleep == "W").sum()
+    post_sleep_wake = (hyp.stage == STAGES.index("W")) & (hyp.start >= first_sleep_idx)
+    wake_samples    = int(hyp.length[post_sleep_wake].sum())
     waso_min        = round(wake_samples / fs / 60.0, 4)
 
     print(f"  {sid:<25s}  first_sleep_idx={first_sleep_idx:,}  "
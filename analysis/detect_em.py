@@ -11,6 +11,39 @@ import numpy as np
 import pandas as pd 
 from extract_rems import detect_rem_jaec
 from pathlib import Path
+from typing import Sequence
+
+
+# =====================================================================
+# Helpers
+# =====================================================================
+def sweep_col(prefix: str, thresh: float) -> str:
+    """Column name for one threshold of a sweep, e.g. ``sweep_col('EM_Type', 0.5) -> 'EM_Type_0.5s'``."""
+    return f"{prefix}_{thresh:g}s"
+
+
+def _threshold_sweep(
+        values:      np.ndarray,
+        thresholds:  Sequence[float],
+        prefix:      str,
+        above_label: str,
+        below_label: str,
+        inclusive:   bool,
+        ) -> dict[str, np.ndarray]:
+    """
+    Label ``values`` against every threshold in one broadcast comparison.
+
+    Returns one label column per threshold, named with :func:`sweep_col`.
+    ``inclusive=True`` labels ``values >= thresh`` as ``above_label``, otherwise ``values > thresh``.
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    if thresholds.ndim != 1 or (thresholds <= 0).any():
+        raise ValueError(f"Sweep thresholds must be a 1-D sequence of positive values. Got: {thresholds}")
+
+    values = np.asarray(values, dtype=float)[:, None]
+    above  = values >= thresholds[None, :] if inclusive else values > thresholds[None, :]
+    labels = np.where(above, above_label, below_label)
+    return {sweep_col(prefix, t): labels[:, i] for i, t in enumerate(thresholds)}
 
 
 # =====================================================================
@@ -26,6 +59,8 @@ def detect_em(
         hypno_up:       np.ndarray,
         fs:             float = 128,
         Dur_Thresh_SEM: float = 0.5,
+        dtype:          type | None = None,
+        sweep_thresh_sem: Sequence[float] | None = None,
         ) -> pd.DataFrame:
     """
     The function takes in the LOC and ROC EOG signals, as well as the hypnogram, and returns
@@ -55,6 +90,13 @@ def detect_em(
     Dur_Thresh_SEM : float, optional
         Duration threshold for classifying an eye movement as a Slow Eye Movement (SEM) in seconds, by default **0.5 [s]**.
         Eye movements longer than this are classified as SEM; all others are classified as REM.
+    dtype : type | None, optional
+        Working precision of the detection, e.g. ``np.float32`` to run the DTCWT with complex64 coefficients. \\
+        Default is **None** (use the dtype of the input signals, normally float64).
+    sweep_thresh_sem : Sequence[float] | None, optional
+        Extra SEM duration thresholds for sensitivity analyses, in seconds. \\
+        For each threshold ``t`` an ``EM_Type_{t}s`` column is added, labelled from the same detection. \\
+        Default is **None** (no sweep columns).
     
     Returns
     -------
@@ -73,6 +115,7 @@ def detect_em(
         - ``ROCAbsFallSlope``: Absolute value of the fall slope in the ROC channel (in µV/s).
         - ``Stage``: Sleep stage during which the eye movement event occurred (W, N1, N2, N3, REM).
         - ``EM_Type``: Classification of the eye movement event as 'SEM' (Slow Eye Movement) or 'REM' (Rapid Eye Movement) based on duration only.
+        - ``EM_Type_{t}s``: Same classification for each threshold in ``sweep_thresh_sem`` (only if given).
     """
     # --- Validate inputs ---
     if loc.shape != roc.shape:
@@ -95,10 +138,13 @@ def detect_em(
         roc = np.array(roc)
     if not isinstance(hypno_up, np.ndarray):
         hypno_up = np.array(hypno_up)
+    if dtype is not None:
+        loc = loc.astype(dtype, copy=False)
+        roc = roc.astype(dtype, copy=False)
  
     # ---- 1) Run dtection to get cleaned signals and events ----
     print("\nRunning REM detection algorithm...")
-    result = detect_rem_jaec(loc, roc, hypno_up, method='ssc_threshold')
+    result = detect_rem_jaec(loc, roc, hypno_up, method='ssc_threshold', dtype=dtype)
     df = result.summary()
     print(f"    Detected {len(df)} eye movement events.")
  
@@ -138,6 +184,12 @@ def detect_em(
         'LOCAbsFallSlope', 'ROCAbsFallSlope',
         'Stage', 'EM_Type'
         ]]
+
+    # ---- 6) Optional threshold sweep (same detection, all labelings at once) ----
+    if sweep_thresh_sem is not None:
+        sweep = _threshold_sweep(df['Duration'].to_numpy(), sweep_thresh_sem, 'EM_Type', 'SEM', 'REM', inclusive=False)
+        df = df.assign(**sweep)
+        print(f"    SEM threshold sweep: {list(sweep)}")
     
     df = df.reset_index(drop=True) # Reset index to ensure it starts from 0 and is sequential after filtering and processing.
     return df
@@ -156,6 +208,7 @@ def classify_rem_epochs_Umaer(
         epoch_len:          int   = 30,
         sub_epoch_len:      float = 4.0,
         phasic_dur_thresh:  float = 1.0,
+        sweep_phasic_thresh: Sequence[float] | None = None,
         ) -> pd.DataFrame:
     """
     Classifies 4-second sub-epochs within REM epochs as Phasic or Tonic based on
@@ -187,6 +240,11 @@ def classify_rem_epochs_Umaer(
     phasic_dur_thresh : float, optional
         Minimum total EM duration in seconds within a sub-epoch required for Phasic
         classification, by default **1.0 [s]**.
+    sweep_phasic_thresh : Sequence[float] | None, optional
+        Extra Phasic thresholds for sensitivity analyses, in seconds. \\
+        If given, the summed EM duration per sub-epoch is kept as ``EmDuration`` and an
+        ``EpochType_{t}s`` column is added for each threshold ``t``. \\
+        Default is **None** (no sweep columns).
  
     Returns
     -------
@@ -196,6 +254,7 @@ def classify_rem_epochs_Umaer(
         - 'SubEpochEnd'   : End time of the sub-epoch (in seconds).
         - 'EpochIdx'      : Parent 30-second epoch index.
         - 'EpochType'     : 'Phasic' or 'Tonic'.
+        - 'EmDuration', 'EpochType_{t}s' : Only if ``sweep_phasic_thresh`` is given.
     """
     # --- Validate inputs ---
     required_cols = {"Start", "Peak", "End", "Duration", "MeanAbsValPeak", "EM_Type"}
@@ -205,52 +264,55 @@ def classify_rem_epochs_Umaer(
     if loc.shape != roc.shape:
         raise ValueError(f"LOC and ROC must have the same shape. Got LOC: {loc.shape}, ROC: {roc.shape}")
  
-    df = df.copy()
     total_samples  = len(loc)
     total_duration = total_samples / sf
     print(f"Total signal duration: {total_duration:.2f} [s] | Total samples: {total_samples} | Sampling frequency: {sf} [Hz]")
     print(f"Phasic duration threshold: total EM duration >= {phasic_dur_thresh} [s] per 4-second sub-epoch")
  
-    # --- 1) Build list of all sub-epochs inside REM epochs ---
-    rem_epoch_indices = set(np.where(hypno_int == 4)[0])
- 
-    sub_epochs = []
-    t = 0.0
-    while t + sub_epoch_len <= total_duration:
-        parent_epoch = int(t // epoch_len)
-        if parent_epoch in rem_epoch_indices:
-            sub_epochs.append({
-                'SubEpochStart': t,
-                'SubEpochEnd':   t + sub_epoch_len,
-                'EpochIdx':      parent_epoch,
-                'EpochType':     'Unclassified',
-            })
-        t = round(t + sub_epoch_len, 6)
- 
-    result_df = pd.DataFrame(sub_epochs)
-    if result_df.empty:
+    # --- 1) Build grid of all sub-epochs inside REM epochs ---
+    # Sub-epoch starts are k * sub_epoch_len rounded to 6 decimals (same grid as the
+    # original `t = round(t + sub_epoch_len, 6)` loop). Keep those that fit in the
+    # signal and whose parent 30-second epoch is scored REM.
+    n_grid = int(np.floor(total_duration / sub_epoch_len)) + 1
+    grid_starts = np.round(np.arange(n_grid) * sub_epoch_len, 6)
+    grid_starts = grid_starts[grid_starts + sub_epoch_len <= total_duration]
+
+    parent_epoch = (grid_starts // epoch_len).astype(np.int64)
+    hypno_int    = np.asarray(hypno_int)
+    in_hypno     = parent_epoch < len(hypno_int)
+    is_rem       = np.zeros(len(grid_starts), dtype=bool)
+    is_rem[in_hypno] = hypno_int[parent_epoch[in_hypno]] == 4
+
+    if not is_rem.any():
         print("No REM sub-epochs found.")
-        return result_df
- 
-    print(f"Total {sub_epoch_len}-second sub-epochs inside REM: {len(result_df)}")
- 
+        return pd.DataFrame()
+
+    print(f"Total {sub_epoch_len}-second sub-epochs inside REM: {int(is_rem.sum())}")
+
     # --- 2) Classify each sub-epoch ---
-    def classify_sub_epoch(row):
-        t0, t1 = row["SubEpochStart"], row["SubEpochEnd"]
- 
-        # All EMs whose peak falls within this sub-epoch (any type, any amplitude)
-        ems_in_epoch = df[(df['Peak'] >= t0) & (df['Peak'] < t1)]
- 
-        # Phasic: total EM duration >= threshold
-        total_em_duration = ems_in_epoch['Duration'].sum()
-        if total_em_duration >= phasic_dur_thresh:
-            return 'Phasic'
- 
-        # Tonic: everything else
-        return 'Tonic'
- 
-    result_df['EpochType'] = result_df.apply(classify_sub_epoch, axis=1)
- 
+    # Assign every EM to the grid cell its peak falls in (t0 <= Peak < t0 + sub_epoch_len),
+    # then sum durations per cell in one pass (any EM type, any amplitude).
+    peaks     = df['Peak'].to_numpy(dtype=float)
+    durations = df['Duration'].to_numpy(dtype=float)
+    peak_bin  = np.searchsorted(grid_starts, peaks, side='right') - 1
+    in_grid   = (peak_bin >= 0) & (peaks < grid_starts[np.clip(peak_bin, 0, None)] + sub_epoch_len)
+    em_duration = np.bincount(peak_bin[in_grid], weights=durations[in_grid], minlength=len(grid_starts))
+
+    # Phasic: total EM duration >= threshold | Tonic: everything else
+    result_df = pd.DataFrame({
+        'SubEpochStart': grid_starts[is_rem],
+        'SubEpochEnd':   grid_starts[is_rem] + sub_epoch_len,
+        'EpochIdx':      parent_epoch[is_rem],
+        'EpochType':     np.where(em_duration[is_rem] >= phasic_dur_thresh, 'Phasic', 'Tonic'),
+    })
+
+    # Optional threshold sweep — all Phasic/Tonic labelings from the same per-sub-epoch sums
+    if sweep_phasic_thresh is not None:
+        result_df['EmDuration'] = em_duration[is_rem]
+        sweep = _threshold_sweep(em_duration[is_rem], sweep_phasic_thresh, 'EpochType', 'Phasic', 'Tonic', inclusive=True)
+        result_df = result_df.assign(**sweep)
+        print(f"Phasic threshold sweep: {list(sweep)}")
+
     # --- 3) Summary ---
     counts = result_df['EpochType'].value_counts()
     print(f"Sub-epoch classification summary:\n{counts.to_string()}")
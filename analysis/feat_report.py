@@ -11,80 +11,280 @@
 # =====================================================================
 from __future__ import annotations
 import sys
+import re
 import argparse
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
-from functools import reduce
- 
-from features.eog_feats import extract_features_batch
-from features.gssc_feats import extract_gssc_features_batch
-from features.eeg_feats import extract_eeg_features_batch
-from features.bout_feats import extract_bout_features_batch
-from features.patient_feats import extract_patient_features
-from features.extra_feats import extract_extra_features_batch
+
+from features.cache import CACHE_NAME, clear_cells, file_hash, load_cells, store_cells
+from features.context import SubjectContext
+from features.matrix import FeatureMatrix
+from features.registry import GROUPS, MODULE_CSVS, FeatureGroup, group_usecols, load_group, select_groups
 
 # =====================================================================
 # Module registry
 # =====================================================================
 FEATURES_DIR = Path("features_csv")
-FEATURES_DIR.mkdir(parents=True, exist_ok=True)
  
-# Each entry: module_name -> (batch_function, csv_filename)
+# Feature groups, their merged-CSV columns and outputs are declared in features/registry.py;
+# each group's outputs go to its module's CSV (MODULE_CSVS). Feature functions are imported
+# on first use so that merge/report don't import scipy and every feature module.
 # patient is special — needs patient_excel — handled separately below.
-MODULE_REGISTRY: dict[str, tuple[callable, str]] = {
-    "eog":     (extract_features_batch,           "eog_features.csv"),
-    "gssc":    (extract_gssc_features_batch,       "gssc_features.csv"),
-    "eeg":     (extract_eeg_features_batch,        "eeg_features.csv"),
-    "bout":    (extract_bout_features_batch,       "bout_features.csv"),
-    "extra":   (extract_extra_features_batch,      "extra_features.csv"),
-}
- 
-ALL_MODULE_NAMES = list(MODULE_REGISTRY.keys()) + ["patient"]
+ALL_MODULE_NAMES = list(MODULE_CSVS.keys()) + ["patient"]
+
+_DCSM_PATTERN = re.compile(r"^(DCSM_\d+_[a-zA-Z])")
 
 # =====================================================================
-# 1) Run individual module batch extractions
+# 1) Run feature groups — one read per merged CSV
 # =====================================================================
  
-def _run_module(
-        name:          str,
-        merged_dir:    Path,
-        fs:            float,
-        pattern:       str,
-        patient_excel: Path | None = None,
-) -> pd.DataFrame | None:
-    """Run a single module's batch extraction and save its CSV."""
- 
-    if name == "patient":
-        return _run_patient_module(merged_dir, pattern, patient_excel)
- 
-    if name not in MODULE_REGISTRY:
-        print(f"  [WARN] Unknown module '{name}' — skipping")
-        return None
- 
-    batch_fn, csv_name = MODULE_REGISTRY[name]
-    output_file = FEATURES_DIR / csv_name
- 
-    print(f"\n{'='*60}")
-    print(f"  Module: {name}  ->  {output_file}")
-    print(f"{'='*60}")
- 
+def _subject_id(merged_file: Path) -> str:
+    """DCSM ID parsed from a merged CSV name (``.csv`` or ``.csv.gz``), else the bare stem."""
+    raw_stem = merged_file.name.replace(".csv.gz", "").replace(".csv", "")
+    m = _DCSM_PATTERN.match(raw_stem)
+    return m.group(1) if m else raw_stem
+
+
+def _load_module_csv(module: str) -> pd.DataFrame:
+    """Existing feature table of a module, indexed by subject_id (empty if none)."""
+    csv_path = FEATURES_DIR / MODULE_CSVS[module]
+    if csv_path.exists():
+        df = pd.read_csv(csv_path, low_memory=False)
+        if "subject_id" in df.columns:
+            return df.set_index(df["subject_id"].astype(str)).drop(columns="subject_id")
+    return pd.DataFrame(index=pd.Index([], dtype=str, name="subject_id"))
+
+
+def _cache_path() -> Path:
+    return FEATURES_DIR / CACHE_NAME
+
+
+def _cell_is_valid(cells: dict, sid: str, group: FeatureGroup, digest: str, fs: float) -> bool:
+    """
+    True if the cached features of ``(sid, group)`` were computed from this file content and
+    group version, and — for groups that take the sampling frequency — at this ``fs``.
+    """
+    cell = cells.get((sid, group.name))
+    if cell is None or cell[0] != digest or cell[1] != group.version:
+        return False
+    return not group.uses_fs or cell[2] == float(fs)
+
+
+def _extract_subject(
+        merged_file: Path,
+        subject_id:  str,
+        group_names: list[str],
+        fs:          float,
+) -> dict[str, dict | str]:
+    """
+    Read one merged CSV once and compute the given feature groups on it.
+
+    Runs in a worker process when ``workers > 1``, so failures are returned
+    rather than printed: ``group name -> feature dict`` on success,
+    ``group name -> error message`` otherwise.
+    """
+    groups = [GROUPS[name] for name in group_names]
     try:
-        df = batch_fn(merged_dir, output_file=output_file, fs=fs, pattern=pattern)
-        print(f"  {name}: {df.shape[0]} subjects, {df.shape[1]-1} features -> {output_file}")
-        return df
+        header = set(pd.read_csv(merged_file, nrows=0).columns)
     except Exception as e:
-        print(f"  [ERROR] {name}: {e}")
-        return None
+        return {g.name: str(e) for g in groups}
+
+    results = {}
+    for g in list(groups):
+        missing = [c for c in g.required if c not in header]
+        if missing:
+            results[g.name] = f"missing required columns: {missing}"
+            groups.remove(g)
+    if not groups:
+        return results
+
+    # ---- Read the minimal set of columns once ----
+    try:
+        df = pd.read_csv(merged_file, usecols=group_usecols(groups, header), low_memory=False)
+    except Exception as e:
+        return {**results, **{g.name: str(e) for g in groups}}
+
+    print(f"\n{'=' * 60}")
+    print(f"Extracting features: {merged_file.name}")
+    print(f"  subject_id : {subject_id}  |  fs : {fs} [Hz]  |  groups : {len(groups)}")
+
+    # ---- All groups share one context (stage codes, REM rows, runs, event tables) ----
+    ctx = SubjectContext(df)
+    for g in groups:
+        print(f"\n--- {g.module}: {g.name} ---")
+        try:
+            fn    = load_group(g)
+            feats = fn(ctx, fs) if g.uses_fs else fn(ctx)
+            results[g.name] = {k: feats.get(k, np.nan) for k in g.outputs}
+        except Exception as e:
+            results[g.name] = str(e)
+    return results
+
+
+def _run_modules(
+        names:      list[str] | None,
+        merged_dir: Path,
+        fs:         float,
+        pattern:    str,
+        workers:    int = 1,
+) -> dict[str, pd.DataFrame]:
+    """
+    Compute the selected feature groups over every merged CSV and save one CSV per module.
+
+    Features are cached per subject × group (``features/cache.py``) together with
+    the merged file's content hash, the group's version and ``fs``. Only cells whose
+    file content, group version or sampling frequency changed (or that are not cached
+    yet) are computed:
+    each merged CSV is read once, with the minimal columns of those groups, and
+    the groups share one ``SubjectContext`` built from it. The module CSVs are then rebuilt
+    from the cache; subjects without a merged CSV keep their existing rows.
+
+    Parameters
+    ----------
+    names : list[str] | None
+        Module names (``eog``, ``gssc``, ...) and/or feature group names. None = all.
+    merged_dir : Path
+        Directory containing merged CSV files (output of merge_all).
+    fs : float
+        Sampling frequency in [Hz].
+    pattern : str
+        Glob pattern to match merged CSVs.
+    workers : int
+        Subjects extracted in parallel (process pool). Default is **1**.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        ``module name -> feature table`` (existing + new subjects) for the modules touched.
+    """
+    if names:
+        unknown = [n for n in names if n not in MODULE_CSVS and n not in GROUPS]
+        if unknown:
+            print(f"  [WARN] Unknown module/group {unknown} — skipping")
+        names = [n for n in names if n not in unknown]
+        if not names:
+            return {}
+    groups = select_groups(names)
+    modules = list(dict.fromkeys(g.module for g in groups))
+
+    files = sorted(merged_dir.glob(pattern))
+    if not files:
+        print(f"  [ERROR] No files matching '{pattern}' found in {merged_dir}")
+        return {}
+
+    # ---- Cells to (re)compute per subject: new file content, group version or fs, or not cached ----
+    cache  = _cache_path()
+    cells  = load_cells(cache)
+    hashes = {}
+    jobs, n_cached = [], 0
+    for f in files:
+        sid = _subject_id(f)
+        hashes[sid] = file_hash(f, cache)
+        todo = [g.name for g in groups if not _cell_is_valid(cells, sid, g, hashes[sid], fs)]
+        n_cached += len(groups) - len(todo)
+        if todo:
+            jobs.append((f, sid, todo))
+
+    print(f"\n{'='*60}")
+    print(f"  Groups : {len(groups)} in {', '.join(modules)}  |  {len(files)} merged CSVs  |  "
+          f"{len(jobs)} to extract  |  {n_cached} cached  |  workers: {workers}")
+    print(f"{'='*60}")
+
+    computed = set()    # (subject_id, group) cells computed in this run
+
+    def _collect(f: Path, sid: str, results: dict[str, dict | str]) -> None:
+        # Failed groups get no cell, so they are retried on the next run
+        done = {}
+        for name, feats in results.items():
+            if isinstance(feats, dict):
+                done[name] = (GROUPS[name].version, feats)
+            else:
+                print(f"  [SKIP] {name}: {f.name} — {feats}")
+        if done:
+            store_cells(sid, hashes[sid], fs, done, cache)
+            for name, (version, feats) in done.items():
+                cells[(sid, name)] = (hashes[sid], version, float(fs), feats)
+                computed.add((sid, name))
+
+    if workers <= 1 or len(jobs) <= 1:
+        for f, sid, todo in jobs:
+            _collect(f, sid, _extract_subject(f, sid, todo, fs))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_extract_subject, f, sid, todo, fs): (f, sid, todo)
+                       for f, sid, todo in jobs}
+            for fut in as_completed(futures):
+                f, sid, todo = futures[fut]
+                try:
+                    results = fut.result()
+                except Exception as e:      # worker died (e.g. out of memory)
+                    results = {name: f"{type(e).__name__}: {e}" for name in todo}
+                _collect(f, sid, results)
+
+    # ---- Rebuild one CSV per module from the cache: existing rows updated, new subjects in file order ----
+    out = {}
+    for module in modules:
+        table    = _load_module_csv(module)
+        selected = [g for g in groups if g.module == module]
+        rows     = {}
+        n_computed = n_from_cache = 0
+        for sid, digest in hashes.items():
+            valid = [g for g in selected if _cell_is_valid(cells, sid, g, digest, fs)]
+            if not valid and sid not in table.index:
+                continue
+            if any((sid, g.name) in computed for g in selected):
+                n_computed += 1
+            elif valid:
+                n_from_cache += 1
+            rows[sid] = {}
+            for g in selected:          # stale or failed cells are not carried over
+                feats = cells[(sid, g.name)][3] if g in valid else {}
+                rows[sid].update({k: feats.get(k, np.nan) for k in g.outputs})
+        if table.empty and not rows:
+            print(f"  [WARN] {module}: no features extracted")
+            continue
+
+        declared = [k for g in select_groups([module]) for k in g.outputs]
+        new_keys = {k for g in selected for k in g.outputs} if rows else set()
+        columns  = [k for k in dict.fromkeys(declared) if k in table.columns or k in new_keys]
+        columns += [c for c in table.columns if c not in columns]
+        index    = list(table.index) + [sid for sid in rows if sid not in table.index]
+
+        table = table.reindex(index=index, columns=columns).astype(object)     # keeps counts as ints
+        for sid, feats in rows.items():
+            table.loc[sid, list(feats)] = list(feats.values())
+
+        feature_df = table.rename_axis("subject_id").reset_index().infer_objects()
+        csv_path = FEATURES_DIR / MODULE_CSVS[module]
+        csv_path.parent.mkdir(parents=True, exist_ok=True)
+        feature_df.to_csv(csv_path, index=False)
+        print(f"  {module}: {feature_df.shape[0]} subjects, {feature_df.shape[1]-1} features "
+              f"({n_computed} computed, {n_from_cache} from cache) -> {csv_path}")
+        out[module] = feature_df
+    return out
  
  
+def _drop_cached(names: list[str]) -> None:
+    """Invalidate the cached features of the selected groups for every subject (``--force``)."""
+    names  = [n for n in names if n in MODULE_CSVS or n in GROUPS]
+    groups = [g.name for g in select_groups(names)] if names else []
+    n = clear_cells(groups, _cache_path())
+    if groups:
+        print(f"  [FORCE] Cleared {n} cached cells of {len(groups)} feature groups")
+
+
 def _run_patient_module(
         merged_dir:    Path,
         pattern:       str,
         patient_excel: Path | None,
 ) -> pd.DataFrame | None:
     """Special handler for patient features (needs patient_excel)."""
+    from features.patient_feats import extract_patient_features
+
     if patient_excel is None:
         print("  [SKIP] patient module — no --patient-excel provided")
         return None
@@ -121,59 +321,63 @@ def _run_patient_module(
 def merge_feature_csvs(
         features_dir: Path = FEATURES_DIR,
         output_file:  Path | None = None,
+        tables:       dict[str, pd.DataFrame] | None = None,
 ) -> pd.DataFrame:
     """
-    Outer-join all ``*_features.csv`` files in ``features_dir`` on ``subject_id``.
+    Combine all ``*_features.csv`` files in ``features_dir`` into one table on ``subject_id``.
+
+    The tables are written into one preallocated subject × feature float32 matrix
+    (``features.matrix.FeatureMatrix``) in a single pass, which gives the outer join
+    of all tables without pairwise merges. A column found in several tables is
+    taken from the first (in file name order). Integer columns are written as
+    integers (``Int64``) and columns float32 would round are written in float64.
  
     Parameters
     ----------
     features_dir : Path
         Directory containing per-module feature CSVs.
     output_file : Path | None
-        If provided, save the merged DataFrame here.
+        If provided, save the merged table here (Parquet if it ends in ``.parquet``).
+    tables : dict[str, pd.DataFrame] | None
+        Module tables already in memory, by CSV file name (e.g. from ``_run_modules``);
+        these files are not read again.
  
     Returns
     -------
     pd.DataFrame
         One row per subject, all features merged.
     """
-    csv_files = sorted(features_dir.glob("*_features.csv"))
+    tables    = tables or {}
+    csv_files = sorted(set(features_dir.glob("*_features.csv")) | {features_dir / name for name in tables})
  
     if not csv_files:
         print("No per-module feature CSVs found — nothing to merge.")
         return pd.DataFrame()
  
-    dfs = []
+    dfs = {}
     for f in csv_files:
         try:
-            df = pd.read_csv(f, low_memory=False)
+            df = tables[f.name] if f.name in tables else pd.read_csv(f, low_memory=False)
             if "subject_id" not in df.columns:
                 print(f"  [SKIP] {f.name} — missing 'subject_id' column")
                 continue
             print(f"  Loaded {f.name}: {df.shape[0]} subjects, {df.shape[1]-1} features")
-            dfs.append(df)
+            dfs[f.stem] = df
         except Exception as e:
             print(f"  [SKIP] {f.name} — {e}")
  
     if not dfs:
         return pd.DataFrame()
  
-    # Outer join all DataFrames on subject_id
-    combined = reduce(
-        lambda left, right: pd.merge(left, right, on="subject_id", how="outer", suffixes=("", "_dup")),
-        dfs
-    )
- 
-    # Drop any duplicate columns created by merge (e.g. subject_id_dup)
-    dup_cols = [c for c in combined.columns if c.endswith("_dup")]
-    if dup_cols:
-        combined.drop(columns=dup_cols, inplace=True)
+    # One matrix for all tables: every table's block written at its subjects' rows
+    matrix = FeatureMatrix.from_tables(dfs)
  
     if output_file is not None:
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        combined.to_csv(output_file, index=False)
+        combined = matrix.save(output_file)
         print(f"\nMerged feature table saved -> {output_file}  "
-              f"({combined.shape[0]} subjects, {combined.shape[1]-1} features)")
+              f"({matrix.shape[0]} subjects, {matrix.shape[1]} features)")
+    else:
+        combined = matrix.to_frame()
  
     return combined
  
@@ -190,6 +394,7 @@ def collect_features(
         force:         bool = False,
         patient_excel: str | Path | None = None,
         output_csv:    str | Path | None = None,
+        workers:       int = 1,
 ) -> pd.DataFrame:
     """
     Run feature extraction modules and merge results into a single CSV.
@@ -203,16 +408,19 @@ def collect_features(
     pattern : str
         Glob pattern to match merged CSVs. Default is ``'*_merged.csv'``.
     modules : list[str] | None
-        Which modules to run. None or empty = all modules.
-        Valid names: 'eog', 'gssc', 'eeg', 'bout', 'patient'.
+        Which modules or feature groups to run. None or empty = all modules.
+        Valid names: 'eog', 'gssc', 'eeg', 'bout', 'extra', 'patient', or any
+        group name in ``features.registry.GROUPS`` (e.g. 'em_morphology').
     force : bool
-        If True, delete existing per-module CSVs for selected modules
-        before re-extracting. Default is False.
+        If True, invalidate the cached features of the selected modules/groups
+        so they are re-extracted for every subject. Default is False.
     patient_excel : str | Path | None
         Path to patient info Excel file. Required if 'patient' module is selected.
     output_csv : str | Path | None
-        Path to save the final merged feature CSV.
+        Path to save the final merged feature CSV (Parquet if it ends in ``.parquet``).
         Default is ``features_csv/features.csv``.
+    workers : int
+        Subjects extracted in parallel (process pool). Default is **1**.
  
     Returns
     -------
@@ -225,47 +433,42 @@ def collect_features(
     output_csv = Path(output_csv)
  
     # Default to all modules
-    if not modules:
+    if not modules or "all" in modules:
         modules = list(ALL_MODULE_NAMES)
  
     print(f"\n{'='*60}")
     print(f"  Feature extraction")
     print(f"  Modules : {modules}")
     print(f"  Force   : {force}")
+    print(f"  Workers : {workers}")
     print(f"  Dir     : {merged_dir}")
     print(f"{'='*60}")
  
-    # ---- Force: delete selected module CSVs ----
+    feature_names = [name for name in modules if name != "patient"]
+
+    # ---- Force: clear the selected groups' cached cells ----
     if force:
-        for name in modules:
-            if name == "patient":
-                csv_path = FEATURES_DIR / "patient_features.csv"
-            elif name in MODULE_REGISTRY:
-                _, csv_name = MODULE_REGISTRY[name]
-                csv_path = FEATURES_DIR / csv_name
-            else:
-                continue
+        if "patient" in modules and (FEATURES_DIR / "patient_features.csv").exists():
+            (FEATURES_DIR / "patient_features.csv").unlink()
+            print(f"  [FORCE] Deleted {FEATURES_DIR / 'patient_features.csv'}")
+        _drop_cached(feature_names)
  
-            if csv_path.exists():
-                csv_path.unlink()
-                print(f"  [FORCE] Deleted {csv_path}")
- 
-    # ---- Run selected modules ----
-    for name in modules:
-        _run_module(
-            name=name,
-            merged_dir=merged_dir,
-            fs=fs,
-            pattern=pattern,
-            patient_excel=Path(patient_excel) if patient_excel else None,
-        )
+    # ---- Run selected feature groups (one read per merged CSV) ----
+    tables = {}
+    if feature_names:
+        module_tables = _run_modules(feature_names, merged_dir=merged_dir, fs=fs, pattern=pattern, workers=workers)
+        tables.update({MODULE_CSVS[m]: t for m, t in module_tables.items()})
+    if "patient" in modules:
+        patient = _run_patient_module(merged_dir, pattern, Path(patient_excel) if patient_excel else None)
+        if patient is not None:
+            tables["patient_features.csv"] = patient
  
     # ---- Merge all per-module CSVs ----
     print(f"\n{'='*60}")
     print(f"  Merging all per-module CSVs")
     print(f"{'='*60}")
  
-    combined = merge_feature_csvs(FEATURES_DIR, output_file=output_csv)
+    combined = merge_feature_csvs(FEATURES_DIR, output_file=output_csv, tables=tables)
  
     return combined
 
@@ -1148,6 +1351,7 @@ def main():
           python feat_report.py merged_csv_eog/
           python feat_report.py merged_csv_eog/ --modules bout eog --force
           python feat_report.py merged_csv_eog/ --output reports/my_report.html
+          python feat_report.py merged_csv_eog/ --workers 4
         """,
     )
     parser.add_argument("merged_dir", type=str, help="Directory with merged CSV files")
@@ -1156,12 +1360,14 @@ def main():
     parser.add_argument("--output", type=str, default=None, help="Output HTML path (default: reports/features_report.html)")
     parser.add_argument("--csv", type=str, default=None, help="Output merged feature CSV path")
     parser.add_argument("--modules", type=str, nargs="*", default=None,
-                       choices=["eog", "gssc", "eeg", "bout", "extra", "patient"],
-                       help="Which modules to run (default: all)")
+                       choices=[*MODULE_CSVS, "patient", *GROUPS], metavar="NAME",
+                       help="Modules or single feature groups to run (default: all)")
     parser.add_argument("--force", action="store_true",
-                       help="Delete existing module CSVs before re-extracting")
+                       help="Drop existing outputs of the selected modules/groups before re-extracting")
     parser.add_argument("--patient-excel", type=str, default=None,
                        help="Path to patient info Excel file (needed for 'patient' module)")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Subjects extracted in parallel (default: 1)")
 
     args = parser.parse_args()
     merged_dir = Path(args.merged_dir)
@@ -1179,6 +1385,7 @@ def main():
         force=args.force,
         patient_excel=args.patient_excel,
         output_csv=args.csv,
+        workers=args.workers,
     )
 
     if combined.empty:
@@ -0,0 +1,121 @@
+# Filename: gssc_precision_report.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Agreement report for the reduced-precision GSSC staging modes (int8 / bf16).
+#              Stages a sample of sessions once in fp32 and once in the chosen mode on the
+#              same prepared epochs, and reports Cohen's kappa, epoch agreement, the largest
+#              stage-probability difference and the speed-up per session.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.metrics import cohen_kappa_score
+
+from preprocessing.edf_reader import read_raw_eog
+from preprocessing.GSSC_to_csv import (
+    BATCH_EPOCHS, get_gssc_engine, infer_nights, _load_eog_raw, _session_epochs,
+)
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Stage in both precisions and compare
+# 1 —————————————————————————————————————————————————————————————————————
+def compare_gssc_precision(
+        edf_paths:    list[str | Path],
+        precision:    str = "int8",
+        n_threads:    int | None = None,
+        batch_epochs: int = BATCH_EPOCHS,
+        ) -> pd.DataFrame:
+    """
+    Compare reduced-precision GSSC staging against fp32 on a sample of sessions.
+
+    Each EDF is loaded and epoched once; both engines stage the same tensors, so the
+    differences come from the networks only.
+
+    Parameters
+    ----------
+    edf_paths : list[str | Path]
+        EDF files to stage. The session id is the parent folder name.
+    precision : str
+        Mode to compare against fp32: ``"int8"`` or ``"bf16"``. Default is **"int8"**.
+    n_threads : int | None
+        Torch intra-op threads for both runs. Default is **None** (torch default).
+    batch_epochs : int
+        Epochs per signal-network forward pass. Default is **4096**.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per session: ``n_epochs``, ``kappa``, ``agreement``, ``max_abs_dprob``,
+        ``mean_abs_dprob``, ``t_fp32``, ``t_<precision>`` and ``speedup``.
+    """
+    ref  = get_gssc_engine(n_threads=n_threads, precision="fp32")
+    fast = get_gssc_engine(n_threads=n_threads, precision=precision)
+
+    rows = []
+    for edf_path in edf_paths:
+        edf_path = Path(edf_path)
+        x, _ = _session_epochs(ref, _load_eog_raw(edf_path, raw=read_raw_eog(edf_path)))
+
+        t0 = time.perf_counter()
+        [(stages_ref, probs_ref)] = infer_nights(ref, [x], batch_epochs, "fp32")
+        t_ref = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        [(stages_q, probs_q)] = infer_nights(fast, [x], batch_epochs, precision)
+        t_q = time.perf_counter() - t0
+
+        dprob = np.abs(probs_ref - probs_q)
+        rows.append({
+            "session":        edf_path.parent.name,
+            "n_epochs":       len(stages_ref),
+            "kappa":          float(cohen_kappa_score(stages_ref, stages_q)),
+            "agreement":      float((stages_ref == stages_q).mean()),
+            "max_abs_dprob":  float(dprob.max()),
+            "mean_abs_dprob": float(dprob.mean()),
+            "t_fp32":         t_ref,
+            f"t_{precision}": t_q,
+            "speedup":        t_ref / t_q if t_q > 0 else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Pretty-print the report
+# 2 —————————————————————————————————————————————————————————————————————
+def print_gssc_precision_report(report: pd.DataFrame, precision: str = "int8") -> None:
+    """Print the output of :func:`compare_gssc_precision` with a pooled summary line."""
+    print(f"\n{'=' * 60}")
+    print(f"  GSSC {precision} vs fp32 staging — agreement report")
+    print(f"{'=' * 60}")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if not report.empty:
+        print(f"\n  min kappa          {report['kappa'].min():.4f}")
+        print(f"  min agreement      {report['agreement'].min():.4f}")
+        print(f"  max |Δprob|        {report['max_abs_dprob'].max():.4f}")
+        print(f"  median speed-up    {report['speedup'].median():.2f}x")
+    print(f"{'=' * 60}\n")
+
+
+# =====================================================================
+# Entry point
+# =====================================================================
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare int8/bf16 GSSC staging against fp32.")
+    parser.add_argument("edf_paths", type=str, nargs="+", help="EDF files to stage (a sample of sessions)")
+    parser.add_argument("--precision", type=str, default="int8", choices=["int8", "bf16"])
+    parser.add_argument("--gssc-threads", type=int, default=None, help="Torch threads (default: torch default)")
+    args = parser.parse_args()
+
+    report = compare_gssc_precision(args.edf_paths, precision=args.precision, n_threads=args.gssc_threads)
+    print_gssc_precision_report(report, args.precision)
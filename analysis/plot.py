@@ -13,9 +13,10 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import matplotlib.patches as mpatches
 from pathlib import Path
-from scipy.signal import welch
 from art import *
 
+from features.spectral import masked_psd
+
 # Global styling — bold axis labels and tick numbers on all plots
 plt.rcParams["font.weight"]       = "bold"
 plt.rcParams["axes.labelweight"]  = "bold"
@@ -1004,7 +1005,11 @@ def plot_eeg_psd(
 ) -> None:
     """
     Compute and plot the Power Spectral Density (PSD) of the recovered EEG
-    signal for each sleep stage using Welch's method.
+    signal for each sleep stage.
+
+    Welch's method is applied to each contiguous run of a stage and the run
+    PSDs are averaged weighted by run length (features/spectral.py), so no
+    segment spans a stage change or a gap in the recording.
  
     Two side-by-side panels are produced — one for EEG_LOC and one for
     EEG_ROC — so the two derivations can be compared. Classical EEG
@@ -1082,14 +1087,14 @@ def plot_eeg_psd(
                 ha="center", va="bottom", fontsize=10, color="#555555",
             )
  
-        # PSD per stage
+        # PSD per stage (Welch per contiguous run of the stage)
+        sig = pd.to_numeric(df[col], errors="coerce").to_numpy()
         for stage, color in STAGE_COLORS.items():
-            mask = df[stage_col] == stage
-            sig = df.loc[mask, col].values
-            print(f"  {stage} sig — min: {sig.min():.4f}  max: {sig.max():.4f}  std: {sig.std():.4f}")
-            if len(sig) < min_samples:
+            mask = (df[stage_col] == stage).to_numpy()
+            f, psd, n_used = masked_psd(sig, mask, fs, nperseg)
+            print(f"  {stage}: {int(mask.sum()):,} samples, {n_used:,} in runs of at least {nperseg_sec:g}s")
+            if n_used < min_samples:
                 continue
-            f, psd = welch(sig, fs=fs, nperseg=min(nperseg, len(sig)))
             band_mask = (f >= 0.5) & (f <= 35.0)
             print(f"  {stage} PSD — min: {psd[band_mask].min():.4f}  max: {psd[band_mask].max():.4f}  any zeros: {(psd[band_mask] == 0).any()}")
             ax.semilogy(f[band_mask], psd[band_mask], color=color, linewidth=1.8, label=stage, zorder=2)
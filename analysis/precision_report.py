@@ -0,0 +1,214 @@
+# Filename: precision_report.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Numerical-equivalence report for the float32 detection path.
+#              Runs detect_em and classify_rem_epochs_Umaer once in float64 and once
+#              in float32 on the same signals, and reports event counts, matched-event
+#              feature deltas and Phasic/Tonic agreement.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from analysis.detect_em import detect_em, classify_rem_epochs_Umaer
+
+# =====================================================================
+# Constants
+# =====================================================================
+
+# Numeric per-event columns compared between the two precisions
+FEATURE_COLS = [
+    "Start", "Peak", "End", "Duration",
+    "LOCAbsValPeak", "ROCAbsValPeak", "MeanAbsValPeak",
+    "LOCAbsRiseSlope", "ROCAbsRiseSlope",
+    "LOCAbsFallSlope", "ROCAbsFallSlope",
+]
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Run detection in both precisions and compare
+# 1 —————————————————————————————————————————————————————————————————————
+def compare_precision(
+        loc:               np.ndarray,
+        roc:               np.ndarray,
+        hypno_int:         np.ndarray,
+        fs:                float = 128,
+        epoch_len:         int   = 30,
+        Dur_Thresh_SEM:    float = 0.5,
+        phasic_dur_thresh: float = 1.0,
+        peak_tol:          float | None = None,
+        ) -> tuple[dict, pd.DataFrame]:
+    """
+    Compare the float64 and float32 detection paths on the same LOC/ROC signals.
+
+    Events are matched on their ``Peak`` time: each float32 event is paired with the
+    nearest float64 event, and the pair counts as matched if the peaks are within ``peak_tol``.
+
+    Parameters
+    ----------
+    loc : np.ndarray
+        LOC signal in µV at ``fs`` Hz.
+    roc : np.ndarray
+        ROC signal in µV at ``fs`` Hz.
+    hypno_int : np.ndarray
+        Integer hypnogram (0: W, 1: N1, 2: N2, 3: N3, 4: REM), one value per ``epoch_len`` seconds.
+    fs : float
+        Sampling frequency in Hz. ``detect_rem_jaec`` assumes **128 [Hz]**.
+    epoch_len : int
+        Length of a scored epoch in seconds. Default is **30 [s]**.
+    Dur_Thresh_SEM : float
+        SEM duration threshold passed to ``detect_em``. Default is **0.5 [s]**.
+    phasic_dur_thresh : float
+        Phasic threshold passed to ``classify_rem_epochs_Umaer``. Default is **1.0 [s]**.
+    peak_tol : float | None
+        Maximum peak-time difference in seconds for two events to be matched. \\
+        Default is **None** (one sample, ``1 / fs``).
+
+    Returns
+    -------
+    summary : dict
+        Event counts per precision, number of matched events, EM_Type agreement on matched
+        events and Phasic/Tonic agreement on the sub-epoch grid.
+    feature_deltas : pd.DataFrame
+        One row per column in ``FEATURE_COLS`` with ``max_abs_delta``, ``mean_abs_delta`` and
+        ``max_rel_delta`` over matched events.
+    """
+    if loc.shape != roc.shape:
+        raise ValueError(f"LOC and ROC must have the same shape. Got LOC: {loc.shape}, ROC: {roc.shape}")
+    if peak_tol is None:
+        peak_tol = 1.0 / fs
+
+    # --- 1) Upsample and trim hypnogram/signals exactly like the pipeline ---
+    hypno_up = np.repeat(np.asarray(hypno_int), int(fs * epoch_len))
+    factor   = 2 ** 14
+    trim     = (min(len(loc), len(hypno_up)) // factor) * factor
+    if trim == 0:
+        raise ValueError(f"Signal too short for dtcwt — need at least {factor} samples, got {len(loc)}.")
+    loc, roc, hypno_up = loc[:trim], roc[:trim], hypno_up[:trim]
+
+    # --- 2) Run both precisions ---
+    runs = {}
+    for name, dtype in [("float64", np.float64), ("float32", np.float32)]:
+        em_df = detect_em(loc, roc, hypno_up, fs=fs, Dur_Thresh_SEM=Dur_Thresh_SEM, dtype=dtype)
+        sub_df = classify_rem_epochs_Umaer(
+            em_df, loc, roc, hypno_int, sf=fs,
+            epoch_len=epoch_len, phasic_dur_thresh=phasic_dur_thresh,
+        )
+        runs[name] = (em_df, sub_df)
+
+    em64, sub64 = runs["float64"]
+    em32, sub32 = runs["float32"]
+
+    # --- 3) Match events on nearest peak ---
+    peaks64 = em64["Peak"].to_numpy(dtype=float)
+    peaks32 = em32["Peak"].to_numpy(dtype=float)
+    if len(peaks64) and len(peaks32):
+        pos  = np.clip(np.searchsorted(peaks64, peaks32), 1, len(peaks64)) - 1
+        nxt  = np.minimum(pos + 1, len(peaks64) - 1)
+        pick = np.where(np.abs(peaks64[nxt] - peaks32) < np.abs(peaks64[pos] - peaks32), nxt, pos)
+        matched = np.abs(peaks64[pick] - peaks32) <= peak_tol + 1e-9
+        idx64, idx32 = pick[matched], np.flatnonzero(matched)
+    else:
+        idx64 = idx32 = np.array([], dtype=int)
+
+    # --- 4) Feature deltas on matched events ---
+    rows = []
+    for col in FEATURE_COLS:
+        a = em64[col].to_numpy(dtype=float)[idx64]
+        b = em32[col].to_numpy(dtype=float)[idx32]
+        delta = np.abs(a - b)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rel = np.where(np.abs(a) > 0, delta / np.abs(a), 0.0)
+        rows.append({
+            "feature":        col,
+            "max_abs_delta":  float(delta.max()) if len(delta) else np.nan,
+            "mean_abs_delta": float(delta.mean()) if len(delta) else np.nan,
+            "max_rel_delta":  float(np.nanmax(rel)) if len(rel) else np.nan,
+        })
+    feature_deltas = pd.DataFrame(rows)
+
+    # --- 5) Summary ---
+    type_agree = (
+        float((em64["EM_Type"].to_numpy()[idx64] == em32["EM_Type"].to_numpy()[idx32]).mean())
+        if len(idx64) else np.nan
+    )
+    if not sub64.empty and len(sub64) == len(sub32):
+        sub_agree = float((sub64["EpochType"].to_numpy() == sub32["EpochType"].to_numpy()).mean())
+    else:
+        sub_agree = np.nan
+
+    summary = {
+        "n_events_float64":       len(em64),
+        "n_events_float32":       len(em32),
+        "n_matched":              len(idx64),
+        "n_rem_float64":          int((em64["EM_Type"] == "REM").sum()),
+        "n_rem_float32":          int((em32["EM_Type"] == "REM").sum()),
+        "em_type_agreement":      type_agree,
+        "n_subepochs":            len(sub64),
+        "n_phasic_float64":       int((sub64.get("EpochType", pd.Series(dtype=str)) == "Phasic").sum()),
+        "n_phasic_float32":       int((sub32.get("EpochType", pd.Series(dtype=str)) == "Phasic").sum()),
+        "subepoch_agreement":     sub_agree,
+    }
+    return summary, feature_deltas
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Pretty-print the report
+# 2 —————————————————————————————————————————————————————————————————————
+def print_precision_report(summary: dict, feature_deltas: pd.DataFrame) -> None:
+    """Print the output of :func:`compare_precision` as a readable report."""
+    print(f"\n{'=' * 60}")
+    print("  float32 vs float64 detection — equivalence report")
+    print(f"{'=' * 60}")
+    for k, v in summary.items():
+        print(f"  {k:<24} {v}")
+    print(f"\n{feature_deltas.to_string(index=False)}")
+    print(f"{'=' * 60}\n")
+
+
+# =====================================================================
+# Entry point
+# =====================================================================
+if __name__ == "__main__":
+    import sys
+    import mne
+
+    from preprocessing.channel_standardization import build_rename_map
+    from preprocessing.index_file import parse_lights_txt
+    from preprocessing.resample import resample_raw
+
+    if len(sys.argv) < 3:
+        print("Usage: python -m analysis.precision_report <edf_path> <gssc_csv> [lights_txt]")
+        sys.exit(1)
+
+    edf_path  = Path(sys.argv[1])
+    gssc_path = Path(sys.argv[2])
+    lights    = Path(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    raw = mne.io.read_raw_edf(edf_path, preload=False, verbose=False)
+    rename_map = build_rename_map(raw.ch_names)
+    if rename_map:
+        raw.rename_channels(rename_map)
+    raw.pick(["LOC", "ROC"]).load_data()
+
+    if lights is not None:
+        lights_off, lights_on = parse_lights_txt(lights)
+        raw.crop(tmin=max(0.0, lights_off), tmax=min(lights_on, raw.times[-1]))
+    raw = resample_raw(raw, 128)
+
+    stage_map = {"W": 0, "N1": 1, "N2": 2, "N3": 3, "REM": 4}
+    hypno = pd.read_csv(gssc_path)["stage"].map(stage_map).fillna(0).astype(int).values
+
+    summary, deltas = compare_precision(
+        raw.get_data(picks=["LOC"])[0] * 1e6,
+        raw.get_data(picks=["ROC"])[0] * 1e6,
+        hypno,
+    )
+    print_precision_report(summary, deltas)
@@ -1,16 +1,32 @@
 import os
 import sys
+import time
 import numpy as np
 import pandas as pd
 import yasa
 import dtcwt
 from scipy.ndimage import minimum_filter1d, maximum_filter1d
 
-def detect_rem_jaec(loc, roc, hypno_up, method='original'):
+def _lap(timings, key, t0):
+    # Add the time since t0 to timings[key] (if a dict was passed) and return a new reference time
+    t1 = time.perf_counter()
+    if timings is not None:
+        timings[key] = timings.get(key, 0.0) + (t1 - t0)
+    return t1
+
+def detect_rem_jaec(loc, roc, hypno_up, method='original', dtype=None, timings=None):
     
     # Fixed threshold
     fs = 128
 
+    # Optional per-step wall-clock timings (seconds), filled in if a dict is passed
+    t0 = time.perf_counter()
+
+    # Optional working precision (e.g. np.float32 -> complex64 DTCWT coefficients)
+    if dtype is not None:
+        loc = np.asarray(loc, dtype=dtype)
+        roc = np.asarray(roc, dtype=dtype)
+
     # Thresholds
     T_angle = 0.9 * np.pi
     T_amp = 600
@@ -24,12 +40,13 @@ def detect_rem_jaec(loc, roc, hypno_up, method='original'):
     # DTCWT
     loc_dtcwt = dtcwt_transform.forward(loc, nlevels=14)
     roc_dtcwt = dtcwt_transform.forward(roc, nlevels=14)
+    t0 = _lap(timings, 'dtcwt_forward', t0)
 
     # Difference angle (arctan)
     diff_angle = [np.angle(x) - np.angle(y) for x, y in zip(roc_dtcwt.highpasses, loc_dtcwt.highpasses)]
     diff_angle = [np.mod(a + np.pi, 2 * np.pi) - np.pi for a in diff_angle]
     diff_angle = [np.min(np.concatenate([np.abs(a), 2*np.pi - np.abs(a)], 1), 1) for a in diff_angle]
-    angle_mask = [np.expand_dims(1.0*(a > T_angle), 1) for a in diff_angle]
+    angle_mask = [np.expand_dims((a > T_angle).astype(a.dtype), 1) for a in diff_angle] # **Changed** Original:  np.expand_dims(1.0*(a > T_angle), 1)
 
     # Set sub-threshold values to zero
     loc_dtcwt_angle_corrected = []
@@ -39,6 +56,7 @@ def detect_rem_jaec(loc, roc, hypno_up, method='original'):
         roc_dtcwt_angle_corrected.append(roc_dtcwt.highpasses[i] * angle_mask[i])
     loc_dtcwt.highpasses = tuple(loc_dtcwt_angle_corrected)
     roc_dtcwt.highpasses = tuple(roc_dtcwt_angle_corrected)
+    t0 = _lap(timings, 'angle_mask', t0)
 
     # Initialain mask
     gain_mask = [0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0]
@@ -46,6 +64,7 @@ def detect_rem_jaec(loc, roc, hypno_up, method='original'):
     # Clean signal
     loc_clean = dtcwt_transform.inverse(loc_dtcwt, gain_mask)
     roc_clean = dtcwt_transform.inverse(roc_dtcwt, gain_mask)
+    t0 = _lap(timings, 'dtcwt_inverse', t0)
 
     # Difference signal
     A_diff = np.abs(roc_clean - loc_clean)
@@ -74,6 +93,7 @@ def detect_rem_jaec(loc, roc, hypno_up, method='original'):
 
         # Threshold A diff
         EM_cand = np.logical_and(A_diff < T_amp, A_diff > T_pth)
+        t0 = _lap(timings, 'threshold', t0)
 
         # Identify the start and end of each True interval in X
         dEM_cand = np.diff(EM_cand.astype(int))
@@ -123,6 +143,7 @@ def detect_rem_jaec(loc, roc, hypno_up, method='original'):
 
         pks_params['left_bases']  = np.array(pks_params['left_bases'], dtype=int)   # **Changed** Original:  pks_params['left_bases']  = np.array(pks_params['left_bases'])
         pks_params['right_bases']  = np.array(pks_params['right_bases'], dtype=int) # **Changed** Original:  pks_params['right_bases']  = np.array(pks_params['right_bases'])
+        t0 = _lap(timings, 'peak_base_search', t0)
 
         # Stage
         if not np.isscalar(hypno_up):
@@ -181,7 +202,9 @@ def detect_rem_jaec(loc, roc, hypno_up, method='original'):
             df["Stage"] = df["Stage"].astype(int)
 
         df = df.reset_index(drop=True)
-        return yasa.REMResults(events=df, data=np.vstack((loc, roc)), sf=fs, ch_names=['LOC', 'ROC'], hypno=hypno_up, data_filt=np.vstack((loc_clean, roc_clean)))
+        result = yasa.REMResults(events=df, data=np.vstack((loc, roc)), sf=fs, ch_names=['LOC', 'ROC'], hypno=hypno_up, data_filt=np.vstack((loc_clean, roc_clean)))
+        _lap(timings, 'rem_results', t0)
+        return result
 
     else:
         raise Exception("method ['original', 'ssc_threshold'].")
@@ -14,91 +14,21 @@ import pandas as pd
 from pathlib import Path
 import re
 
+from features.context import SubjectContext, label_runs, subject_context
+
 # =========================================================================================================
 # Constants
 # =========================================================================================================
 SUB_EPOCH_LEN_S = 4.0  # duration of each sub-epoch in seconds
 _DCSM_PATTERN = re.compile(r"(DCSM_\d+_[a-zA-Z])")
 FEATURES_DIR = Path("features_csv")
-FEATURES_DIR.mkdir(parents=True, exist_ok=True)
 
 # =========================================================================================================
 # Helpers
 # =========================================================================================================
 
-def _rem_samples(df: pd.DataFrame) -> pd.DataFrame:
-    """Return only samples scored as REM sleep by GSSC."""
-    return df[df["stage"] == "REM"].copy()
-
-
-def _get_subepoch_series(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Deduplicate the merged DataFrame to one row per 4-second sub-epoch
-    inside REM sleep, returning a DataFrame with at least an 'EpochType' column.
-
-    Uses em_SubEpochStart if available, otherwise falls back to time_sec binning.
-    Mirrors the deduplication logic in eog_feats._phasic_tonic_features().
-    """
-    # 1) Filter to REM samples
-    rem_df = _rem_samples(df)
-    if rem_df.empty or "EpochType" not in rem_df.columns:
-        return pd.DataFrame(columns=["EpochType"])
-
-    # 2) Deduplicate to one row per sub-epoch
-    if "em_SubEpochStart" in rem_df.columns:
-        subepoch_df = rem_df.drop_duplicates(subset="em_SubEpochStart").copy()
-
-    # Fallback: if em_SubEpochStart is not available, use time_sec binning to deduplicate
-    else:
-        subepoch_df = rem_df[rem_df["EpochType"].notna()].copy()
-        subepoch_df["_epoch_bin"] = (subepoch_df["time_sec"] // SUB_EPOCH_LEN_S).astype(int)
-        subepoch_df = subepoch_df.drop_duplicates(subset="_epoch_bin")
-
-    return subepoch_df.reset_index(drop=True)
-
-
-def _identify_bouts(
-        types: pd.Series, 
-        label: str
-        ) -> list[int]:
-    """
-    Given a Series of EpochType values (in temporal order), identify bouts
-    of consecutive sub-epochs matching ``label`` and return a list of bout
-    lengths (in number of sub-epochs).
-
-    Parameters
-    ----------
-    types : pd.Series
-        Ordered EpochType values, e.g. ['Phasic', 'Phasic', 'Tonic', 'Phasic', ...].
-    label : str
-        The type to look for ('Phasic' or 'Tonic').
-
-    Returns
-    -------
-    list[int]
-        Length of each bout in number of sub-epochs.
-    """
-    bouts: list[int] = []
-    current_len = 0
-
-    # Iterate through the sequence of types and count consecutive runs of the target label
-    for val in types:
-        if val == label:                  # If the current sub-epoch matches the target label (e.g. 'Phasic') 
-            current_len += 1              # Increment current bout length
-        else:
-            if current_len > 0:           # If in the middle of a bout and hit a different label, end the bout
-                bouts.append(current_len) # Save the completed bout length
-            current_len = 0
-
-    # flush last bout
-    if current_len > 0:
-        bouts.append(current_len)
-
-    return bouts
-
-
 def _bout_stats(
-        bouts: list[int], 
+        bouts: np.ndarray, 
         label: str, 
         rem_min: float
         ) -> dict:
@@ -107,8 +37,8 @@ def _bout_stats(
 
     Parameters
     ----------
-    bouts : list[int]
-        List of bout lengths in number of sub-epochs.
+    bouts : np.ndarray
+        Bout lengths in number of sub-epochs (runs of ``label``, see ``label_runs``).
     label : str
         Bout type label ('Phasic' or 'Tonic') for naming features.
     rem_min : float
@@ -122,7 +52,7 @@ def _bout_stats(
     prefix = label.lower()
     feats: dict = {}
 
-    if not bouts:
+    if len(bouts) == 0:
         for suffix in [
             "bout_count", "bout_mean_duration_s", "bout_max_duration_s",
             "bout_min_duration_s", "bout_std_duration_s", "bout_median_duration_s",
@@ -131,7 +61,7 @@ def _bout_stats(
             feats[f"{prefix}_{suffix}"] = np.nan
         return feats
 
-    durations_s = np.array(bouts) * SUB_EPOCH_LEN_S
+    durations_s = np.asarray(bouts) * SUB_EPOCH_LEN_S
 
     feats[f"{prefix}_bout_count"]             = len(bouts)
     feats[f"{prefix}_bout_mean_duration_s"]   = round(float(durations_s.mean()), 4)
@@ -149,7 +79,7 @@ def _bout_stats(
 # Main extraction function
 # =========================================================================================================
 
-def phasic_tonic_bout_features(df: pd.DataFrame, fs: float = 250.0) -> dict:
+def phasic_tonic_bout_features(data: pd.DataFrame | SubjectContext, fs: float = 250.0) -> dict:
     """
     Bout-level features for Phasic and Tonic REM sub-epochs.
 
@@ -158,9 +88,9 @@ def phasic_tonic_bout_features(df: pd.DataFrame, fs: float = 250.0) -> dict:
 
     Parameters
     ----------
-    df : pd.DataFrame
+    data : pd.DataFrame | SubjectContext
         Full merged DataFrame (output of merge_all) containing at minimum
-        ``time_sec``, ``stage``, and ``EpochType`` columns.
+        ``time_sec``, ``stage``, and ``EpochType`` columns, or its SubjectContext.
     fs : float
         Sampling frequency of the EOG signal in [Hz]. Default is **250.0 Hz**.
 
@@ -184,29 +114,30 @@ def phasic_tonic_bout_features(df: pd.DataFrame, fs: float = 250.0) -> dict:
     feats: dict = {}
 
     # ---- 1) Compute REM duration ----
-    rem_df = _rem_samples(df)
-    rem_min = len(rem_df) / fs / 60.0
-    print(f"    REM duration: {rem_min:.2f} [min]  ({len(rem_df):,} samples)")
+    ctx = subject_context(data)
+    rem_min = len(ctx.rem) / fs / 60.0
+    print(f"    REM duration: {rem_min:.2f} [min]  ({len(ctx.rem):,} samples)")
 
-    # ---- 2) Get deduplicated sub-epoch sequence ----
-    subepoch_df = _get_subepoch_series(df)
+    # ---- 2) Get deduplicated sub-epoch sequence (em_SubEpochStart, else time_sec bins) ----
+    subepoch_df = ctx.subepochs
 
     if subepoch_df.empty:
         print("    No sub-epochs found — returning NaN defaults")
         for label in ["phasic", "tonic"]:
-            feats.update(_bout_stats([], label.capitalize(), rem_min))
+            feats.update(_bout_stats(np.zeros(0, dtype=int), label.capitalize(), rem_min))
         return feats
 
     types = subepoch_df["EpochType"]
     print(f"    Sub-epochs: {len(types):,}  |  types: {types.value_counts().to_dict()}")
 
-    # ---- 3) Identify bouts and compute stats ----
+    # ---- 3) Identify bouts (runs of all labels at once) and compute stats ----
+    _, run_lengths, run_labels = label_runs(types)
     for label in ["Phasic", "Tonic"]:
-        bouts = _identify_bouts(types, label)
+        bouts = run_lengths[run_labels == label]
         feats.update(_bout_stats(bouts, label, rem_min))
 
-        if bouts:
-            dur_arr = np.array(bouts) * SUB_EPOCH_LEN_S
+        if len(bouts):
+            dur_arr = bouts * SUB_EPOCH_LEN_S
             print(
                 f"    {label} bouts: {len(bouts)}  |  "
                 f"mean: {dur_arr.mean():.1f} s  |  "
@@ -217,7 +148,7 @@ def phasic_tonic_bout_features(df: pd.DataFrame, fs: float = 250.0) -> dict:
             print(f"    {label} bouts: 0")
 
     # ---- 4) Phasic <-> Tonic transitions ----
-    transitions = (types != types.shift()).sum() - 1  # subtract 1 to get number of transitions not boundaries
+    transitions = len(run_labels) - 1  # boundaries between runs
     feats["phasic_tonic_transitions"] = int(transitions) if transitions >= 0 else 0
     print(f"    Phasic <-> Tonic transitions: {feats['phasic_tonic_transitions']}")
 
@@ -232,6 +163,7 @@ def extract_bout_features(
         merged_file: str | Path,
         subject_id:  str | None = None,
         fs:          float = 250.0,
+        df:          pd.DataFrame | None = None,
         ) -> dict:
     """
     Extract phasic/tonic bout features from a single merged CSV.
@@ -244,6 +176,9 @@ def extract_bout_features(
         Optional subject identifier. If None, the file stem is used.
     fs : float
         Sampling frequency in [Hz]. Default is **250.0 Hz**.
+    df : pd.DataFrame | None
+        Already loaded merged data (e.g. from the shared loader in feat_report).
+        If None, ``merged_file`` is read.
 
     Returns
     -------
@@ -260,7 +195,8 @@ def extract_bout_features(
     print(f"Extracting bout features: {merged_file.name}")
     print(f"  subject_id : {sid}  |  fs : {fs} [Hz]")
 
-    df = pd.read_csv(merged_file, low_memory=False)
+    if df is None:
+        df = pd.read_csv(merged_file, low_memory=False)
 
     feats: dict = {"subject_id": sid}
 
@@ -0,0 +1,117 @@
+# Filename: cache.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Persisted feature cache (SQLite) with one record per subject × feature group. A record
+#              is valid while the merged CSV's content hash, the group's version string
+#              (features/registry.py) and, for groups that take it, the sampling frequency are
+#              unchanged, so a re-merged session, an edited feature function or another --fs only
+#              recomputes the affected cells. The per-module CSVs are rebuilt from it.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+CACHE_NAME    = "feature_cache.sqlite"   # kept next to the module CSVs in features_csv/
+CACHE_VERSION = 2                        # bump when the schema changes (forces a rebuild)
+
+_HASH_CHUNK = 1 << 20   # 1 MiB reads while hashing merged CSVs
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Database helpers
+# 1 —————————————————————————————————————————————————————————————————————
+def _connect(db_path: Path) -> sqlite3.Connection:
+    """Open the cache and (re)create the schema if it is missing or from another version."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)
+    con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if row is None or row[0] != str(CACHE_VERSION):
+        con.execute("DROP TABLE IF EXISTS cells")
+        con.execute("DROP TABLE IF EXISTS file_hashes")
+        con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(CACHE_VERSION),))
+    con.execute("CREATE TABLE IF NOT EXISTS cells (subject_id TEXT, feature_group TEXT, file_hash TEXT, "
+                "version TEXT, fs REAL, features TEXT, computed_at REAL, "
+                "PRIMARY KEY (subject_id, feature_group))")
+    con.execute("CREATE TABLE IF NOT EXISTS file_hashes "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)")
+    return con
+
+
+def _to_json(feats: dict) -> str:
+    """Feature dict as JSON (numpy scalars as Python numbers, NaN kept)."""
+    return json.dumps(feats, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Merged-file content hash
+# 2 —————————————————————————————————————————————————————————————————————
+def file_hash(path: str | Path, db_path: str | Path) -> str:
+    """
+    BLAKE2b digest of a merged CSV's content.
+
+    The digest is stored with the file's size and mtime, so an untouched file is
+    not re-read on the next run; a touched but identical file keeps its hash.
+    """
+    path = Path(path)
+    st   = path.stat()
+    key  = str(path.resolve())
+    with contextlib.closing(_connect(Path(db_path))) as con, con:
+        row = con.execute("SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+        con.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                    (key, st.st_size, st.st_mtime_ns, digest.hexdigest()))
+        return digest.hexdigest()
+
+
+# 3 —————————————————————————————————————————————————————————————————————
+# 3 Cells
+# 3 —————————————————————————————————————————————————————————————————————
+def load_cells(db_path: str | Path) -> dict[tuple[str, str], tuple[str, str, float, dict]]:
+    """All cached cells as ``(subject_id, group) -> (file_hash, version, fs, features)``."""
+    if not Path(db_path).exists():
+        return {}
+    with contextlib.closing(_connect(Path(db_path))) as con:
+        rows = con.execute("SELECT subject_id, feature_group, file_hash, version, fs, features FROM cells").fetchall()
+    return {(sid, group): (h, version, fs, json.loads(feats)) for sid, group, h, version, fs, feats in rows}
+
+
+def store_cells(subject_id: str, file_hash: str, fs: float, cells: dict[str, tuple[str, dict]],
+                db_path: str | Path) -> None:
+    """Store ``group -> (version, features)`` computed for one subject at ``fs`` (replaces older records)."""
+    now = time.time()
+    with contextlib.closing(_connect(Path(db_path))) as con, con:
+        con.executemany("INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(subject_id, group, file_hash, version, float(fs), _to_json(feats), now)
+                         for group, (version, feats) in cells.items()])
+
+
+def clear_cells(groups: list[str], db_path: str | Path) -> int:
+    """Delete the cached cells of ``groups`` for every subject; returns the number removed."""
+    if not groups or not Path(db_path).exists():
+        return 0
+    with contextlib.closing(_connect(Path(db_path))) as con, con:
+        cur = con.execute(f"DELETE FROM cells WHERE feature_group IN ({', '.join('?' * len(groups))})", groups)
+        return cur.rowcount
@@ -0,0 +1,262 @@
+# Filename: context.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Per-subject context shared by all feature groups. Wraps one merged DataFrame and
+#              derives the stage codes, the REM mask and REM rows, the run-length hypnogram, the
+#              deduplicated EM / sub-epoch tables and the EEG spectrogram once, on first use,
+#              instead of once per group.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from features.spectral import Spectrogram
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+STAGES = ("W", "N1", "N2", "N3", "REM")      # stage code = index; -1 for unscored / unknown labels
+REM    = STAGES.index("REM")
+SLEEP_CODES = tuple(STAGES.index(s) for s in ("N1", "N2", "N3", "REM"))
+
+SUB_EPOCH_LEN_S = 4.0   # Umaer phasic/tonic sub-epochs
+
+# =====================================================================
+# Functions
+# =====================================================================
+def run_lengths(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Run-length encode a 1-D sequence.
+
+    Returns
+    -------
+    starts, lengths, run_values : np.ndarray
+        Start index, length and value of every run of equal consecutive values.
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), values[:0]
+    starts  = np.r_[0, np.flatnonzero(values[1:] != values[:-1]) + 1]
+    lengths = np.diff(np.r_[starts, len(values)])
+    return starts, lengths, values[starts]
+
+
+def label_runs(labels: pd.Series | np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Run-length encode a label sequence (e.g. the EpochType of consecutive sub-epochs).
+
+    Labels are factorized to integer codes, so all runs of all labels come out of
+    one ``np.diff``. A missing label never joins a run, as with pandas ``!=``.
+
+    Returns
+    -------
+    starts, lengths, run_labels : np.ndarray
+        Start index, length and label (NaN if missing) of every run.
+    """
+    codes, uniques = pd.factorize(labels)
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=object)
+    change  = (np.diff(codes) != 0) | (codes[1:] < 0)
+    starts  = np.r_[0, np.flatnonzero(change) + 1]
+    lengths = np.diff(np.r_[starts, len(codes)])
+    run_labels = np.append(np.asarray(uniques, dtype=object), np.nan)[codes[starts]]    # code -1 -> NaN
+    return starts, lengths, run_labels
+
+
+def stage_codes(labels: pd.Series | np.ndarray) -> np.ndarray:
+    """Stage code per label (index into ``STAGES``, -1 if not scored), int8; labels are upper-cased and stripped."""
+    # Factorize first so only the few distinct labels are normalised, not every sample
+    codes, uniques = pd.factorize(labels)
+    lookup = [STAGES.index(s) if s in STAGES else -1 for s in (str(u).upper().strip() for u in uniques)]
+    return np.array(lookup + [-1], dtype=np.int8)[codes]        # code -1 (NaN) -> last entry
+
+# =====================================================================
+# Hypnogram
+# =====================================================================
+@dataclass(frozen=True)
+class Hypnogram:
+    """
+    Run-length encoded hypnogram: one entry per contiguous stage run.
+
+    A night of per-sample stages collapses to a few hundred runs, so the sleep
+    architecture features are computed on these arrays instead of the sample
+    column. Positions are in samples of the source it was built from.
+
+    Attributes
+    ----------
+    stage : np.ndarray
+        Stage code of each run (index into ``STAGES``, -1 if not scored).
+    start : np.ndarray
+        First sample of each run.
+    length : np.ndarray
+        Number of samples in each run.
+    """
+    stage:  np.ndarray
+    start:  np.ndarray
+    length: np.ndarray
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray) -> "Hypnogram":
+        """Collapse per-sample stage codes."""
+        start, length, stage = run_lengths(codes)
+        return cls(stage=stage, start=start, length=length)
+
+    @classmethod
+    def from_labels(cls, labels: pd.Series | np.ndarray) -> "Hypnogram":
+        """Collapse a per-sample stage label column (e.g. the merged ``stage`` column)."""
+        return cls.from_codes(stage_codes(labels))
+
+    @property
+    def n_samples(self) -> int:
+        return int(self.length.sum())
+
+    def stage_samples(self) -> np.ndarray:
+        """Samples per stage, indexed like ``STAGES`` (unscored samples are not counted)."""
+        scored = self.stage >= 0
+        return np.bincount(self.stage[scored], weights=self.length[scored], minlength=len(STAGES)).astype(np.int64)
+
+    def runs(self, code: int) -> np.ndarray:
+        """Lengths (samples) of the runs of one stage, in time order."""
+        return self.length[self.stage == code]
+
+    def onset(self, codes: tuple[int, ...]) -> int | None:
+        """First sample of any of ``codes`` (None if they never occur)."""
+        idx = np.flatnonzero(np.isin(self.stage, codes))
+        return int(self.start[idx[0]]) if len(idx) else None
+
+    def next_stage(self, code: int) -> np.ndarray:
+        """Stage entered after each run of ``code`` (a run that ends the night has none)."""
+        return self.stage[1:][self.stage[:-1] == code]
+
+# =====================================================================
+# Context
+# =====================================================================
+class SubjectContext:
+    """
+    One subject's merged data plus the tables every feature group derives from it.
+
+    Each attribute is computed on first access and then shared, so the REM rows
+    are selected once per subject (not once per group) and no group copies them.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Merged DataFrame for one subject (output of merge_all), or the columns of it
+        the feature groups need.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._spectrograms: dict = {}
+
+    # 1 ———— Stages ————
+    @cached_property
+    def stage_codes(self) -> np.ndarray:
+        """Per-sample stage code (index into ``STAGES``, -1 if not scored), int8."""
+        return stage_codes(self.df["stage"])
+
+    @cached_property
+    def rem_mask(self) -> np.ndarray:
+        """Boolean mask of samples scored as REM."""
+        return self.stage_codes == REM
+
+    @cached_property
+    def rem(self) -> pd.DataFrame:
+        """Rows scored as REM, selected once and shared read-only by all groups."""
+        return self.df.iloc[np.flatnonzero(self.rem_mask)]
+
+    @cached_property
+    def hypnogram(self) -> Hypnogram:
+        """Run-length hypnogram of the ``stage`` column (positions in samples)."""
+        return Hypnogram.from_codes(self.stage_codes)
+
+    # 2 ———— Deduplicated event tables ————
+    @cached_property
+    def subepochs(self) -> pd.DataFrame:
+        """
+        One row per 4-second sub-epoch inside REM (empty if there is no EpochType).
+
+        Uses em_SubEpochStart if available, otherwise bins time_sec into sub-epochs.
+        """
+        rem = self.rem
+        if rem.empty or "EpochType" not in rem.columns:
+            return pd.DataFrame(columns=["EpochType"])
+        if "em_SubEpochStart" in rem.columns:
+            sub = rem.drop_duplicates(subset="em_SubEpochStart")
+        else:
+            sub  = rem[rem["EpochType"].notna()]
+            bins = (pd.to_numeric(sub["time_sec"], errors="coerce") // SUB_EPOCH_LEN_S).astype(int)
+            sub  = sub[~bins.duplicated()]
+        return sub.reset_index(drop=True)
+
+    @cached_property
+    def em_events(self) -> pd.DataFrame:
+        """One row per EM event over the whole recording (em_event_id, else em_is_peak, else EM_Type)."""
+        df = self.df
+        if "em_event_id" in df.columns:
+            return df[df["em_event_id"].notna()].drop_duplicates(subset="em_event_id")
+        if "em_is_peak" in df.columns:
+            return df[df["em_is_peak"] == True]
+        return df[df["EM_Type"].notna()]
+
+    @cached_property
+    def rem_em_events(self) -> pd.DataFrame:
+        """One row per EM event during REM (em_event_id, else the is_em_event rows)."""
+        rem = self.rem
+        if "em_event_id" in rem.columns:
+            return rem[rem["em_event_id"].notna()].drop_duplicates(subset="em_event_id")
+        return rem[rem["is_em_event"] == True]
+
+    @cached_property
+    def em_table(self) -> pd.DataFrame:
+        """One row per detected EM (is_em_event rows, else Start_x rows), deduplicated on Start_x."""
+        df = self.df
+        if "is_em_event" in df.columns:
+            em_df = df[df["is_em_event"] == True]
+        elif "Start_x" in df.columns:
+            em_df = df[df["Start_x"].notna()]
+        else:
+            return pd.DataFrame()
+        if em_df.empty:
+            return pd.DataFrame()
+        if "Start_x" in em_df.columns:
+            em_df = em_df.drop_duplicates(subset="Start_x")
+        return em_df.reset_index(drop=True)
+
+    # 3 ———— EEG ————
+    @cached_property
+    def eeg(self) -> np.ndarray | None:
+        """Average of EEG_LOC and EEG_ROC per sample, NaN where missing (None if there is no EEG)."""
+        from features.spectral import eeg_signal    # scipy.signal only for the EEG groups
+        return eeg_signal(self.df)
+
+    def eeg_spectrogram(self, fs: float) -> Spectrogram | None:
+        """
+        Spectrogram of the averaged recovered EEG on the sub-epoch grid (features/spectral.py),
+        computed on the first call per ``fs``. None if the subject has no EEG.
+        """
+        if fs not in self._spectrograms:
+            from features.spectral import Spectrogram
+            signal = self.eeg
+            t0     = 0.0                                            # grid origin = time of the first sample
+            if "time_sec" in self.df.columns and len(self.df):
+                t0 = float(pd.to_numeric(self.df["time_sec"].iloc[0], errors="coerce"))
+                t0 = t0 if np.isfinite(t0) else 0.0
+            self._spectrograms[fs] = None if signal is None else Spectrogram.compute(signal, fs, t0=t0)
+        return self._spectrograms[fs]
+
+
+def subject_context(data: pd.DataFrame | SubjectContext) -> SubjectContext:
+    """Return ``data`` if it is already a context, else wrap the DataFrame in one."""
+    return data if isinstance(data, SubjectContext) else SubjectContext(data)
@@ -1,7 +1,8 @@
 # Filename: eeg_feats.py
 # Authors: Adam Klovborg & Rasmus Kleffel
 # Description: EEG feature extraction from a merged CSV file (output of merge_all).
-#              Extracts band power features per sleep stage using Welch's method.
+#              Extracts band power features per sleep stage using Welch's method, per contiguous
+#              run of each stage (features/spectral.py: masked_psd).
 
 # =========================================================================================================
 # Imports
@@ -11,9 +12,11 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from scipy.signal import welch
 import re
 
+from features.context import STAGES, SubjectContext, subject_context
+from features.spectral import masked_psd
+
 # =========================================================================================================
 # Constants
 # =========================================================================================================
@@ -24,17 +27,18 @@ EEG_BANDS = {
     "beta":  (13.0, 30.0),
 }
 EEG_COLS = ["EEG_LOC", "EEG_ROC"]
-STAGES   = ["W", "N1", "N2", "N3", "REM"]
+
+# Columns a merged CSV must have for the single-file extraction (features/registry.py lists
+# the columns of each feature group for the shared loader)
+USECOLS_REQUIRED = ["time_sec", "stage"] + EEG_COLS
 _DCSM_PATTERN = re.compile(r"(DCSM_\d+_[a-zA-Z])") 
 
 # =========================================================================================================
 # Helper
 # =========================================================================================================
-def _load_and_validate(merged_file: Path) -> pd.DataFrame:
-    """Load merged CSV and check required columns are present."""
-    required = {"time_sec", "stage", "EEG_LOC", "EEG_ROC"}
-    df = pd.read_csv(merged_file, low_memory=False)
-    missing = required - set(df.columns)
+def _validate(df: pd.DataFrame) -> pd.DataFrame:
+    """Check required columns are present."""
+    missing = set(USECOLS_REQUIRED) - set(df.columns)
     if missing:
         raise ValueError(
             f"Merged CSV is missing required columns: {missing}\n"
@@ -42,38 +46,47 @@ def _load_and_validate(merged_file: Path) -> pd.DataFrame:
         )
     return df
 
+
+def _load_and_validate(merged_file: Path) -> pd.DataFrame:
+    """Load merged CSV and check required columns are present."""
+    return _validate(pd.read_csv(merged_file, low_memory=False))
+
 # =========================================================================================================
 # Feature groups
 # =========================================================================================================
 
-def _eeg_band_power_features(df: pd.DataFrame, fs: float) -> dict:
+def _eeg_band_power_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
-    Band power features per EEG channel per sleep stage using Welch's method.
+    Band power features per sleep stage using Welch's method.
+
+    LOC and ROC are averaged into one signal. A stage's PSD is estimated per
+    contiguous run of the stage and averaged weighted by run length
+    (``features.spectral.masked_psd``); samples with missing EEG end a run.
 
-    Features (per channel × stage × band)
+    Features (per stage × band)
     --------
-    `eeg_{ch}__{stage}__delta`       : Delta band power [µV²/Hz].
-    `eeg_{ch}__{stage}__theta`       : Theta band power [µV²/Hz].
-    `eeg_{ch}__{stage}__alpha`       : Alpha band power [µV²/Hz].
-    `eeg_{ch}__{stage}__beta`        : Beta band power [µV²/Hz].
-    `eeg_{ch}__{stage}__total`       : Total band power (sum of all bands) [µV²/Hz].
-    `eeg_{ch}__{stage}__theta_ratio` : Theta / total power ratio.
+    `eeg__{stage}__delta`       : Delta band power [µV²/Hz].
+    `eeg__{stage}__theta`       : Theta band power [µV²/Hz].
+    `eeg__{stage}__alpha`       : Alpha band power [µV²/Hz].
+    `eeg__{stage}__beta`        : Beta band power [µV²/Hz].
+    `eeg__{stage}__total`       : Total band power (sum of all bands) [µV²/Hz].
+    `eeg__{stage}__theta_ratio` : Theta / total power ratio.
     """
     feats: dict = {}
+    ctx         = subject_context(data)
+    sig         = ctx.eeg
     nperseg     = int(4.0 * fs)
     min_samples = int(10.0 * fs)
 
-    for stage in STAGES:
-        mask      = df["stage"] == stage
+    for code, stage in enumerate(STAGES):
+        mask      = ctx.stage_codes == code
         n_samples = mask.sum()
 
-        # ---- Average LOC and ROC into a single signal ----
-        loc = df.loc[mask, "EEG_LOC"].dropna().values
-        roc = df.loc[mask, "EEG_ROC"].dropna().values
-        min_len = min(len(loc), len(roc))
+        # ---- Welch per contiguous run of the stage (runs shorter than nperseg skipped) ----
+        f, psd, n_used = masked_psd(sig, mask, fs, nperseg) if sig is not None else (None, None, 0)
 
-        if min_len < min_samples:
-            print(f"    -> NaN: {stage}: only {min_len} usable samples, need {min_samples} "
+        if n_used < min_samples:
+            print(f"    -> NaN: {stage}: only {n_used} usable samples, need {min_samples} "
                   f"(= 10s * {fs} Hz) for reliable Welch PSD — all {stage} bands set to NaN")
             for band in EEG_BANDS:
                 feats[f"eeg__{stage.lower()}__{band}"] = np.nan
@@ -81,10 +94,6 @@ def _eeg_band_power_features(df: pd.DataFrame, fs: float) -> dict:
             feats[f"eeg__{stage.lower()}__theta_ratio"] = np.nan
             continue
 
-        sig = (loc[:min_len] + roc[:min_len]) / 2.0
-
-        f, psd = welch(sig, fs=fs, nperseg=min(nperseg, len(sig)))
-
         total = 0.0
         for band, (lo, hi) in EEG_BANDS.items():
             band_mask = (f >= lo) & (f <= hi)
@@ -101,7 +110,7 @@ def _eeg_band_power_features(df: pd.DataFrame, fs: float) -> dict:
             print(f"    -> NaN: {stage}: theta_ratio = NaN because total band power is 0 (no signal energy)")
 
         print(
-            f"    {stage} ({n_samples:,} samples) — "
+            f"    {stage} ({n_samples:,} samples, {n_used:,} used) — "
             f"delta: {feats[f'eeg__{stage.lower()}__delta']:.4f}  |  "
             f"theta: {feats[f'eeg__{stage.lower()}__theta']:.4f}  |  "
             f"alpha: {feats[f'eeg__{stage.lower()}__alpha']:.4f}  |  "
@@ -109,14 +118,9 @@ def _eeg_band_power_features(df: pd.DataFrame, fs: float) -> dict:
             f"theta_ratio: {feats[f'eeg__{stage.lower()}__theta_ratio']:.4f}"
         )
         # ---- Overall theta/beta ratio (across all stages combined) ----
-    loc_all = df["EEG_LOC"].dropna().values
-    roc_all = df["EEG_ROC"].dropna().values
-    min_len = min(len(loc_all), len(roc_all))
-
-    if min_len >= min_samples:
-        sig_all = (loc_all[:min_len] + roc_all[:min_len]) / 2.0
-        f_all, psd_all = welch(sig_all, fs=fs, nperseg=min(nperseg, len(sig_all)))
+    f_all, psd_all, n_used = masked_psd(sig, None, fs, nperseg) if sig is not None else (None, None, 0)
 
+    if n_used >= min_samples:
         theta_power = float(np.trapz(
             psd_all[(f_all >= 4.0) & (f_all <= 8.0)],
             f_all[(f_all >= 4.0) & (f_all <= 8.0)]
@@ -132,7 +136,7 @@ def _eeg_band_power_features(df: pd.DataFrame, fs: float) -> dict:
         print(f"    Overall theta/beta ratio: {feats['eeg__overall__theta_beta_ratio']:.4f}")
     else:
         feats["eeg__overall__theta_beta_ratio"] = np.nan
-        print(f"    -> NaN: overall theta/beta ratio — only {min_len} samples, need {min_samples} for Welch PSD")
+        print(f"    -> NaN: overall theta/beta ratio — only {n_used} samples, need {min_samples} for Welch PSD")
 
     nan_feats = [k for k, v in feats.items() if isinstance(v, float) and np.isnan(v)]
     if nan_feats:
@@ -144,7 +148,6 @@ def _eeg_band_power_features(df: pd.DataFrame, fs: float) -> dict:
 # Batch extraction
 # =========================================================================================================
 FEATURES_DIR = Path("features_csv")
-FEATURES_DIR.mkdir(parents=True, exist_ok=True)
 
 def extract_eeg_features_batch(
         merged_dir:  str | Path,
@@ -237,6 +240,7 @@ def extract_eeg_features(
         merged_file: str | Path,
         subject_id:  str | None = None,
         fs:          float = 128.0,
+        df:          pd.DataFrame | None = None,
 ) -> dict:
     """
     Band power features per sleep stage using Welch's method.
@@ -244,10 +248,15 @@ def extract_eeg_features(
 
     Parameters
     ----------
-    df : pd.DataFrame
-        Merged CSV DataFrame containing ``stage``, ``EEG_LOC``, ``EEG_ROC`` columns.
+    merged_file : str | Path
+        Path to the merged CSV file containing ``stage``, ``EEG_LOC``, ``EEG_ROC`` columns.
+    subject_id : str | None
+        Optional subject identifier. If None, the file stem is used.
     fs : float
         Sampling frequency of the EEG signal in [Hz].
+    df : pd.DataFrame | None
+        Already loaded merged data (e.g. from the shared loader in feat_report).
+        If None, ``merged_file`` is read.
 
     Returns
     -------
@@ -275,7 +284,7 @@ def extract_eeg_features(
     print(f"Extracting EEG features: {merged_file.name}")
     print(f"  subject_id : {sid}  |  fs : {fs} [Hz]")
 
-    df = _load_and_validate(merged_file)
+    df = _load_and_validate(merged_file) if df is None else _validate(df)
 
     feats: dict = {"subject_id": sid}
 
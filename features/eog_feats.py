@@ -12,39 +12,42 @@ import pandas as pd                # for data manipulation and analysis
 from pathlib import Path           # for handling file paths
 import re
 
+from features.context import REM, STAGES, SubjectContext, subject_context
+
 # =========================================================================================================
 # Constants
 # =========================================================================================================
 FEATURES_DIR = Path("features_csv")
-FEATURES_DIR.mkdir(parents=True, exist_ok=True)
 _DCSM_PATTERN = re.compile(r"(DCSM_\d+_[a-zA-Z])") 
 
+# Columns a merged CSV must have for the single-file extraction (features/registry.py lists
+# the columns of each feature group for the shared loader)
+USECOLS_REQUIRED = ["time_sec", "LOC", "ROC", "stage", "is_rem_event", "is_em_event", "EM_Type"]
+
 # =========================================================================================================
 # Helper
 # =========================================================================================================
 
-def _load_and_validate(merged_file: Path) -> pd.DataFrame:
-    """Load merged CSV and check required columns are present."""
-    required = {"time_sec", "LOC", "ROC", "stage", "is_rem_event", "is_em_event", "EM_Type"}
-    df = pd.read_csv(merged_file, low_memory=False)
-    missing = required - set(df.columns)
+def _validate(df: pd.DataFrame) -> pd.DataFrame:
+    """Check required columns are present."""
+    missing = set(USECOLS_REQUIRED) - set(df.columns)
     if missing:
         raise ValueError(
             f"Merged CSV is missing required columns: {missing}\n"
             f"Found: {list(df.columns)}"
         )
     return df
- 
- 
-def _rem_samples(df: pd.DataFrame) -> pd.DataFrame:
-    """Return only samples scored as REM sleep by GSSC."""
-    return df[df["stage"] == "REM"].copy()
+
+
+def _load_and_validate(merged_file: Path) -> pd.DataFrame:
+    """Load merged CSV and check required columns are present."""
+    return _validate(pd.read_csv(merged_file, low_memory=False))
 
 # =========================================================================================================
 # Feature groups
 # =========================================================================================================
 
-def _stage_distribution_features(df: pd.DataFrame, fs: float) -> dict:
+def _stage_distribution_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Distribution of sleep stage derived from GSSC staging.
 
@@ -56,8 +59,10 @@ def _stage_distribution_features(df: pd.DataFrame, fs: float) -> dict:
     `n_rem_epochs`              : Number of distinct consecutive REM epochs (GSSC-level).
     `stage_frac_W/N1/N2/N3`     : Fraction of recording in each non-REM stage.
     """
+    hyp = subject_context(data).hypnogram
+
     # ---- 1) Calculate total recording duration in minutes ----
-    n_total = len(df)
+    n_total = hyp.n_samples
     total_min = n_total / fs / 60.0
 
     print(f"    Total recording: {total_min:.2f} [min]  ({n_total:,} samples at {fs} [Hz])")
@@ -65,16 +70,15 @@ def _stage_distribution_features(df: pd.DataFrame, fs: float) -> dict:
     # ---- 2) Calculate duration and fraction of each stage ----
     feats: dict = {"total_recording_min": round(total_min, 3)}
 
-    stages = ["W", "N1", "N2", "N3", "REM"]
-    for s in stages:
-        n_s     = (df["stage"] == s).sum()
+    counts = hyp.stage_samples()
+    for s, n_s in zip(STAGES, counts):
         dur_min = n_s / fs / 60.0
         frac    = n_s / n_total if n_total > 0 else np.nan
         label   = "rem" if s == "REM" else s.lower()
         feats[f"{label}_duration_min"] = round(dur_min, 3)
         feats[f"{label}_fraction"]     = round(frac, 4)
  
-    print(f"    Stages - " + "  |  ".join([f"{s}: {round((df['stage']==s).sum()/n_total*100,1)}%" for s in stages]))
+    print(f"    Stages - " + "  |  ".join([f"{s}: {round(n_s/n_total*100,1)}%" for s, n_s in zip(STAGES, counts)]))
     
 
     # ---- 3) Count distinct consecutive REM blocks ----
@@ -82,10 +86,7 @@ def _stage_distribution_features(df: pd.DataFrame, fs: float) -> dict:
     #       Proxy for number of REM episodes, but depends on how GSSC scores REM (e.g. minimum duration for a REM episode).
     #       If GSSC has a minimum duration for REM episodes, this will underestimate the true number of REM episodes,
     #       but is still informative about the structure of REM sleep in the recording.
-    stage_blocks = (df["stage"] != df["stage"].shift()).cumsum()
-    n_rem_epochs = int(
-        df[df["stage"] == "REM"].groupby(stage_blocks)["stage"].count().shape[0]
-    )
+    n_rem_epochs = int(len(hyp.runs(REM)))
     feats["n_rem_epochs"] = n_rem_epochs
     print(f"    Distinct REM epochs: {n_rem_epochs}")
  
@@ -94,7 +95,7 @@ def _stage_distribution_features(df: pd.DataFrame, fs: float) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _rem_epoch_duration_features(df: pd.DataFrame, fs: float) -> dict:
+def _rem_epoch_duration_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Duration statistics for each individual REM epoch (consecutive REM blocks).
 
@@ -108,10 +109,7 @@ def _rem_epoch_duration_features(df: pd.DataFrame, fs: float) -> dict:
     """
 
     # ---- 1) Identify consecutive REM blocks ----
-    is_rem = (df["stage"] == "REM").astype(int)
-    epoch_ids = (is_rem.diff().fillna(0) != 0).cumsum()
-    rem_blocks = df[is_rem == 1].groupby(epoch_ids).size()
-    rem_duration_min = rem_blocks / fs / 60.0
+    rem_duration_min = pd.Series(subject_context(data).hypnogram.runs(REM) / fs / 60.0)
 
     feats: dict = {}
 
@@ -146,7 +144,7 @@ def _rem_epoch_duration_features(df: pd.DataFrame, fs: float) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _rem_event_features(df: pd.DataFrame, fs: float) -> dict:
+def _rem_event_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Features derived from detected REM eye movement events (extract_rems_n.py output), computed only over samples scored as REM sleep.
  
@@ -163,7 +161,7 @@ def _rem_event_features(df: pd.DataFrame, fs: float) -> dict:
     """
 
     # ---- 1) Filter to REM sleep samples and compute duration ----
-    rem_df = _rem_samples(df)
+    rem_df = subject_context(data).rem
     rem_min = len(rem_df) / fs / 60.0
     print(f"    REM duration: {rem_min:.2f} [min]  ({len(rem_df):,} samples)")
     
@@ -239,7 +237,7 @@ def _rem_event_features(df: pd.DataFrame, fs: float) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _em_classification_features(df: pd.DataFrame, fs: float) -> dict:
+def _em_classification_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Features derived from EM type classifications (SEM / REM) in REM sleep.
  
@@ -258,7 +256,8 @@ def _em_classification_features(df: pd.DataFrame, fs: float) -> dict:
     """
 
     # ---- 1) Filter to REM sleep samples and compute duration ----
-    rem_df = _rem_samples(df)
+    ctx = subject_context(data)
+    rem_df = ctx.rem
     rem_min = len(rem_df) / fs / 60.0
 
     print(f"    REM duration: {rem_min:.2f} [min]  ({len(rem_df):,} samples)")
@@ -277,14 +276,8 @@ def _em_classification_features(df: pd.DataFrame, fs: float) -> dict:
             feats[k] = np.nan
         return feats
     
-    # ---- 3) Deduplicate to one row per EM event ----
-    if "em_event_id" in rem_df.columns:
-        em_events = (
-            rem_df[rem_df["em_event_id"].notna()]
-            .drop_duplicates(subset="em_event_id")
-        )
-    else:
-        em_events = rem_df[rem_df["is_em_event"] == True]
+    # ---- 3) One row per EM event ----
+    em_events = ctx.rem_em_events
  
     sem_df     = em_events[em_events["EM_Type"] == "SEM"]
     rem_em_df  = em_events[em_events["EM_Type"] == "REM"]
@@ -339,7 +332,7 @@ def _em_classification_features(df: pd.DataFrame, fs: float) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _em_stage_count_features(df: pd.DataFrame) -> dict:
+def _em_stage_count_features(data: pd.DataFrame | SubjectContext) -> dict:
     """
     Total EM counts broken down by sleep stage across the full recording.
 
@@ -353,21 +346,17 @@ def _em_stage_count_features(df: pd.DataFrame) -> dict:
     """
 
     feats: dict = {}
+    ctx = subject_context(data)
 
     # ---- 1) Return NaN defaults if required columns are missing ----
-    if "stage" not in df.columns or "EM_Type" not in df.columns:
+    if "stage" not in ctx.df.columns or "EM_Type" not in ctx.df.columns:
         print("    'stage' or 'EM_Type' column missing — returning NaN defaults")
         for k in ["em_count_n1", "em_count_n2", "em_count_n3", "em_count_rem", "em_count_wake"]:
             feats[k] = np.nan
         return feats
 
-    # ---- 2) Deduplicate to one row per EM event ----
-    if "em_event_id" in df.columns:
-        em_events = df[df["em_event_id"].notna()].drop_duplicates(subset="em_event_id")
-    elif "em_is_peak" in df.columns:
-        em_events = df[df["em_is_peak"] == True]
-    else:
-        em_events = df[df["EM_Type"].notna()]
+    # ---- 2) One row per EM event ----
+    em_events = ctx.em_events
 
     em_count_total = len(em_events)
 
@@ -403,7 +392,7 @@ def _em_stage_count_features(df: pd.DataFrame) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _phasic_tonic_features(df: pd.DataFrame) -> dict:
+def _phasic_tonic_features(data: pd.DataFrame | SubjectContext) -> dict:
     """
     Features derived from Phasic / Tonic sub-epoch classification (EpochType column).
     Only meaningful if the Umaer sub-epoch classifier was run (subepochs_file passed to merge_all).
@@ -418,27 +407,22 @@ def _phasic_tonic_features(df: pd.DataFrame) -> dict:
     
     # ---- 1) Return NaN defaults if EpochType column is missing ----
     feats: dict = {}
+    ctx = subject_context(data)
 
-    if "EpochType" not in df.columns:
+    if "EpochType" not in ctx.df.columns:
         print("    'EpochType' column missing — returning NaN defaults")
         for k in ["phasic_epoch_count", "tonic_epoch_count", "phasic_fraction", "tonic_fraction"]:
             feats[k] = np.nan
         return feats
     
     # ---- 2) Filter to REM sleep samples ----
-    rem_df = _rem_samples(df)
-    print(f"    REM samples: {len(rem_df):,}")
+    print(f"    REM samples: {len(ctx.rem):,}")
 
-    # ---- 3) Deduplicate to one row per sub-epoch ----
+    # ---- 3) One row per sub-epoch ----
     # NOTE:
     #       Uses em_SubEpochStart to identify distinct sub-epochs if available,
-    #       otherwise falls back to counting consecutive EpochType blocks.
-    if "em_SubEpochStart" in rem_df.columns:
-        subepoch_df = rem_df.drop_duplicates(subset="em_SubEpochStart")
-    else:
-        subepoch_df = rem_df[rem_df["EpochType"].notna()].copy()
-        subepoch_df["_epoch_bin"] = (subepoch_df["time_sec"] // 4).astype(int)
-        subepoch_df = subepoch_df.drop_duplicates(subset="_epoch_bin")
+    #       otherwise falls back to 4-second time_sec bins (see SubjectContext.subepochs).
+    subepoch_df = ctx.subepochs
     print(f"    Sub-epochs found: {len(subepoch_df):,}  |  types: {subepoch_df['EpochType'].value_counts().to_dict()}")
 
     # ---- 4) Compute counts and fractions ----
@@ -462,7 +446,7 @@ def _phasic_tonic_features(df: pd.DataFrame) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _eog_amplitude_features(df: pd.DataFrame) -> dict:
+def _eog_amplitude_features(data: pd.DataFrame | SubjectContext) -> dict:
     """
     Simple amplitude statistics of the raw LOC and ROC signals during REM sleep.
     These are signal-level summary features — no windowing or frequency analysis.
@@ -478,7 +462,7 @@ def _eog_amplitude_features(df: pd.DataFrame) -> dict:
     """
 
     # ---- 1) Filter to REM sleep samples ----
-    rem_df = _rem_samples(df)
+    rem_df = subject_context(data).rem
 
     print(f"    REM samples: {len(rem_df):,}")
 
@@ -516,6 +500,7 @@ def extract_features(
         merged_file: str | Path,
         subject_id:  str | None = None,
         fs:          float = 250.0,
+        df:          pd.DataFrame | None = None,
         ) -> dict:
     """
     Extract all simple EOG features from a single merged CSV file.
@@ -532,6 +517,9 @@ def extract_features(
         If None, the file stem is used.
     fs : float
         Sampling frequency of the EOG signal in [Hz]. Default is **250.0 Hz**.
+    df : pd.DataFrame | None
+        Already loaded merged data (e.g. from the shared loader in feat_report).
+        If None, ``merged_file`` is read.
  
     Returns
     -------
@@ -548,30 +536,31 @@ def extract_features(
     print(f"Extracting features: {merged_file.name}")
     print(f"  subject_id : {sid}  |  fs : {fs} [Hz]")
  
-    df = _load_and_validate(merged_file)
+    df = _load_and_validate(merged_file) if df is None else _validate(df)
+    ctx = SubjectContext(df)
  
     feats: dict = {"subject_id": sid}
  
     print(f"\n--- Stage distribution ---")
-    feats.update(_stage_distribution_features(df, fs))
+    feats.update(_stage_distribution_features(ctx, fs))
 
     print(f"\n--- REM epoch duration ---")         
-    feats.update(_rem_epoch_duration_features(df, fs)) 
+    feats.update(_rem_epoch_duration_features(ctx, fs)) 
 
     print(f"\n--- REM event features ---")
-    feats.update(_rem_event_features(df, fs))
+    feats.update(_rem_event_features(ctx, fs))
  
     print(f"\n--- EM classification features ---")
-    feats.update(_em_classification_features(df, fs))
+    feats.update(_em_classification_features(ctx, fs))
 
     print(f"\n--- EM stage count features ---")      
-    feats.update(_em_stage_count_features(df))        
+    feats.update(_em_stage_count_features(ctx))        
  
     print(f"\n--- Phasic / Tonic features ---")
-    feats.update(_phasic_tonic_features(df))
+    feats.update(_phasic_tonic_features(ctx))
  
     print(f"\n--- EOG amplitude features ---")
-    feats.update(_eog_amplitude_features(df))
+    feats.update(_eog_amplitude_features(ctx))
  
     n_nan = sum(1 for v in feats.values() if isinstance(v, float) and np.isnan(v))
     print(f"\n  Features computed : {len(feats) - 1}")
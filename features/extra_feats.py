@@ -18,7 +18,9 @@ import re
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from scipy.signal import welch
+
+from features.context import REM, SLEEP_CODES, SubjectContext, label_runs, subject_context
+from features.spectral import band_power
 
 # =============================================================================
 # Constants
@@ -69,130 +71,40 @@ def _load(merged_file: Path) -> pd.DataFrame:
         raise ValueError(f"Missing required columns: {missing}")
     return pd.read_csv(merged_file, usecols=usecols, low_memory=False)          # Load with only needed columns
 
-# ———— REM mask ————
-def _rem_mask(df: pd.DataFrame) -> pd.Series:
-    return df["stage"].str.upper().str.strip() == "REM"
-
 # ———— EpochType mask ————
-def _epoch_type_mask(df: pd.DataFrame, epoch_type: str) -> pd.Series: 
+def _epoch_type_mask(df: pd.DataFrame, epoch_type: str) -> np.ndarray: 
     if "EpochType" not in df.columns:           # If missing, return all False (no phasic/tonic epochs)
-        return pd.Series(False, index=df.index) 
-    return df["EpochType"] == epoch_type        # Mask for the specified epoch type (e.g., "Phasic" or "Tonic")
-
-# ———— Band power via Welch PSD ————
-def _band_power(signal: np.ndarray, fs: float, fmin: float, fmax: float) -> float:
-    """
-    Absolute band power via Welch PSD.
-    
-    Parameters
-    ----------
-    signal : np.ndarray
-        1D array of EEG samples.
-    fs : float
-        Sampling frequency in Hz.
-    fmin : float
-        Lower frequency bound of the band (Hz).
-    fmax : float
-        Upper frequency bound of the band (Hz).
-    """
-    if len(signal) < fs * 2:                            # Need at least 2 seconds of data for a reliable PSD estimate
-        return np.nan
-    nperseg = min(int(fs * 4), len(signal))             # Use 4-second windows or the full signal if shorter        
-    freqs, psd = welch(signal, fs=fs, nperseg=nperseg)  # Compute PSD using Welch's method
-    idx = (freqs >= fmin) & (freqs <= fmax)             # Indices of frequencies within the desired band
-    if idx.sum() == 0:
-        return np.nan
-    return float(np.trapz(psd[idx], freqs[idx]))        # Integrate PSD over the band to get absolute power
-
-# ———— Get EEG signal (average LOC + ROC) ————
-def _get_eeg(df: pd.DataFrame) -> np.ndarray | None:
-    """Average LOC + ROC EEG channels."""
-    has_loc = "EEG_LOC" in df.columns and df["EEG_LOC"].notna().any()
-    has_roc = "EEG_ROC" in df.columns and df["EEG_ROC"].notna().any()
-    if has_loc and has_roc:
-        return ((pd.to_numeric(df["EEG_LOC"], errors="coerce").fillna(0) +
-                 pd.to_numeric(df["EEG_ROC"], errors="coerce").fillna(0)) / 2).values
-    elif has_loc:
-        return pd.to_numeric(df["EEG_LOC"], errors="coerce").values
-    elif has_roc:
-        return pd.to_numeric(df["EEG_ROC"], errors="coerce").values
-    return None
+        return np.zeros(len(df), dtype=bool) 
+    return (df["EpochType"] == epoch_type).to_numpy()   # Mask for the specified epoch type (e.g., "Phasic" or "Tonic")
 
 # ———— Get sub-epoch series for REM —————
-def _get_subepoch_series(df: pd.DataFrame) -> pd.Series:
+def _get_subepoch_series(ctx: SubjectContext) -> pd.Series:
     """Return deduplicated EpochType series for REM sub-epochs."""
-    rem_df = df[_rem_mask(df)]
-    if "EpochType" not in rem_df.columns or rem_df["EpochType"].isna().all():
+    if "EpochType" not in ctx.rem.columns or ctx.rem["EpochType"].isna().all():
         return pd.Series(dtype=str)
-    if "em_SubEpochStart" in rem_df.columns:
-        sub = rem_df.drop_duplicates(subset="em_SubEpochStart")
-    else:
-        sub = rem_df[rem_df["EpochType"].notna()].copy()
-        sub["_bin"] = (pd.to_numeric(sub["time_sec"], errors="coerce") // SUB_EPOCH_LEN_S).astype(int)
-        sub = sub.drop_duplicates(subset="_bin")
-    return sub["EpochType"].reset_index(drop=True)
-
-# ———— Identify bouts of a given label in the sub-epoch series ————
-def _identify_bouts(types: pd.Series, label: str) -> list[int]:
-    """
-    Return list of bout lengths (in sub-epochs) for the given label.
-
-    Parameters
-    ----------
-    types : pd.Series
-        Series of sub-epoch types (e.g., "Phasic", "Tonic").
-    label : str
-        Label to identify bouts for (e.g., "Phasic" or "Tonic").
-    """
-    bouts, count = [], 0
-    for t in types:
-        if t == label:
-            count += 1
-        else:
-            if count > 0:
-                bouts.append(count)
-            count = 0
-    if count > 0:
-        bouts.append(count)
-    return bouts
-
-
-def _get_em_table(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Return a deduplicated per-EM-event DataFrame.
-    Uses Start_x as the deduplication key (actual column name in merged CSV).
-    """
-    if "is_em_event" in df.columns:
-        em_df = df[df["is_em_event"] == True].copy()
-    else:
-        em_df = df[df["Start_x"].notna()].copy() if "Start_x" in df.columns else pd.DataFrame()
-
-    if em_df.empty:
-        return pd.DataFrame()
-
-    if "Start_x" in em_df.columns:
-        em_df = em_df.drop_duplicates(subset="Start_x")
-
-    return em_df.reset_index(drop=True)
+    return ctx.subepochs["EpochType"]
 
 
 # =============================================================================
 # Feature groups
 # =============================================================================
 
-def _spectral_features(df: pd.DataFrame, fs: float) -> dict:
+def _spectral_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Band power (delta, theta, gamma) during REM overall, phasic, tonic.
     Plus theta/delta ratio per context.
 
+    Each context's PSD is the mean of the subject's EEG spectrogram segments
+    (4-s, on the sub-epoch grid) that lie inside it; see features/spectral.py.
+
     Features:
         eeg_{band}_{context}_power      (context: rem / phasic / tonic)
         eeg_theta_delta_ratio_{context}
 
     Parameters
     ----------
-    df : pd.DataFrame
-        Merged DataFrame for a single subject.
+    data : pd.DataFrame | SubjectContext
+        Merged DataFrame for a single subject, or its SubjectContext.
     fs : float
         Sampling frequency in Hz.
     
@@ -202,52 +114,54 @@ def _spectral_features(df: pd.DataFrame, fs: float) -> dict:
         Flat dict of feature name  -> value.
     """
     feats: dict = {}          # Initialize empty dict
-    eeg_full = _get_eeg(df)   # Get the EEG signal
+    ctx  = subject_context(data)
+    df   = ctx.df
+    spec = ctx.eeg_spectrogram(fs)   # Shared EEG spectrogram (4-s segments on the sub-epoch grid)
 
     # Define the expected feature names for NaN defaults if EEG data is missing
     nan_feats = (
-        [f"eeg_{b}_{ctx}_power" for b in BANDS for ctx in ("rem", "phasic", "tonic")]
-        + [f"eeg_theta_delta_ratio_{ctx}" for ctx in ("rem", "phasic", "tonic")]
+        [f"eeg_{b}_{context}_power" for b in BANDS for context in ("rem", "phasic", "tonic")]
+        + [f"eeg_theta_delta_ratio_{context}" for context in ("rem", "phasic", "tonic")]
     )
 
     # If no EEG data is available, set all spectral features to NaN and return early
-    if eeg_full is None:
+    if spec is None:
         print("    [SKIP] No EEG columns found")
         return {k: np.nan for k in nan_feats}
     
     # Create masks for REM, phasic REM, and tonic REM contexts
     contexts = {
-        "rem":    _rem_mask(df),
-        "phasic": _rem_mask(df) & _epoch_type_mask(df, "Phasic"),
-        "tonic":  _rem_mask(df) & _epoch_type_mask(df, "Tonic"),
+        "rem":    ctx.rem_mask,
+        "phasic": ctx.rem_mask & _epoch_type_mask(df, "Phasic"),
+        "tonic":  ctx.rem_mask & _epoch_type_mask(df, "Tonic"),
     }
 
     # Calculate features for each context
-    for ctx, mask in contexts.items():
-        signal = eeg_full[mask.values]                  # Extract EEG samples for the current context using the boolean mask
+    for context, mask in contexts.items():
+        psd, n_seg = spec.mean_psd(mask)                # Mean PSD of the segments inside the context (NaN if none)
         powers = {}                                     # Store band powers for ratio calculation
         for band, (fmin, fmax) in BANDS.items():
-            bp = _band_power(signal, fs, fmin, fmax)    # Calculate absolute band power for the current band and context
-            feats[f"eeg_{band}_{ctx}_power"] = bp       # FEAT: Absolute band power
+            bp = band_power(spec.freqs, psd, fmin, fmax)    # Absolute band power for the current band and context
+            feats[f"eeg_{band}_{context}_power"] = bp       # FEAT: Absolute band power
             powers[band] = bp
 
         d = powers.get("delta", np.nan)     # Delta power
         t = powers.get("theta", np.nan)     # Theta power
         if d and not np.isnan(d) and d > 0:
-            feats[f"eeg_theta_delta_ratio_{ctx}"] = round(t / d, 6) # FEAT: Theta/delta ratio if delta is valid and > 0
+            feats[f"eeg_theta_delta_ratio_{context}"] = round(t / d, 6) # FEAT: Theta/delta ratio if delta is valid and > 0
         else:
-            feats[f"eeg_theta_delta_ratio_{ctx}"] = np.nan          # FEAT: Theta/delta ratio is NaN if delta is missing/invalid/zero
+            feats[f"eeg_theta_delta_ratio_{context}"] = np.nan          # FEAT: Theta/delta ratio is NaN if delta is missing/invalid/zero
 
         # Print summary
         n = int(mask.sum())
-        print(f"    {ctx:<8s}: {n:,} samples  |  "
-              + "  ".join(f"{b}={feats.get(f'eeg_{b}_{ctx}_power', np.nan):.3e}"
+        print(f"    {context:<8s}: {n:,} samples, {n_seg} segments  |  "
+              + "  ".join(f"{b}={feats.get(f'eeg_{b}_{context}_power', np.nan):.3e}"
                           for b in BANDS))
 
     return feats
 
 
-def _phasic_tonic_structure_features(df: pd.DataFrame, fs: float) -> dict:
+def _phasic_tonic_structure_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Extended phasic/tonic structure.
 
@@ -263,8 +177,8 @@ def _phasic_tonic_structure_features(df: pd.DataFrame, fs: float) -> dict:
 
     Parameters
     ----------
-    df : pd.DataFrame
-        Merged DataFrame for a single subject.
+    data : pd.DataFrame | SubjectContext
+        Merged DataFrame for a single subject, or its SubjectContext.
     fs : float
         Sampling frequency in Hz.
     
@@ -286,13 +200,14 @@ def _phasic_tonic_structure_features(df: pd.DataFrame, fs: float) -> dict:
     feats = {k: np.nan for k in nan_keys}
 
     # Check for REM samples and EpochType column first
-    rem_df = df[_rem_mask(df)]
+    ctx    = subject_context(data)
+    rem_df = ctx.rem
     if rem_df.empty:
         print("    No REM samples — returning NaN defaults")
         return feats
 
     rem_min = len(rem_df) / fs / 60.0   # Total REM duration in minutes
-    types   = _get_subepoch_series(df)  # Get the deduplicated EpochType series for REM sub-epochs (one entry per sub-epoch)
+    types   = _get_subepoch_series(ctx) # Get the deduplicated EpochType series for REM sub-epochs (one entry per sub-epoch)
 
     # If there are no valid sub-epoch types, return NaN
     if types.empty:
@@ -300,7 +215,8 @@ def _phasic_tonic_structure_features(df: pd.DataFrame, fs: float) -> dict:
         return feats
 
     # Calculate transitions per minute in the sub-epoch series (changes in EpochType)
-    transitions = int((types != types.shift()).sum()) - 1                                                   # Number of transitions
+    _, run_lengths, run_labels = label_runs(types)                                                          # All runs of all labels at once
+    transitions = len(run_labels) - 1                                                                       # Number of transitions
     feats["pt_transitions_per_min"] = round(max(transitions, 0) / rem_min, 4) if rem_min > 0 else np.nan    # FEAT: Transitions per minute, ensuring non-negative and handling zero REM duration
     print(f"    Transitions: {transitions}  ({feats['pt_transitions_per_min']:.3f}/min)")
 
@@ -308,10 +224,10 @@ def _phasic_tonic_structure_features(df: pd.DataFrame, fs: float) -> dict:
 
     for label in ("Phasic", "Tonic"):
         prefix = label.lower()
-        bouts  = _identify_bouts(types, label) # Get list of bout lengths for the current label 
+        bouts  = run_lengths[run_labels == label]  # Bout lengths (sub-epochs) for the current label
 
-        if bouts:
-            dur_s = np.array(bouts) * SUB_EPOCH_LEN_S                                       # Convert bout lengths from sub-epochs to seconds
+        if len(bouts):
+            dur_s = bouts * SUB_EPOCH_LEN_S                                                 # Convert bout lengths from sub-epochs to seconds
             feats[f"{prefix}_bout_p25_s"]      = round(float(np.percentile(dur_s, 25)), 4)  # FEAT: 25th percentile of bout durations in seconds
             feats[f"{prefix}_bout_p75_s"]      = round(float(np.percentile(dur_s, 75)), 4)  # FEAT: 75th percentile of bout durations in seconds
             feats[f"{prefix}_bout_p90_s"]      = round(float(np.percentile(dur_s, 90)), 4)  # FEAT: 90th percentile of bout durations in seconds
@@ -338,7 +254,7 @@ def _phasic_tonic_structure_features(df: pd.DataFrame, fs: float) -> dict:
     return feats
 
 
-def _em_morphology_features(df: pd.DataFrame) -> dict:
+def _em_morphology_features(data: pd.DataFrame | SubjectContext) -> dict:
     """
     EM morphology using rise/fall slopes from LOC and ROC channels, amplitude variance, and SEM fraction.
 
@@ -350,8 +266,8 @@ def _em_morphology_features(df: pd.DataFrame) -> dict:
 
     Parameters    
     ----------
-    df : pd.DataFrame
-        Merged DataFrame for a single subject.
+    data : pd.DataFrame | SubjectContext
+        Merged DataFrame for a single subject, or its SubjectContext.
 
     Returns
     -------
@@ -365,7 +281,7 @@ def _em_morphology_features(df: pd.DataFrame) -> dict:
         "em_sem_fraction":       np.nan,
     }
 
-    em_df = _get_em_table(df)
+    em_df = subject_context(data).em_table    # one row per EM (deduplicated on Start_x)
     if em_df.empty:
         print("    No valid EM events for morphology")
         return feats
@@ -404,7 +320,7 @@ def _em_morphology_features(df: pd.DataFrame) -> dict:
     return feats
 
 
-def _sleep_architecture_features(df: pd.DataFrame, fs: float) -> dict:
+def _sleep_architecture_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Sleep architecture from stage column.
 
@@ -414,8 +330,8 @@ def _sleep_architecture_features(df: pd.DataFrame, fs: float) -> dict:
     
     Parameters
     ----------
-    df : pd.DataFrame
-        Merged DataFrame for a single subject.
+    data : pd.DataFrame | SubjectContext
+        Merged DataFrame for a single subject, or its SubjectContext.
     fs : float
         Sampling frequency in Hz.
     
@@ -428,27 +344,22 @@ def _sleep_architecture_features(df: pd.DataFrame, fs: float) -> dict:
     feats = {"rem_latency_min": np.nan, "n_rem_cycles": np.nan}
 
     # Check for required columns first
-    if "stage" not in df.columns or "time_sec" not in df.columns:
+    ctx = subject_context(data)
+    if "stage" not in ctx.df.columns or "time_sec" not in ctx.df.columns:
         return feats
 
-    stage = df["stage"].str.upper().str.strip()             # Clean stage labels
-    time  = pd.to_numeric(df["time_sec"], errors="coerce")  # Convert time to numeric, coercing errors to NaN
-
-    # Sleep onset is defined as the first sample of any sleep stage (N1, N2, N3, REM)
-    sleep_mask = stage.isin(["N1", "N2", "N3", "REM"]) # Mask for any sleep stage
-    if not sleep_mask.any():
+    hyp       = ctx.hypnogram                                  # Run-length hypnogram (clean stage codes)
+    sleep_idx = hyp.onset(SLEEP_CODES)                         # First sample of any sleep stage (N1, N2, N3, REM)
+    rem_idx   = hyp.onset((REM,))
+    if sleep_idx is None or rem_idx is None:
         return feats
-    sleep_onset = time[sleep_mask].iloc[0]  # Time of the first sleep stage sample, which we consider as sleep onset
 
-    rem_mask = stage == "REM"
-    if not rem_mask.any():
-        return feats
-    first_rem = time[rem_mask].iloc[0]
+    # Sleep onset is defined as the first sample of any sleep stage; only the two onset times are converted
+    time = pd.to_numeric(ctx.df["time_sec"].iloc[[sleep_idx, rem_idx]], errors="coerce")
+    sleep_onset, first_rem = time.iloc[0], time.iloc[1]
 
     feats["rem_latency_min"] = round(float((first_rem - sleep_onset) / 60.0), 4) # FEAT: REM latency in minutes, rounded to 4 decimal places
-
-    rem_blocks = (rem_mask != rem_mask.shift()).cumsum()
-    feats["n_rem_cycles"] = int(rem_blocks[rem_mask].nunique()) # FEAT: Number of distinct REM periods (contiguous blocks of REM samples)
+    feats["n_rem_cycles"]    = int(len(hyp.runs(REM)))                           # FEAT: Number of distinct REM periods (contiguous blocks of REM samples)
 
     print(f"    REM latency: {feats['rem_latency_min']:.1f} [min]  |  "
           f"REM cycles: {feats['n_rem_cycles']}")
@@ -463,6 +374,7 @@ def extract_extra_features(
         merged_file: str | Path,
         subject_id:  str | None = None,
         fs:          float = 250.0,
+        df:          pd.DataFrame | None = None,
         ) -> dict:
     """
     Extract extra features from a single merged CSV (.csv or .csv.gz).
@@ -475,6 +387,9 @@ def extract_extra_features(
         Subject identifier. If None, parsed from filename.
     fs : float
         Sampling frequency [Hz]. Default is 250.0.
+    df : pd.DataFrame | None
+        Already loaded merged data (e.g. from the shared loader in feat_report).
+        If None, only the needed columns of ``merged_file`` are read.
 
     Returns
     -------
@@ -490,21 +405,23 @@ def extract_extra_features(
     print(f"Extracting extra features: {merged_file.name}")
     print(f"  subject_id : {sid}  |  fs : {fs} [Hz]")
 
-    df = _load(merged_file)
+    if df is None:
+        df = _load(merged_file)
+    ctx = SubjectContext(df)
 
     feats: dict = {"subject_id": sid}
 
     print(f"\n--- Spectral band power ---")
-    feats.update(_spectral_features(df, fs))
+    feats.update(_spectral_features(ctx, fs))
 
     print(f"\n--- Phasic / tonic structure ---")
-    feats.update(_phasic_tonic_structure_features(df, fs))
+    feats.update(_phasic_tonic_structure_features(ctx, fs))
 
     print(f"\n--- EM morphology ---")
-    feats.update(_em_morphology_features(df))
+    feats.update(_em_morphology_features(ctx))
 
     print(f"\n--- Sleep architecture ---")
-    feats.update(_sleep_architecture_features(df, fs))
+    feats.update(_sleep_architecture_features(ctx, fs))
 
     n_nan = sum(1 for v in feats.values() if isinstance(v, float) and np.isnan(v))
     print(f"\n  Features computed : {len(feats) - 1}")
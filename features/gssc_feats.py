@@ -16,25 +16,28 @@ import pandas as pd                # for data manipulation and analysis
 from pathlib import Path           # for handling file paths
 import re
 
+from features.context import REM, STAGES, SubjectContext, subject_context
+
 # =========================================================================================================
 # Constants
 # =========================================================================================================
 FEATURES_DIR = Path("features_csv")
-FEATURES_DIR.mkdir(parents=True, exist_ok=True)
 
 PROB_COLS = ["prob_w", "prob_n1", "prob_n2", "prob_n3", "prob_rem"]
 
+# Columns a merged CSV must have for the single-file extraction (features/registry.py lists
+# the columns of each feature group for the shared loader)
+USECOLS_REQUIRED = ["time_sec", "stage"] + PROB_COLS
+
 _DCSM_PATTERN = re.compile(r"(DCSM_\d+_[a-zA-Z])") 
 
 # =========================================================================================================
 # Helpers
 # =========================================================================================================
 
-def _load_and_validate(merged_file: Path) -> pd.DataFrame:
-    """Load merged CSV and check required columns are present."""
-    required = {"time_sec", "stage"} | set(PROB_COLS)
-    df = pd.read_csv(merged_file, low_memory=False)
-    missing = required - set(df.columns)
+def _validate(df: pd.DataFrame) -> pd.DataFrame:
+    """Check required columns are present."""
+    missing = set(USECOLS_REQUIRED) - set(df.columns)
     if missing:
         raise ValueError(
             f"Merged CSV is missing required columns: {missing}\n"
@@ -43,15 +46,15 @@ def _load_and_validate(merged_file: Path) -> pd.DataFrame:
     return df
 
 
-def _rem_samples(df: pd.DataFrame) -> pd.DataFrame:
-    """Return only samples scored as REM sleep by GSSC."""
-    return df[df["stage"] == "REM"].copy()
+def _load_and_validate(merged_file: Path) -> pd.DataFrame:
+    """Load merged CSV and check required columns are present."""
+    return _validate(pd.read_csv(merged_file, low_memory=False))
 
 # =========================================================================================================
 # Feature groups
 # =========================================================================================================
 
-def _gssc_probability_features(df: pd.DataFrame) -> dict:
+def _gssc_probability_features(data: pd.DataFrame | SubjectContext) -> dict:
     """
     Features derived from GSSC stage probability outputs during REM sleep.
     These capture the confidence and stability of the staging model within REM,
@@ -71,9 +74,10 @@ def _gssc_probability_features(df: pd.DataFrame) -> dict:
 
     # ---- 1) Check probability columns are present ----
     feats: dict = {}
+    ctx = subject_context(data)
 
-    if not all(c in df.columns for c in PROB_COLS):
-        missing = [c for c in PROB_COLS if c not in df.columns]
+    if not all(c in ctx.df.columns for c in PROB_COLS):
+        missing = [c for c in PROB_COLS if c not in ctx.df.columns]
         print(f"    Probability columns missing: {missing} — returning NaN defaults")
         for k in [
             "rem_mean_prob_rem", "rem_mean_prob_w", "rem_mean_prob_n1",
@@ -84,7 +88,7 @@ def _gssc_probability_features(df: pd.DataFrame) -> dict:
         return feats
 
     # ---- 2) Filter to REM sleep samples ----
-    rem_df = _rem_samples(df)
+    rem_df = ctx.rem
     print(f"    REM samples: {len(rem_df):,}")
 
     if rem_df.empty:
@@ -127,7 +131,7 @@ def _gssc_probability_features(df: pd.DataFrame) -> dict:
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 #——————————————————————————————————————————————————————————————————————————————————————————————————————————
 
-def _gssc_rem_stability_features(df: pd.DataFrame, fs: float) -> dict:
+def _gssc_rem_stability_features(data: pd.DataFrame | SubjectContext, fs: float) -> dict:
     """
     Features describing REM sleep stability and fragmentation derived from GSSC staging.
     These are macro-level structural features of REM sleep across the night.
@@ -145,11 +149,13 @@ def _gssc_rem_stability_features(df: pd.DataFrame, fs: float) -> dict:
     """
 
     # ---- 1) Calculate total recording duration and REM duration ----
+    ctx = subject_context(data)
+    df  = ctx.df
     n_total = len(df)
     total_min = n_total / fs / 60.0
     feats: dict = {}
 
-    rem_df = _rem_samples(df)
+    rem_df = ctx.rem
     rem_min = len(rem_df) / fs / 60.0
     print(f"    Total: {total_min:.2f} min  |  REM: {rem_min:.2f} min  ({len(rem_df):,} samples)")
 
@@ -173,18 +179,14 @@ def _gssc_rem_stability_features(df: pd.DataFrame, fs: float) -> dict:
     # NOTE:
     #       Count stage transitions out of REM into any other stage.
     #       Divide by REM duration in hours to normalise across subjects.
-    stage_series = df["stage"].reset_index(drop=True)
-    transitions_out_of_rem = (
-        (stage_series.shift(1) == "REM") & (stage_series != "REM")
-    ).sum()
+    next_code = ctx.hypnogram.next_stage(REM)                 # stage entered after each REM run
+    transitions_out_of_rem = len(next_code)
     rem_hours = rem_min / 60.0
     feats["rem_fragmentation_index"] = round(transitions_out_of_rem / rem_hours, 4) if rem_hours > 0 else np.nan
     print(f"    REM fragmentation index: {feats['rem_fragmentation_index']} transitions/hour")
 
     # ---- 4) Compute fraction of REM exits that go directly to Wake ----
-    rem_to_w = (
-        (stage_series.shift(1) == "REM") & (stage_series == "W")
-    ).sum()
+    rem_to_w = int((next_code == STAGES.index("W")).sum())
     feats["rem_w_transition_frac"] = round(rem_to_w / transitions_out_of_rem, 4) if transitions_out_of_rem > 0 else np.nan
     print(f"    REM —> W transition fraction: {feats['rem_w_transition_frac']}")
 
@@ -211,6 +213,7 @@ def extract_gssc_features(
         merged_file: str | Path,
         subject_id:  str | None = None,
         fs:          float = 250.0,
+        df:          pd.DataFrame | None = None,
         ) -> dict:
     """
     Extract all GSSC probability features from a single merged CSV file.
@@ -226,6 +229,9 @@ def extract_gssc_features(
         Optional subject identifier. If None, the file stem is used.
     fs : float
         Sampling frequency of the EOG signal in [Hz]. Default is **250.0 Hz**.
+    df : pd.DataFrame | None
+        Already loaded merged data (e.g. from the shared loader in feat_report).
+        If None, ``merged_file`` is read.
 
     Returns
     -------
@@ -242,15 +248,16 @@ def extract_gssc_features(
     print(f"Extracting GSSC features: {merged_file.name}")
     print(f"  subject_id : {sid}  |  fs : {fs} [Hz]")
 
-    df = _load_and_validate(merged_file)
+    df = _load_and_validate(merged_file) if df is None else _validate(df)
+    ctx = SubjectContext(df)
 
     feats: dict = {"subject_id": sid}
 
     print(f"\n--- GSSC probability features ---")
-    feats.update(_gssc_probability_features(df))
+    feats.update(_gssc_probability_features(ctx))
 
     print(f"\n--- GSSC REM stability features ---")
-    feats.update(_gssc_rem_stability_features(df, fs))
+    feats.update(_gssc_rem_stability_features(ctx, fs))
 
     n_nan = sum(1 for v in feats.values() if isinstance(v, float) and np.isnan(v))
     print(f"\n  Features computed : {len(feats) - 1}")
@@ -0,0 +1,163 @@
+# Filename: matrix.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Subject × feature matrix that the per-module feature tables are written into. One
+#              float32 array is preallocated for all subjects and numeric features, each module's
+#              block is written at its subject rows, and the result is saved as features.csv (or
+#              Parquet) in one step instead of a chain of pairwise outer merges. Integer columns
+#              are written back as integers, and columns float32 cannot hold to their written
+#              digits (e.g. 28800.1234) are kept in float64.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# =====================================================================
+# Functions
+# =====================================================================
+def _is_numeric(col: pd.Series) -> bool:
+    """True for numeric / bool columns and for object columns holding only numbers and missing values."""
+    if pd.api.types.is_numeric_dtype(col):
+        return True
+    try:
+        pd.to_numeric(col)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _float32_exact(block: np.ndarray) -> np.ndarray:
+    """
+    Per column of a float64 block: True if every value reads back unchanged from its float32
+    text form (the shortest repr written to CSV), e.g. 0.1234 but not 28800.1234.
+    """
+    back = block.astype(np.float32).astype(str).astype(np.float64)
+    return ((back == block) | np.isnan(block)).all(axis=0)
+
+# =====================================================================
+# Feature matrix
+# =====================================================================
+@dataclass
+class FeatureMatrix:
+    """
+    Features of all subjects as one float32 matrix plus column metadata.
+
+    Attributes
+    ----------
+    subjects : list[str]
+        Subject IDs, one per row (sorted).
+    columns : list[str]
+        All feature columns in output order (numeric and text).
+    sources : dict[str, str]
+        Table each column was taken from (e.g. ``eog_features``).
+    values : np.ndarray
+        ``(n_subjects, n_numeric)`` float32 matrix of the numeric columns, NaN where missing.
+    numeric : list[str]
+        Column of each matrix column.
+    text : dict[str, np.ndarray]
+        Non-numeric columns (e.g. ``DCSM_ID``) as object arrays, None where missing.
+    integer : list[str]
+        Numeric columns with an integer dtype in their source table (written as ``Int64``).
+    exact : dict[str, np.ndarray]
+        float64 copies of the numeric columns float32 would round (see ``_float32_exact``);
+        ``to_frame`` writes these instead of the matrix column.
+    """
+    subjects: list[str]
+    columns:  list[str]
+    sources:  dict[str, str]
+    values:   np.ndarray
+    numeric:  list[str]
+    text:     dict[str, np.ndarray] = field(default_factory=dict)
+    integer:  list[str] = field(default_factory=list)
+    exact:    dict[str, np.ndarray] = field(default_factory=dict)
+
+    @classmethod
+    def from_tables(cls, tables: dict[str, pd.DataFrame]) -> "FeatureMatrix":
+        """
+        Write per-module feature tables (each with a ``subject_id`` column) into one matrix.
+
+        Rows are the union of all subjects, columns the union of all features in table
+        order. A column found in several tables is taken from the first one, as the
+        pairwise outer merge kept the left column and dropped its ``_dup`` copy.
+        """
+        subjects = sorted(set().union(*(t["subject_id"].astype(str) for t in tables.values())))
+        sources  = {}
+        for name, t in tables.items():
+            for c in t.columns:
+                if c != "subject_id" and c not in sources:
+                    sources[c] = name
+        columns = list(sources)
+        numeric = [c for c in columns if _is_numeric(tables[sources[c]][c])]
+        integer = [c for c in numeric if pd.api.types.is_integer_dtype(tables[sources[c]][c])
+                   and not pd.api.types.is_bool_dtype(tables[sources[c]][c])]
+
+        matrix = cls(subjects=subjects, columns=columns, sources=sources,
+                     values=np.full((len(subjects), len(numeric)), np.nan, dtype=np.float32),
+                     numeric=numeric, integer=integer)
+
+        # ---- Each table's block is written at its subjects' rows ----
+        row_of = pd.Index(subjects)
+        col_of = {c: j for j, c in enumerate(numeric)}
+        for name, t in tables.items():
+            rows  = row_of.get_indexer(t["subject_id"].astype(str))
+            owned = [c for c in t.columns if sources.get(c) == name]
+            num   = [c for c in owned if c in col_of]
+            if num:
+                block = t[num].apply(pd.to_numeric).to_numpy(dtype=np.float64, na_value=np.nan)
+                matrix.values[rows[:, None], [col_of[c] for c in num]] = block
+                for j in np.flatnonzero(~_float32_exact(block)):
+                    exact = matrix.exact.setdefault(num[j], np.full(len(subjects), np.nan))
+                    exact[rows] = block[:, j]
+            for c in owned:
+                if c not in col_of:
+                    matrix.text[c] = np.full(len(subjects), None, dtype=object)
+                    matrix.text[c][rows] = t[c].to_numpy(dtype=object)
+        return matrix
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.subjects), len(self.columns)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        ``subject_id`` plus all feature columns: numeric ones as float32, except the ``exact``
+        columns (float64) and the ``integer`` columns (nullable ``Int64``, ``<NA>`` where missing).
+        """
+        df = pd.DataFrame(self.values, columns=self.numeric)
+        for c, vals in self.exact.items():
+            df[c] = vals
+        for c in self.integer:
+            df[c] = df[c].astype("Int64")
+        for c, vals in self.text.items():
+            df[c] = vals
+        df = df[self.columns]
+        df.insert(0, "subject_id", self.subjects)
+        return df
+
+    def save(self, path: str | Path) -> pd.DataFrame:
+        """
+        Save the table as CSV, or as Parquet if ``path`` ends in ``.parquet``.
+
+        Parquet needs pyarrow (or fastparquet), which is not a pipeline dependency;
+        without it an ImportError names the missing package.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df = self.to_frame()
+        if path.suffix == ".parquet":
+            try:
+                df.to_parquet(path, index=False)
+            except ImportError as e:
+                raise ImportError(f"Parquet output needs pyarrow (pip install pyarrow): {e}") from e
+        else:
+            df.to_csv(path, index=False)
+        return df
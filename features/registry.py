@@ -0,0 +1,227 @@
+# Filename: registry.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Declarative registry of the feature groups computed from a merged CSV. Each group
+#              names its function, the merged columns it reads and the feature keys it returns,
+#              so the shared loader in analysis/feat_report.py can read only the needed columns
+#              and recompute only groups whose cached outputs are out of date.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from dataclasses import dataclass
+from importlib import import_module
+
+# =====================================================================
+# Data container
+# =====================================================================
+@dataclass(frozen=True)
+class FeatureGroup:
+    """
+    One feature function and its column dependencies.
+
+    Attributes
+    ----------
+    name : str
+        Group name, usable in ``--modules``.
+    module : str
+        Module whose CSV the outputs are written to (``eog``, ``gssc``, ...).
+    func : str
+        ``"package.module:function"`` taking ``(data, fs)`` or ``(data)``, where ``data`` is
+        a merged DataFrame or its ``features.context.SubjectContext``.
+    required : tuple[str, ...]
+        Merged columns that must exist; otherwise the group is skipped for that subject.
+    optional : tuple[str, ...]
+        Merged columns read when present.
+    outputs : tuple[str, ...]
+        Feature keys returned, in CSV column order.
+    uses_fs : bool
+        Whether ``func`` takes the sampling frequency.
+    version : str
+        Bump when the function's output changes; cached features of an older
+        version are recomputed (features/cache.py).
+    """
+    name: str
+    module: str
+    func: str
+    required: tuple[str, ...]
+    optional: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+    uses_fs: bool = True
+    version: str = "1"
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Per-module feature CSV (in features_csv/)
+MODULE_CSVS = {
+    "eog":   "eog_features.csv",
+    "gssc":  "gssc_features.csv",
+    "eeg":   "eeg_features.csv",
+    "bout":  "bout_features.csv",
+    "extra": "extra_features.csv",
+}
+
+_STAGES     = ("w", "n1", "n2", "n3", "rem")
+_PROB_COLS  = ("prob_w", "prob_n1", "prob_n2", "prob_n3", "prob_rem")
+_BOUT_STATS = ("count", "mean_duration_s", "max_duration_s", "min_duration_s",
+               "std_duration_s", "median_duration_s", "rate_per_min", "total_duration_s")
+
+# Groups in the order their outputs appear in each module CSV
+FEATURE_GROUPS: list[FeatureGroup] = [
+    # ---- eog ----
+    FeatureGroup(
+        "stage_distribution", "eog", "features.eog_feats:_stage_distribution_features",
+        required=("stage",),
+        outputs=("total_recording_min",)
+                + tuple(f"{s}_{k}" for s in _STAGES for k in ("duration_min", "fraction"))
+                + ("n_rem_epochs",),
+    ),
+    FeatureGroup(
+        "rem_epoch_duration", "eog", "features.eog_feats:_rem_epoch_duration_features",
+        required=("stage",),
+        outputs=("rem_epoch_count", "rem_epoch_mean_duration_min", "rem_epoch_std_duration_min",
+                 "rem_epoch_min_duration_min", "rem_epoch_max_duration_min"),
+    ),
+    FeatureGroup(
+        "rem_events", "eog", "features.eog_feats:_rem_event_features",
+        required=("stage",),
+        optional=("is_rem_event", "event_Peak", "event_Duration",
+                  "event_LOCAbsValPeak", "event_ROCAbsValPeak",
+                  "event_LOCAbsRiseSlope", "event_ROCAbsRiseSlope"),
+        outputs=("rem_event_count", "rem_event_rate_per_min",
+                 "rem_event_mean_duration_s", "rem_event_median_duration_s",
+                 "rem_event_mean_loc_amp_uv", "rem_event_mean_roc_amp_uv",
+                 "rem_event_mean_loc_rise_slope", "rem_event_mean_roc_rise_slope"),
+    ),
+    FeatureGroup(
+        "em_classification", "eog", "features.eog_feats:_em_classification_features",
+        required=("stage",),
+        optional=("EM_Type", "em_event_id", "is_em_event", "em_Duration",
+                  "em_MeanAbsValPeak", "em_LOCAbsValPeak", "em_ROCAbsValPeak"),
+        outputs=("sem_count_rem_sleep", "rem_em_count_rem_sleep", "sem_rate_per_min", "rem_em_rate_per_min",
+                 "sem_fraction", "rem_em_fraction", "sem_mean_duration_s", "rem_em_mean_duration_s",
+                 "sem_mean_amp_uv", "rem_em_mean_amp_uv"),
+    ),
+    FeatureGroup(
+        "em_stage_counts", "eog", "features.eog_feats:_em_stage_count_features",
+        required=("stage",),
+        optional=("EM_Type", "em_event_id", "em_is_peak"),
+        outputs=("em_count_n1", "em_count_n2", "em_count_n3", "em_count_rem", "em_count_wake"),
+        uses_fs=False,
+    ),
+    FeatureGroup(
+        "phasic_tonic", "eog", "features.eog_feats:_phasic_tonic_features",
+        required=("stage",),
+        optional=("time_sec", "EpochType", "em_SubEpochStart"),
+        outputs=("phasic_epoch_count", "tonic_epoch_count", "phasic_fraction", "tonic_fraction"),
+        uses_fs=False,
+    ),
+    FeatureGroup(
+        "eog_amplitude", "eog", "features.eog_feats:_eog_amplitude_features",
+        required=("stage",),
+        optional=("LOC", "ROC"),
+        outputs=tuple(f"rem_{ch}_{k}" for ch in ("loc", "roc") for k in ("mean_abs_uv", "std_uv", "p95_uv")),
+        uses_fs=False,
+    ),
+    # ---- gssc ----
+    FeatureGroup(
+        "gssc_probability", "gssc", "features.gssc_feats:_gssc_probability_features",
+        required=("stage",),
+        optional=_PROB_COLS,
+        outputs=("rem_mean_prob_rem", "rem_mean_prob_w", "rem_mean_prob_n1", "rem_mean_prob_n2",
+                 "rem_mean_prob_n3", "rem_certainty", "rem_mean_prob_nrem", "rem_high_wake_prob_frac"),
+        uses_fs=False,
+    ),
+    FeatureGroup(
+        "gssc_rem_stability", "gssc", "features.gssc_feats:_gssc_rem_stability_features",
+        required=("stage",),
+        optional=("prob_rem",),
+        outputs=("rem_stability_index", "rem_fragmentation_index", "rem_w_transition_frac", "amount_of_rem"),
+    ),
+    # ---- eeg ----
+    FeatureGroup(
+        "eeg_band_power", "eeg", "features.eeg_feats:_eeg_band_power_features",
+        required=("stage", "EEG_LOC", "EEG_ROC"),
+        outputs=tuple(f"eeg__{s}__{k}" for s in _STAGES
+                      for k in ("delta", "theta", "alpha", "beta", "total", "theta_ratio"))
+                + ("eeg__overall__theta_beta_ratio",),
+        version="3",    # Welch per contiguous stage run, weighted by run length
+    ),
+    # ---- bout ----
+    FeatureGroup(
+        "phasic_tonic_bouts", "bout", "features.bout_feats:phasic_tonic_bout_features",
+        required=("stage",),
+        optional=("time_sec", "EpochType", "em_SubEpochStart"),
+        outputs=tuple(f"{t}_bout_{k}" for t in ("phasic", "tonic") for k in _BOUT_STATS)
+                + ("phasic_tonic_transitions",),
+    ),
+    # ---- extra ----
+    FeatureGroup(
+        "spectral", "extra", "features.extra_feats:_spectral_features",
+        required=("stage",),
+        optional=("time_sec", "EEG_LOC", "EEG_ROC", "EpochType"),
+        outputs=tuple(f"eeg_{k}" for ctx in ("rem", "phasic", "tonic")
+                      for k in (f"delta_{ctx}_power", f"theta_{ctx}_power", f"gamma_{ctx}_power",
+                                f"theta_delta_ratio_{ctx}")),
+        version="2",    # PSDs from the shared 4-s spectrogram instead of Welch per band and context
+    ),
+    FeatureGroup(
+        "phasic_tonic_structure", "extra", "features.extra_feats:_phasic_tonic_structure_features",
+        required=("stage", "time_sec"),
+        optional=("EpochType", "em_SubEpochStart"),
+        outputs=("pt_transitions_per_min",)
+                + tuple(f"{t}_bout_{p}_s" for t in ("phasic", "tonic") for p in ("p25", "p75", "p90"))
+                + ("phasic_longest_run_s", "tonic_longest_run_s", "phasic_first_latency_s",
+                   "phasic_long_bout_fraction", "tonic_long_bout_fraction"),
+    ),
+    FeatureGroup(
+        "em_morphology", "extra", "features.extra_feats:_em_morphology_features",
+        required=(),
+        optional=("is_em_event", "Start_x", "em_EM_Type", "em_MeanAbsValPeak",
+                  "em_LOCAbsRiseSlope", "em_ROCAbsRiseSlope", "em_LOCAbsFallSlope", "em_ROCAbsFallSlope"),
+        outputs=("em_mean_rise_slope", "em_mean_fall_slope", "em_amplitude_variance", "em_sem_fraction"),
+        uses_fs=False,
+    ),
+    FeatureGroup(
+        "sleep_architecture", "extra", "features.extra_feats:_sleep_architecture_features",
+        required=("stage", "time_sec"),
+        outputs=("rem_latency_min", "n_rem_cycles"),
+    ),
+]
+
+GROUPS = {g.name: g for g in FEATURE_GROUPS}
+
+# =====================================================================
+# Functions
+# =====================================================================
+def select_groups(names: list[str] | None = None) -> list[FeatureGroup]:
+    """
+    Expand module and group names to feature groups, in registry order.
+
+    ``None`` or an empty list selects every group. Unknown names raise ``ValueError``.
+    """
+    if not names:
+        return list(FEATURE_GROUPS)
+    unknown = [n for n in names if n not in MODULE_CSVS and n not in GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown feature modules/groups: {unknown}")
+    wanted = set(names)
+    return [g for g in FEATURE_GROUPS if g.name in wanted or g.module in wanted]
+
+
+def group_usecols(groups: list[FeatureGroup], header: set[str] | list[str]) -> list[str]:
+    """Minimal ``usecols`` for ``groups`` given the columns present in a merged CSV."""
+    header = set(header)
+    cols = [c for g in groups for c in g.required + g.optional if c in header]
+    return list(dict.fromkeys(cols))
+
+
+def load_group(group: FeatureGroup):
+    """Import and return the group's feature function."""
+    module_name, func_name = group.func.split(":")
+    return getattr(import_module(module_name), func_name)
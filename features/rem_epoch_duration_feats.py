@@ -11,6 +11,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns 
 
+from features.context import REM, Hypnogram
+
 def rem_epoch_duration_features (df: pd.DataFrame , fs: float, plot: bool = False) -> dict:
     """ 
     Duration statistics for each individual REM epoch. 
@@ -40,12 +42,10 @@ def rem_epoch_duration_features (df: pd.DataFrame , fs: float, plot: bool = Fals
     if missing:
         raise ValueError(f"Input DataFrame is missing columns: {missing}")
     
-    # --- Identify REM blocks ---
+    # --- Identify REM blocks (run-length hypnogram of the stage column) ---
 
-    is_rem = (df["stage"] == "REM").astype(int)
-    epoch_ids = (is_rem.diff().fillna(0) != 0).cumsum()
-    rem_blocks = df[is_rem == 1].groupby(epoch_ids).size()
-    rem_duration_min = rem_blocks / fs / 60.0 
+    rem_blocks = Hypnogram.from_labels(df["stage"]).runs(REM)
+    rem_duration_min = pd.Series(rem_blocks / fs / 60.0)
 
     features: dict = {}
 
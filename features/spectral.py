@@ -0,0 +1,197 @@
+# Filename: spectral.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: PSD estimates of the recovered EEG over masked parts of the night. The short-time
+#              spectrogram is computed once per subject: the night is cut into 4-s segments on the
+#              sub-epoch grid (time_sec // 4), each segment gets one Hann periodogram, and a REM
+#              context's PSD is the mean of the segments inside it. Masks that do not follow the
+#              sub-epoch grid (sleep stages) use masked_psd: Welch within each contiguous stretch
+#              of the mask, weighted by its length, so no samples are concatenated across gaps.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.signal import periodogram, welch
+
+from features.context import SUB_EPOCH_LEN_S, run_lengths
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+EEG_COLS  = ("EEG_LOC", "EEG_ROC")
+SEGMENT_S = SUB_EPOCH_LEN_S     # segment length = Welch nperseg used before (0.25 Hz resolution)
+
+# =====================================================================
+# Functions
+# =====================================================================
+def eeg_signal(df: pd.DataFrame) -> np.ndarray | None:
+    """
+    Average of the recovered EEG channels (``EEG_LOC``, ``EEG_ROC``) per sample.
+
+    If only one channel has data, that channel is returned. Samples where a channel
+    is missing stay NaN, so the segments containing them are left out of every PSD.
+    None if neither channel has data.
+    """
+    chans = [pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64)
+             for c in EEG_COLS if c in df.columns and df[c].notna().any()]
+    if not chans:
+        return None
+    return chans[0] if len(chans) == 1 else (chans[0] + chans[1]) / 2.0
+
+
+def band_power(freqs: np.ndarray, psd: np.ndarray, fmin: float, fmax: float) -> float:
+    """Absolute power in ``[fmin, fmax]`` Hz (trapezoid integral of the PSD); NaN if no bin falls inside."""
+    idx = (freqs >= fmin) & (freqs <= fmax)
+    if idx.sum() == 0:
+        return np.nan
+    return float(np.trapz(psd[idx], freqs[idx]))
+
+
+def masked_psd(signal: np.ndarray, mask: np.ndarray | None, fs: float,
+               nperseg: int) -> tuple[np.ndarray, np.ndarray, int]:
+    """
+    Welch PSD of the samples of ``signal`` inside ``mask``, one stretch at a time.
+
+    Every contiguous run of masked, finite samples is estimated on its own with Welch
+    (``nperseg`` Hann segments, 50 % overlap) on a slice of ``signal``, i.e. a view,
+    and the run PSDs are averaged weighted by run length. Runs shorter than ``nperseg``
+    are skipped. No segment spans two runs, so gaps, unscored samples and the other
+    stages never end up inside one periodogram, and no copy of the masked samples is made.
+
+    Parameters
+    ----------
+    signal : np.ndarray
+        1-D signal, NaN where missing.
+    mask : np.ndarray | None
+        Samples to include. None means the whole signal.
+    fs : float
+        Sampling frequency [Hz].
+    nperseg : int
+        Welch segment length [samples].
+
+    Returns
+    -------
+    freqs : np.ndarray
+        Frequency bins [Hz].
+    psd : np.ndarray
+        Length-weighted mean PSD (NaN if no run is long enough).
+    n_samples : int
+        Samples in the runs that were used.
+    """
+    signal = np.asarray(signal)
+    usable = np.isfinite(signal) if mask is None else np.asarray(mask, dtype=bool) & np.isfinite(signal)
+    starts, lengths, inside = run_lengths(usable)
+    keep   = inside & (lengths >= nperseg)
+
+    freqs = np.fft.rfftfreq(nperseg, d=1.0 / fs)
+    n_samples = int(lengths[keep].sum())
+    if n_samples == 0:
+        return freqs, np.full(len(freqs), np.nan), 0
+
+    psd = np.zeros(len(freqs))
+    for start, length in zip(starts[keep], lengths[keep]):
+        _, run_psd = welch(signal[start:start + length], fs=fs, nperseg=nperseg)
+        psd += length * run_psd
+    return freqs, psd / n_samples, n_samples
+
+# =====================================================================
+# Spectrogram
+# =====================================================================
+@dataclass(frozen=True)
+class Spectrogram:
+    """
+    One periodogram per grid segment of a whole-night signal.
+
+    Attributes
+    ----------
+    freqs : np.ndarray
+        Frequency bins [Hz].
+    psd : np.ndarray
+        ``(n_segments, n_freqs)`` PSD of each segment [µV²/Hz]; NaN rows for invalid segments.
+    valid : np.ndarray
+        Segments whose samples are all finite.
+    offset : int
+        Sample where the first segment starts (the first grid boundary).
+    nperseg : int
+        Samples per segment.
+    fs : float
+        Sampling frequency [Hz].
+    """
+    freqs:   np.ndarray
+    psd:     np.ndarray
+    valid:   np.ndarray
+    offset:  int
+    nperseg: int
+    fs:      float
+
+    @classmethod
+    def compute(cls, signal: np.ndarray, fs: float, t0: float = 0.0,
+                segment_s: float = SEGMENT_S) -> "Spectrogram":
+        """
+        Spectrogram of ``signal`` on the ``segment_s`` grid.
+
+        Segments start at the multiples of ``segment_s`` in recording time (``t0`` is the
+        time of the first sample), so they coincide with the phasic/tonic sub-epochs. The
+        complete segments are reshaped into a matrix (a view, no copy) and transformed in
+        one call: an STFT with a Hann window and no overlap, scaled like ``welch``.
+        Partial segments at either end are dropped.
+
+        Parameters
+        ----------
+        signal : np.ndarray
+            1-D signal, NaN where missing.
+        fs : float
+            Sampling frequency [Hz].
+        t0 : float
+            Time of ``signal[0]`` [s]. Default is **0.0**.
+        segment_s : float
+            Segment length [s]. Default is **4.0** (the sub-epoch length).
+        """
+        signal  = np.asarray(signal, dtype=np.float64)
+        nperseg = int(round(segment_s * fs))
+        offset  = int(round((np.ceil(t0 / segment_s) * segment_s - t0) * fs))
+        n_seg   = max((len(signal) - offset) // nperseg, 0)
+
+        segments = signal[offset:offset + n_seg * nperseg].reshape(n_seg, nperseg)
+        valid    = np.isfinite(segments).all(axis=1)
+        if n_seg == 0:
+            freqs, psd = np.fft.rfftfreq(nperseg, d=1.0 / fs), np.zeros((0, nperseg // 2 + 1))
+        else:
+            freqs, psd = periodogram(segments, fs=fs, window="hann", detrend="constant", axis=-1)
+            psd[~valid] = np.nan
+        return cls(freqs=freqs, psd=psd, valid=valid, offset=offset, nperseg=nperseg, fs=float(fs))
+
+    @property
+    def n_segments(self) -> int:
+        return len(self.valid)
+
+    def segments_in(self, sample_mask: np.ndarray) -> np.ndarray:
+        """Valid segments whose samples all lie inside ``sample_mask`` (one bool per segment)."""
+        stop = self.offset + self.n_segments * self.nperseg
+        inside = np.asarray(sample_mask, dtype=bool)[self.offset:stop].reshape(self.n_segments, self.nperseg)
+        return inside.all(axis=1) & self.valid
+
+    def mean_psd(self, sample_mask: np.ndarray | None = None) -> tuple[np.ndarray, int]:
+        """
+        Mean PSD of the segments inside ``sample_mask`` (all valid segments if None).
+
+        Returns
+        -------
+        psd : np.ndarray
+            Mean PSD per frequency bin (NaN if no segment qualifies).
+        n_segments : int
+            Number of segments averaged.
+        """
+        selected = self.valid if sample_mask is None else self.segments_in(sample_mask)
+        n = int(selected.sum())
+        if n == 0:
+            return np.full(len(self.freqs), np.nan), 0
+        return self.psd[selected].mean(axis=0), n
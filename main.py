@@ -5,9 +5,13 @@
 # Usage:
 #   python main.py process /data/raw                            # process 10 patients
 #   python main.py process /data/raw --batch-size 5             # process 5
+#   python main.py process /data/raw --float32                  # float32 detection path
+#   python main.py process /data/raw --workers 4                # 4 sessions in parallel
+#   python main.py stage /data/raw                              # batched GSSC staging only
 #   python main.py extract patient_info.xlsx                    # extract all feature modules
 #   python main.py extract patient_info.xlsx --modules bout     # extract only bout features
 #   python main.py extract patient_info.xlsx --force            # re-extract all from scratch
+#   python main.py extract patient_info.xlsx --workers 4        # extract 4 subjects in parallel
 #   python main.py report                                       # generate HTML report
 #   python main.py all /data/raw patient_info.xlsx              # full pipeline
 #   python main.py all /data/raw patient_info.xlsx --force      # full pipeline, re-extract
@@ -16,9 +20,10 @@
 #
 # Feature modules: eog, gssc, eeg, bout, patient
 #   Each module saves its own CSV in features_csv/ (e.g. eog_features.csv).
-#   After extraction, all module CSVs are outer-joined into features.csv.
-#   --force deletes selected module CSVs before re-extracting.
-#   Without --force, existing module CSVs are kept (incremental).
+#   After extraction, all module CSVs are written into one subject × feature matrix and saved as features.csv.
+#   Features are cached per subject and feature group (features_csv/feature_cache.sqlite);
+#   only groups whose merged CSV content or group version changed are recomputed.
+#   --force clears the selected modules/groups from the cache before re-extracting.
 #
 # Re-running preprocessing stages:
 #   The pipeline skips any stage whose output file already exists.
@@ -34,23 +39,22 @@
 from __future__ import annotations
 
 import argparse
+import contextlib
 import sys
 import time
 import traceback
 import numpy as np
 import pandas as pd
-import mne
 from pathlib import Path
 
-from preprocessing.index_file import index_sessions
-from preprocessing.edf_to_csv import edf_to_csv
-from preprocessing.GSSC_to_csv import GSSC_to_csv
-from preprocessing.extract_rems_n import extract_rems_from_edf
-from preprocessing.em_to_csv import em_to_csv
-from preprocessing.merge import merge_all
-from preprocessing.channel_standardization import build_rename_map
-from preprocessing.eeg_to_csv import eeg_to_csv
-from analysis.feat_report import collect_features, generate_report, merge_feature_csvs
+from features.registry import GROUPS as FEATURE_GROUPS, MODULE_CSVS as FEATURE_MODULES
+from preprocessing.session_catalog import (
+    CATALOG_PATH, catalog_records, load_stage_timings, record_stage_timings, update_catalog, usable_sessions,
+)
+
+# Stage implementations (mne, torch/gssc, yasa, dtcwt, feature modules) are imported
+# inside the run_* functions that need them, so `report`, `merge` and `cleanup` start
+# without paying for torch/MNE. Tests/test_import_time.py guards this.
 
 # =====================================================================
 # Constants
@@ -63,16 +67,18 @@ MERGED_DIR   = Path("merged_csv_eog")
 FEATURES_DIR = Path("features_csv")
 REPORTS_DIR  = Path("reports")
 EEG_DIR      = Path("eeg_csv")
+# Output directories are created by each stage when it first writes to them
 
-for d in [EOG_DIR, GSSC_DIR, REMS_DIR, EM_DIR, MERGED_DIR, FEATURES_DIR, REPORTS_DIR, EEG_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
-
-# Hardcoded pipeline settings
+# Hardcoded pipeline settings (GSSC ones mirror preprocessing.GSSC_to_csv, kept here so
+# the CLI can be built without importing torch)
+GSSC_PRECISIONS     = ("fp32", "int8", "bf16")
+GSSC_BATCH_EPOCHS   = 4096
 FS                  = 250.0
 PATTERN             = "*_merged.csv*"
 DEFAULT_FEATURE_CSV = FEATURES_DIR / "features.csv"
 DEFAULT_REPORT_HTML = REPORTS_DIR  / "features_report.html"
 AMPLITUDE_THRESH_UV = 300.0
+MODULE_CHOICES      = (*FEATURE_MODULES, "patient", "all", *FEATURE_GROUPS)   # --modules of extract and all
 
 # ANSI helpers
 BOLD  = "\033[1m"
@@ -116,6 +122,16 @@ def _wait_for_file(path: Path, timeout: float = 10.0, interval: float = 0.5) ->
     return path
 
 
+@contextlib.contextmanager
+def _timed(timings: dict[str, float], stage: str):
+    """Add the wall-clock seconds spent in the block to ``timings[stage]``."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - t0
+
+
 def _compress_intermediates(session_id: str, edf_stem: str) -> float:
     """Gzip intermediate CSV files for a session after a successful merge."""
     import gzip
@@ -171,8 +187,29 @@ def _check_existing_outputs(session_id, edf_stem):
 # =====================================================================
 # Core — process one patient through the full pipeline
 # =====================================================================
-def process_patient(rec) -> bool:
-    """Run stages 1-7 for a single patient session, skipping completed stages."""
+def process_patient(rec, dtype: type | None = None, gssc_threads: int | None = None,
+                    gssc_precision: str = "fp32", timings_db: Path | None = CATALOG_PATH) -> bool:
+    """Run stages 1-7 for a single patient session, skipping completed stages.
+
+    ``dtype`` sets the working precision of the detection path (stages 3, 5 and 6),
+    e.g. ``np.float32``. None keeps the float64 signals returned by MNE.
+    ``gssc_threads`` caps the torch threads used by the (process-wide) GSSC engine and
+    ``gssc_precision`` selects its inference precision (fp32, int8 or bf16).
+    The seconds spent per stage are recorded in ``timings_db`` (the session catalog) for
+    the scheduler in run_process; None disables this.
+    """
+    import mne
+    from preprocessing.edf_to_csv import edf_to_csv
+    from preprocessing.GSSC_to_csv import GSSC_to_csv
+    from preprocessing.extract_rems_n import extract_rems_from_edf
+    from preprocessing.em_to_csv import em_to_csv
+    from preprocessing.merge import merge_all
+    from preprocessing.channel_standardization import build_rename_map
+    from preprocessing.edf_reader import read_raw_eog
+    from preprocessing.eeg_to_csv import eeg_to_csv
+    from preprocessing.filtering import clear_filter_cache
+    from preprocessing.remove_artefacts import mask_signals
+
     session_id  = rec.patient_id
     edf_path    = rec.edf_path
     lights_path = rec.txt_path
@@ -181,6 +218,7 @@ def process_patient(rec) -> bool:
     print(f"  Processing: {BOLD}{session_id}{RESET}")
     print(f"{'=' * 70}")
     t0 = time.perf_counter()
+    timings: dict[str, float] = {}
 
     try:
         existing = _check_existing_outputs(session_id, edf_path.stem)
@@ -195,13 +233,19 @@ def process_patient(rec) -> bool:
         )
 
         # ── Load EDF once ───────────────────────────────────────────
+        # Only LOC/ROC are decoded, at their native rate; every stage picks just these two.
         raw = None
         if needs_edf:
             print(f"\n{BOLD}Loading EDF + renaming channels{RESET}")
-            raw = mne.io.read_raw_edf(edf_path, preload=False, verbose=False)
-            rename_map = build_rename_map(raw.ch_names)
-            if rename_map:
-                raw.rename_channels(rename_map)
+            with _timed(timings, "load"):
+                try:
+                    raw = read_raw_eog(edf_path)
+                except ValueError as e:
+                    print(f"    Channel-selective read failed ({e}) — falling back to MNE reader")
+                    raw = mne.io.read_raw_edf(edf_path, preload=False, verbose=False)
+                    rename_map = build_rename_map(raw.ch_names)
+                    if rename_map:
+                        raw.rename_channels(rename_map)
             print(f"    sfreq: {raw.info['sfreq']} Hz  |  channels: {len(raw.ch_names)}")
         else:
             print(f"\n  All intermediate files exist — skipping EDF load.")
@@ -211,7 +255,8 @@ def process_patient(rec) -> bool:
             print(f"\n{BOLD}[1/7] EDF → EOG CSV — SKIPPED{RESET}")
         else:
             print(f"\n{BOLD}[1/7] EDF → EOG CSV{RESET}")
-            edf_to_csv(edf_path, raw=raw, out_dir=EOG_DIR, lights_path=lights_path)
+            with _timed(timings, "eog_csv"):
+                edf_to_csv(edf_path, raw=raw, out_dir=EOG_DIR, lights_path=lights_path)
 
         # ── Stage 2: GSSC sleep staging ─────────────────────────────
         if existing["gssc"]:
@@ -219,7 +264,9 @@ def process_patient(rec) -> bool:
             gssc_df = pd.read_csv(GSSC_DIR / f"{session_id}_gssc.csv")
         else:
             print(f"\n{BOLD}[2/7] GSSC sleep staging{RESET}")
-            gssc_df = GSSC_to_csv(edf_path, raw=raw, out_dir=GSSC_DIR, lights_path=lights_path)
+            with _timed(timings, "gssc"):
+                gssc_df = GSSC_to_csv(edf_path, raw=raw, out_dir=GSSC_DIR, lights_path=lights_path,
+                                      n_threads=gssc_threads, precision=gssc_precision)
 
         stage_map = {"W": 0, "N1": 1, "N2": 2, "N3": 3, "REM": 4}
         hypno_int = gssc_df["stage"].map(stage_map).fillna(0).astype(int).values
@@ -229,40 +276,45 @@ def process_patient(rec) -> bool:
             print(f"\n{BOLD}[3/7] Extract REM events — SKIPPED{RESET}")
             df, loc, roc, loc_clean, roc_clean = None, None, None, None, None
         else:
-            result = extract_rems_from_edf(
-                edf_path=edf_path, raw=raw, out_dir=REMS_DIR,
-                lights_path=lights_path, gssc_df=gssc_df,
-            )
+            with _timed(timings, "rems"):
+                result = extract_rems_from_edf(
+                    edf_path=edf_path, raw=raw, out_dir=REMS_DIR,
+                    lights_path=lights_path, gssc_df=gssc_df, dtype=dtype,
+                )
             if result is None:
                 raise RuntimeError("Signal too short or missing channels — skipping session")
             df, loc, roc, loc_clean, roc_clean = result
 
         # ── Stage 4: Mask artefacts ─────────────────────────────────
         print(f"\n{BOLD}[4/7] Mask artefacts in EOG CSV{RESET}")
-        eog_csv_path = EOG_DIR / f"{session_id}_{edf_path.stem}_eog.csv"
-        if not eog_csv_path.exists() or eog_csv_path.stat().st_size < 10:
-            print("    EOG CSV missing or empty — regenerating...")
-            edf_to_csv(edf_path, raw=raw, out_dir=EOG_DIR, lights_path=lights_path)
-        eog_csv_path = _wait_for_file(eog_csv_path)
-        eog_df = pd.read_csv(eog_csv_path)
-
-        artefact_mask = (
-            (np.abs(eog_df["LOC"].values) > AMPLITUDE_THRESH_UV) |
-            (np.abs(eog_df["ROC"].values) > AMPLITUDE_THRESH_UV)
-        )
-        n_masked = int(artefact_mask.sum())
-        eog_df.loc[artefact_mask, "LOC"] = np.nan
-        eog_df.loc[artefact_mask, "ROC"] = np.nan
-        eog_df.to_csv(eog_csv_path, index=False)
-        print(f"    Artefact samples masked: {n_masked:,} / {len(eog_df):,}")
+        with _timed(timings, "artefacts"):
+            eog_csv_path = EOG_DIR / f"{session_id}_{edf_path.stem}_eog.csv"
+            if not eog_csv_path.exists() or eog_csv_path.stat().st_size < 10:
+                print("    EOG CSV missing or empty — regenerating...")
+                edf_to_csv(edf_path, raw=raw, out_dir=EOG_DIR, lights_path=lights_path)
+            eog_csv_path = _wait_for_file(eog_csv_path)
+            eog_df = pd.read_csv(eog_csv_path)
+
+            artefact_mask = (
+                (np.abs(eog_df["LOC"].values) > AMPLITUDE_THRESH_UV) |
+                (np.abs(eog_df["ROC"].values) > AMPLITUDE_THRESH_UV)
+            )
+            n_masked = int(artefact_mask.sum())
+            if n_masked:
+                eog_df["LOC"], eog_df["ROC"] = mask_signals(artefact_mask, eog_df["LOC"].values, eog_df["ROC"].values)
+                eog_df.to_csv(eog_csv_path, index=False)
+            else:
+                print("    No new artefact samples — EOG CSV left unchanged.")
+            print(f"    Artefact samples masked: {n_masked:,} / {len(eog_df):,}")
 
         # ── Stage 5: Detect & classify eye movements ────────────────
         if existing["em"]:
             print(f"\n{BOLD}[5/7] Detect & classify EMs — SKIPPED{RESET}")
         else:
             print(f"\n{BOLD}[5/7] Detect & classify EMs{RESET}")
-            em_to_csv(edf_path=edf_path, raw=raw, hypno_int=hypno_int,
-                      out_dir=EM_DIR, lights_path=lights_path)
+            with _timed(timings, "em"):
+                em_to_csv(edf_path=edf_path, raw=raw, hypno_int=hypno_int,
+                          out_dir=EM_DIR, lights_path=lights_path, dtype=dtype)
 
         # ── Stage 6: Extract EEG signals ────────────────────────────
         if existing["eeg"]:
@@ -271,19 +323,21 @@ def process_patient(rec) -> bool:
             print(f"\n{BOLD}[6/7] Extract EEG signals{RESET}")
             if loc_clean is None:
                 print("    Re-running stage 3 to get filtered signals...")
-                result = extract_rems_from_edf(
-                    edf_path=edf_path, raw=raw, out_dir=REMS_DIR,
-                    lights_path=lights_path, gssc_df=gssc_df,
-                )
+                with _timed(timings, "rems"):
+                    result = extract_rems_from_edf(
+                        edf_path=edf_path, raw=raw, out_dir=REMS_DIR,
+                        lights_path=lights_path, gssc_df=gssc_df, dtype=dtype,
+                    )
                 if result is None:
                     print(f"    {RED}Skipping EEG — extract_rems returned None{RESET}")
                 else:
                     df, loc, roc, loc_clean, roc_clean = result
 
             if loc_clean is not None:
-                eeg_to_csv(edf_path=edf_path, loc=loc, roc=roc,
-                           loc_clean=loc_clean, roc_clean=roc_clean,
-                           out_dir=EEG_DIR, lights_path=lights_path)
+                with _timed(timings, "eeg"):
+                    eeg_to_csv(edf_path=edf_path, loc=loc, roc=roc,
+                               loc_clean=loc_clean, roc_clean=roc_clean,
+                               out_dir=EEG_DIR, lights_path=lights_path)
             else:
                 print(f"    {RED}EEG extraction skipped — no filtered signals{RESET}")
 
@@ -297,16 +351,23 @@ def process_patient(rec) -> bool:
         subepochs_file = EM_DIR / f"{session_id}_subepochs.csv"
         output_file    = MERGED_DIR / f"{session_id}_{edf_path.stem}_eog_merged.csv"
 
-        merge_all(eog_file=eog_file, gssc_file=gssc_file, events_file=events_file,
-                  em_file=em_file, output_file=output_file,
-                  subepochs_file=subepochs_file, eeg_file=eeg_file)
+        with _timed(timings, "merge"):
+            merge_all(eog_file=eog_file, gssc_file=gssc_file, events_file=events_file,
+                      em_file=em_file, output_file=output_file,
+                      subepochs_file=subepochs_file, eeg_file=eeg_file)
 
         # ── Cleanup ─────────────────────────────────────────────────
         print(f"\n{BOLD}[Cleanup] Compressing intermediate CSVs{RESET}")
-        _compress_intermediates(session_id, edf_path.stem)
+        with _timed(timings, "cleanup"):
+            _compress_intermediates(session_id, edf_path.stem)
 
         elapsed = time.perf_counter() - t0
         print(f"\n{GREEN}✓ {session_id} completed in {elapsed:.1f}s ({elapsed/60:.1f} min){RESET}")
+        if timings_db is not None:
+            try:
+                record_stage_timings(session_id, timings, db_path=timings_db)
+            except Exception as e:       # timings only feed the scheduler — never fail a session on them
+                print(f"    Could not record stage timings: {e}")
         return True
 
     except Exception as e:
@@ -315,28 +376,53 @@ def process_patient(rec) -> bool:
         traceback.print_exc()
         return False
 
+    finally:
+        clear_filter_cache()   # the filtered night shared by stages 2 and 5 is per session
+
 
 # =====================================================================
 # run_process
 # =====================================================================
-def run_process(raw_root: Path, batch_size: int) -> None:
-    """Process the next batch of unprocessed patients."""
+def run_process(raw_root: Path, batch_size: int, float32: bool = False,
+                gssc_threads: int | None = None, gssc_precision: str = "fp32", workers: int = 1) -> None:
+    """Process the next batch of unprocessed patients.
+
+    Sessions are dispatched longest-expected-first: the expected time comes from the EDF
+    header (session catalog) and the stage timings recorded for earlier sessions. With
+    ``workers > 1`` they run in a process pool, one session per worker at a time.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from preprocessing.scheduling import longest_first
+
     if not raw_root.is_dir():
         print(f"Error: '{raw_root}' is not a directory.")
         sys.exit(1)
 
-    sessions = index_sessions(raw_root)
+    # Catalog of EDF headers/lights per session — unusable nights are dropped up front and the
+    # longest expected ones go first, so a long recording does not end up as the tail of the batch
+    catalog = update_catalog(raw_root)
+    usable, unusable = usable_sessions(catalog)
+    ordered  = longest_first(usable, load_stage_timings())
+    sessions = catalog_records(ordered)
     todo = [s for s in sessions if not _is_processed(s.patient_id)]
     n_already = len(sessions) - len(todo)
 
     print(f"\n{'='*70}")
     print(f"    {BOLD}Pipeline Run{RESET}")
-    print(f"    Total sessions : {len(sessions)}")
+    print(f"    Total sessions : {len(catalog)}")
+    print(f"    Unusable       : {len(unusable)}")
     print(f"    Already done   : {n_already}")
     print(f"    Remaining      : {len(todo)}")
     print(f"    Batch size     : {batch_size}")
+    print(f"    Workers        : {workers}")
+    print(f"    Precision      : {'float32' if float32 else 'float64'}")
+    print(f"    GSSC threads   : {gssc_threads or 'torch default'}")
+    print(f"    GSSC precision : {gssc_precision}")
     print(f"{'='*70}")
 
+    for sid, why in unusable.items():
+        print(f"  {RED}[SKIP] {sid}: {why}{RESET}")
+
     if not todo:
         print(f"\n{GREEN}All patients already processed.{RESET}\n")
         return
@@ -345,14 +431,45 @@ def run_process(raw_root: Path, batch_size: int) -> None:
     ok = fail = 0
     failed_ids = []
 
-    for rec in todo:
-        if process_patient(rec):
-            ok += 1
-        else:
-            fail += 1
-            failed_ids.append(rec.patient_id)
-        if ok >= batch_size:
-            break
+    dtype  = np.float32 if float32 else None
+    kwargs = dict(dtype=dtype, gssc_threads=gssc_threads, gssc_precision=gssc_precision)
+    if workers <= 1:
+        for rec in todo:
+            if process_patient(rec, **kwargs):
+                ok += 1
+            else:
+                fail += 1
+                failed_ids.append(rec.patient_id)
+            if ok >= batch_size:
+                break
+    else:
+        # Keep `workers` sessions in flight; stop submitting once the batch can be filled
+        queue = iter(todo)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            def _submit_next() -> None:
+                rec = next(queue, None)
+                if rec is not None:
+                    running[pool.submit(process_patient, rec, **kwargs)] = rec
+
+            for _ in range(workers):
+                _submit_next()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    rec = running.pop(fut)
+                    try:
+                        success = fut.result()
+                    except Exception as e:      # worker died (e.g. out of memory)
+                        print(f"  {RED}[SKIP] {rec.patient_id}: {type(e).__name__}: {e}{RESET}")
+                        success = False
+                    if success:
+                        ok += 1
+                    else:
+                        fail += 1
+                        failed_ids.append(rec.patient_id)
+                    if ok + len(running) < batch_size:
+                        _submit_next()
 
     elapsed = time.perf_counter() - t_start
     remaining = len(todo) - ok - fail
@@ -376,6 +493,83 @@ def run_process(raw_root: Path, batch_size: int) -> None:
     print(f"{'='*70}")
 
 
+# =====================================================================
+# run_stage
+# =====================================================================
+def run_stage(
+        raw_root:         Path,
+        nights_per_batch: int = 8,
+        batch_epochs:     int = GSSC_BATCH_EPOCHS,
+        gssc_threads:     int | None = None,
+        gssc_precision:   str = "fp32",
+) -> None:
+    """Run GSSC staging (stage 2) for all sessions without a *_gssc.csv, several nights at a time.
+
+    ``process`` then skips stage 2 for these sessions because the CSVs already exist.
+    """
+    from preprocessing.GSSC_to_csv import GSSC_batch_to_csv
+
+    if not raw_root.is_dir():
+        print(f"Error: '{raw_root}' is not a directory.")
+        sys.exit(1)
+
+    usable, _ = usable_sessions(update_catalog(raw_root))
+    sessions = catalog_records(usable)
+    todo = [s for s in sessions if not _check_existing_outputs(s.patient_id, s.edf_path.stem)["gssc"]]
+
+    print(f"\n{'='*70}")
+    print(f"    {BOLD}GSSC Staging{RESET}")
+    print(f"    Total sessions   : {len(sessions)}")
+    print(f"    To stage         : {len(todo)}")
+    print(f"    Nights per batch : {nights_per_batch}")
+    print(f"    Epochs per pass  : {batch_epochs}")
+    print(f"    GSSC threads     : {gssc_threads or 'torch default'}")
+    print(f"    GSSC precision   : {gssc_precision}")
+    print(f"{'='*70}")
+
+    if not todo:
+        print(f"\n{GREEN}All sessions already staged.{RESET}\n")
+        return
+
+    t_start = time.perf_counter()
+    ok = 0
+    failed_ids = []
+
+    for i in range(0, len(todo), nights_per_batch):
+        group = todo[i:i + nights_per_batch]
+        try:
+            GSSC_batch_to_csv([(r.edf_path, r.txt_path) for r in group], out_dir=GSSC_DIR,
+                              batch_epochs=batch_epochs, n_threads=gssc_threads, precision=gssc_precision)
+            ok += len(group)
+            continue
+        except Exception as e:
+            print(f"\n  {RED}Batch failed ({type(e).__name__}: {e}) — staging its nights one at a time{RESET}")
+
+        # Isolate the failing night(s) so the rest of the batch is still staged
+        for rec in group:
+            try:
+                GSSC_batch_to_csv([(rec.edf_path, rec.txt_path)], out_dir=GSSC_DIR,
+                                  batch_epochs=batch_epochs, n_threads=gssc_threads, precision=gssc_precision)
+                ok += 1
+            except Exception as e:
+                print(f"  {RED}[SKIP] {rec.patient_id}: {type(e).__name__}: {e}{RESET}")
+                failed_ids.append(rec.patient_id)
+
+    elapsed = time.perf_counter() - t_start
+    print(f"\n{'='*70}")
+    print(f"    {BOLD}Staging Summary{RESET}")
+    print(f"    {GREEN}Staged : {ok}{RESET}")
+    print(f"    {RED}Failed : {len(failed_ids)}{RESET}")
+    print(f"    Time   : {elapsed:.1f}s ({elapsed / 60:.1f} min)")
+    if ok > 0:
+        print(f"    Avg/night: {elapsed / ok:.1f}s")
+    if failed_ids:
+        print(f"\n    {RED}Failed sessions:{RESET}")
+        for sid in failed_ids:
+            print(f"      - {sid}")
+    print(f"{'='*70}")
+
+
 # =====================================================================
 # run_extract
 # =====================================================================
@@ -383,8 +577,11 @@ def run_extract(
         patient_excel: Path,
         modules:       list[str] | None = None,
         force:         bool = False,
+        workers:       int = 1,
 ) -> None:
-    """Run feature extraction modules and merge into features.csv."""
+    """Run feature extraction modules and merge into features.csv (``workers`` subjects in parallel)."""
+    from analysis.feat_report import collect_features
+
     if not MERGED_DIR.is_dir():
         print(f"Error: '{MERGED_DIR}' is not a directory.")
         sys.exit(1)
@@ -397,6 +594,7 @@ def run_extract(
         force=force,
         patient_excel=patient_excel,
         output_csv=DEFAULT_FEATURE_CSV,
+        workers=workers,
     )
 
     if combined.empty:
@@ -411,7 +609,9 @@ def run_extract(
 # run_merge
 # =====================================================================
 def run_merge() -> None:
-    """Outer-join all per-module feature CSVs in features_csv/ into features.csv."""
+    """Combine all per-module feature CSVs in features_csv/ into features.csv (one subject × feature matrix)."""
+    from analysis.feat_report import merge_feature_csvs
+
     csv_files = sorted(FEATURES_DIR.glob("*_features.csv"))
     if not csv_files:
         print(f"Error: No per-module feature CSVs found in '{FEATURES_DIR}'. Run 'extract' first.")
@@ -436,6 +636,8 @@ def run_merge() -> None:
 # =====================================================================
 def run_report() -> None:
     """Generate HTML report from cached features.csv."""
+    from analysis.feat_report import generate_report
+
     if not DEFAULT_FEATURE_CSV.is_file():
         print(f"Error: '{DEFAULT_FEATURE_CSV}' not found. Run 'extract' first.")
         sys.exit(1)
@@ -459,9 +661,14 @@ def main():
 Examples:
   python main.py process /data/raw                            # process 10 patients
   python main.py process /data/raw --batch-size 5             # process 5
+  python main.py process /data/raw --float32                  # float32 detection path
+  python main.py process /data/raw --workers 4                # 4 sessions in parallel
+  python main.py stage /data/raw --nights-per-batch 16        # batched GSSC staging only
   python main.py extract patient_info.xlsx                    # all feature modules
   python main.py extract patient_info.xlsx --modules bout     # only bout
+  python main.py extract patient_info.xlsx --modules em_morphology --force  # recompute one feature group
   python main.py extract patient_info.xlsx --force            # re-extract from scratch
+  python main.py extract patient_info.xlsx --workers 4        # 4 subjects in parallel
   python main.py merge                                        # merge existing module CSVs
   python main.py report                                       # HTML report
   python main.py all /data/raw patient_info.xlsx              # full pipeline
@@ -475,18 +682,39 @@ Examples:
     p_proc = sub.add_parser("process", help="Run preprocessing stages 1-7.")
     p_proc.add_argument("raw_root", type=str, help="Root directory with raw EDF/TXT recordings")
     p_proc.add_argument("--batch-size", type=int, default=10, help="Patients per batch (default: 10)")
+    p_proc.add_argument("--float32", action="store_true",
+                        help="Run the detection path (stages 3, 5, 6) in float32 instead of float64")
+    p_proc.add_argument("--gssc-threads", type=int, default=None,
+                        help="Torch threads for GSSC staging (default: torch default)")
+    p_proc.add_argument("--gssc-precision", type=str, default="fp32", choices=GSSC_PRECISIONS,
+                        help="GSSC inference precision; check int8/bf16 with analysis.gssc_precision_report (default: fp32)")
+    p_proc.add_argument("--workers", type=int, default=1,
+                        help="Sessions processed in parallel, longest expected first (default: 1)")
+
+    # ---- stage ----
+    p_stage = sub.add_parser("stage", help="Batched GSSC sleep staging (stage 2) across many sessions.")
+    p_stage.add_argument("raw_root", type=str, help="Root directory with raw EDF/TXT recordings")
+    p_stage.add_argument("--nights-per-batch", type=int, default=8,
+                         help="Nights whose epochs are packed into one inference run (default: 8)")
+    p_stage.add_argument("--batch-epochs", type=int, default=GSSC_BATCH_EPOCHS,
+                         help=f"Epochs per signal-network forward pass (default: {GSSC_BATCH_EPOCHS})")
+    p_stage.add_argument("--gssc-threads", type=int, default=None,
+                         help="Torch threads for GSSC staging (default: torch default)")
+    p_stage.add_argument("--gssc-precision", type=str, default="fp32", choices=GSSC_PRECISIONS,
+                         help="GSSC inference precision; check int8/bf16 with analysis.gssc_precision_report (default: fp32)")
 
     # ---- extract ----
     p_ext = sub.add_parser("extract", help="Extract features into per-module CSVs, then merge.")
     p_ext.add_argument("patient_excel", type=str, help="Path to patient info Excel file")
-    p_ext.add_argument("--modules", type=str, nargs="*", default=None,
-                       choices=["eog", "gssc", "eeg", "bout", "patient", "extra", "all"],
-                       help="Which modules to run (default: all)")
+    p_ext.add_argument("--modules", type=str, nargs="*", default=None, choices=MODULE_CHOICES, metavar="NAME",
+                       help="Modules or single feature groups to run, e.g. eog em_morphology (default: all)")
     p_ext.add_argument("--force", action="store_true",
-                       help="Delete existing module CSVs before re-extracting")
+                       help="Clear cached features of the selected modules/groups before re-extracting")
+    p_ext.add_argument("--workers", type=int, default=1,
+                       help="Subjects extracted in parallel (default: 1)")
 
     # ---- merge ----
-    sub.add_parser("merge", help="Outer-join existing per-module feature CSVs into features.csv.")
+    sub.add_parser("merge", help="Combine existing per-module feature CSVs into features.csv.")
 
     # ---- report ----
     sub.add_parser("report", help="Generate HTML report from cached features.csv.")
@@ -496,11 +724,18 @@ Examples:
     p_all.add_argument("raw_root", type=str, help="Root directory with raw recordings")
     p_all.add_argument("patient_excel", type=str, help="Path to patient info Excel file")
     p_all.add_argument("--batch-size", type=int, default=10, help="Patients per batch (default: 10)")
-    p_all.add_argument("--modules", type=str, nargs="*", default=None,
-                       choices=["eog", "gssc", "eeg", "bout", "extra", "patient"],
-                       help="Which feature modules to run (default: all)")
+    p_all.add_argument("--float32", action="store_true",
+                       help="Run the detection path (stages 3, 5, 6) in float32 instead of float64")
+    p_all.add_argument("--gssc-threads", type=int, default=None,
+                       help="Torch threads for GSSC staging (default: torch default)")
+    p_all.add_argument("--gssc-precision", type=str, default="fp32", choices=GSSC_PRECISIONS,
+                       help="GSSC inference precision; check int8/bf16 with analysis.gssc_precision_report (default: fp32)")
+    p_all.add_argument("--workers", type=int, default=1,
+                       help="Sessions processed / subjects extracted in parallel (default: 1)")
+    p_all.add_argument("--modules", type=str, nargs="*", default=None, choices=MODULE_CHOICES, metavar="NAME",
+                       help="Feature modules or single feature groups to run (default: all)")
     p_all.add_argument("--force", action="store_true",
-                       help="Delete existing module CSVs before re-extracting")
+                       help="Clear cached features of the selected modules/groups before re-extracting")
 
     # ---- cleanup ----
     p_clean = sub.add_parser("cleanup", help="Compress intermediate CSVs to free disk space.")
@@ -508,7 +743,7 @@ Examples:
 
     # ---- Back-compat: `python main.py /data/raw` → process ----
     argv = sys.argv[1:]
-    known_modes = {"process", "extract", "merge", "report", "all", "cleanup", "-h", "--help"}
+    known_modes = {"process", "stage", "extract", "merge", "report", "all", "cleanup", "-h", "--help"}
     if argv and argv[0] not in known_modes:
         argv = ["process"] + argv
 
@@ -520,10 +755,18 @@ Examples:
 
     # ---- Dispatch ----
     if args.mode == "process":
-        run_process(Path(args.raw_root), args.batch_size)
+        run_process(Path(args.raw_root), args.batch_size, float32=args.float32,
+                    gssc_threads=args.gssc_threads, gssc_precision=args.gssc_precision,
+                    workers=args.workers)
+
+    elif args.mode == "stage":
+        run_stage(Path(args.raw_root), nights_per_batch=args.nights_per_batch,
+                  batch_epochs=args.batch_epochs, gssc_threads=args.gssc_threads,
+                  gssc_precision=args.gssc_precision)
 
     elif args.mode == "extract":
-        run_extract(Path(args.patient_excel), modules=args.modules, force=args.force)
+        run_extract(Path(args.patient_excel), modules=args.modules, force=args.force,
+                    workers=args.workers)
 
     elif args.mode == "merge":
         run_merge()
@@ -532,8 +775,11 @@ Examples:
         run_report()
 
     elif args.mode == "all":
-        run_process(Path(args.raw_root), args.batch_size)
-        run_extract(Path(args.patient_excel), modules=args.modules, force=args.force)
+        run_process(Path(args.raw_root), args.batch_size, float32=args.float32,
+                    gssc_threads=args.gssc_threads, gssc_precision=args.gssc_precision,
+                    workers=args.workers)
+        run_extract(Path(args.patient_excel), modules=args.modules, force=args.force,
+                    workers=args.workers)
         run_report()
 
     elif args.mode == "cleanup":
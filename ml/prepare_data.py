@@ -88,14 +88,14 @@ def load_features(feature_csv: str | Path) -> pd.DataFrame:
     Parameters
     ----------
     feature_csv : str | Path
-        Path to features.csv produced by the extraction pipeline.
+        Path to features.csv (or features.parquet) produced by the extraction pipeline.
 
     Returns
     -------
     pd.DataFrame
         Full feature DataFrame with a 'group' column added.
     """
-    df = pd.read_csv(feature_csv)
+    df = pd.read_parquet(feature_csv) if str(feature_csv).endswith(".parquet") else pd.read_csv(feature_csv)
     if "group" not in df.columns:
         df["group"] = _assign_group(df)
     print(f"Loaded {len(df)} subjects, {len(_get_feature_cols(df))} features")
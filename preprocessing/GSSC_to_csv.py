@@ -9,35 +9,135 @@
 # Imports
 # =====================================================================
 from __future__ import annotations
+import contextlib
+import os
+import warnings
 from pathlib import Path
 import mne
+import numpy as np
 import pandas as pd
 import torch
 import gssc.networks
 torch.serialization.add_safe_globals([gssc.networks.ResSleep])
 from gssc.infer import EEGInfer
+from gssc.utils import prepare_inst, epo_arr_zscore
 
 from preprocessing.index_file import parse_lights_txt
 from preprocessing.channel_standardization import build_rename_map
+from preprocessing.edf_reader import read_raw_eog
+from preprocessing.filtering import filtered_eog
 
 # – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
 # Paths
 # – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
 GSSC_DIR = Path("gssc_csv")
-GSSC_DIR.mkdir(parents=True, exist_ok=True)
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Inference engine
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+SIG_LEN = 2560                              # GSSC epoch length in samples (30 s @ 85.33 Hz)
+
+# One EEGInfer per (process, use_cuda, precision). Keyed on the pid so a worker forked
+# after the parent built an engine loads its own copy instead of sharing torch state.
+_ENGINES: dict[tuple[int, bool, str], EEGInfer] = {}
+
+# Inference precision modes (opt-in, CPU):
+#   fp32 : the original networks
+#   int8 : dynamic int8 quantization of Linear/GRU layers. The ResSleep signal network is
+#          convolution-only, so in practice this quantizes the context GRU and its output layer.
+#   bf16 : bfloat16 autocast around both networks (fast on CPUs with AVX512-BF16/AMX)
+PRECISIONS = ("fp32", "int8", "bf16")
+
+EOG_CHANS   = ["LOC", "ROC"]
+STAGE_NAMES = {0: "W", 1: "N1", 2: "N2", 3: "N3", 4: "REM"}
+PROB_COLS   = ["prob_w", "prob_n1", "prob_n2", "prob_n3", "prob_rem"]
+BATCH_EPOCHS = 4096                         # epochs per signal-network forward pass in GSSC_batch_to_csv
 
 
 # =====================================================================
-# Function
+# Functions
 # =====================================================================
+def get_gssc_engine(
+        use_cuda:  bool = False,
+        n_threads: int | None = None,
+        warm_up:   bool = True,
+        precision: str = "fp32",
+        ) -> EEGInfer:
+    """
+    Return this process's GSSC inference engine, creating it on first use. \\
+    The network weights are loaded once per process and reused for every session.
+
+    Parameters
+    ----------
+    use_cuda : bool
+        Passed to ``EEGInfer``. Default is **False**.
+    n_threads : int | None
+        If given, ``torch.set_num_threads(n_threads)`` is applied (also on later calls). \\
+        Set this to ``cores // workers`` when several worker processes stage in parallel. \\
+        Default is **None** (leave torch's default).
+    warm_up : bool
+        If True, run one dummy batch through the networks when the engine is created so
+        the first real session does not pay the one-off allocation cost. Default is **True**.
+    precision : str
+        One of ``PRECISIONS``. ``"int8"`` returns a dynamically quantized copy of the networks;
+        ``"bf16"`` returns fp32 networks meant to be run under :func:`precision_context`. \\
+        Default is **"fp32"**.
+
+    Returns
+    -------
+    EEGInfer
+        The cached engine (networks in eval mode).
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}. Got: {precision!r}")
+    if n_threads is not None:
+        torch.set_num_threads(max(1, int(n_threads)))
+
+    key = (os.getpid(), use_cuda, precision)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        engine = EEGInfer(use_cuda=use_cuda)
+        if precision == "int8":
+            if engine.use_cuda:
+                raise ValueError("int8 dynamic quantization is CPU-only; use use_cuda=False.")
+            layers = {torch.nn.Linear, torch.nn.GRU}
+            engine.net     = torch.ao.quantization.quantize_dynamic(engine.net, layers, dtype=torch.qint8)
+            engine.con_net = torch.ao.quantization.quantize_dynamic(engine.con_net, layers, dtype=torch.qint8)
+        if warm_up:
+            _warm_up(engine, precision)
+        _ENGINES[key] = engine
+        print(f" GSSC engine ready (pid {key[0]}, {precision}, torch threads: {torch.get_num_threads()})")
+    return engine
+
+
+def precision_context(precision: str = "fp32", use_cuda: bool = False):
+    """Context manager to run GSSC inference under: bf16 autocast for ``"bf16"``, a no-op otherwise."""
+    if precision != "bf16":
+        return contextlib.nullcontext()
+    if not use_cuda and not torch.cpu._is_avx512_bf16_supported():
+        warnings.warn("bf16 requested but this CPU has no native bfloat16 support — "
+                      "autocast will run, but is likely slower than fp32.")
+    return torch.autocast("cuda" if use_cuda else "cpu", dtype=torch.bfloat16)
+
+
+def _warm_up(engine: EEGInfer, precision: str = "fp32", n_epochs: int = 4) -> None:
+    """Run a dummy EOG-only batch through the signal and context networks."""
+    device = "cuda" if engine.use_cuda else "cpu"
+    with torch.no_grad(), precision_context(precision, engine.use_cuda):
+        x      = {"eog": torch.zeros(n_epochs, 1, SIG_LEN, device=device)}
+        reps   = engine.net(x, rep_output="rep_only").swapaxes(-1, 1)
+        hidden = torch.zeros(10, 1, 256, device=device)
+        engine.con_net(reps, hidden)
+
 
-# GSSC test function
 def GSSC_to_csv(
         edf_path:    str | Path, 
         raw:         mne.io.Raw | None = None,
         pre_load:    bool = False,
         out_dir:     Path = GSSC_DIR,
-        lights_path: Path | None = None
+        lights_path: Path | None = None,
+        n_threads:   int | None = None,
+        precision:   str = "fp32",
         ) -> pd.DataFrame:
     """
     Load one EDF file, run GSSC inference, and save the result as CSV. \\
@@ -60,6 +160,11 @@ def GSSC_to_csv(
         The directory where the output CSV file will be saved.
     lights_path : Path | None
         Optional path to lights.txt file. If provided, the CSV is trimmed to the sleep period.
+    n_threads : int | None
+        Torch intra-op threads, see :func:`get_gssc_engine`. Default is **None**.
+    precision : str
+        Inference precision, one of ``PRECISIONS``. Check the agreement with fp32 on a sample of
+        sessions first (``python -m analysis.gssc_precision_report``). Default is **"fp32"**.
     
     Returns
     -------
@@ -75,6 +180,137 @@ def GSSC_to_csv(
     
     print(f"\nProcessing: {edf_path}")
 
+    # --- 1-5) Load, pick LOC/ROC and filter ---
+    raw = _load_eog_raw(edf_path, raw=raw, pre_load=pre_load)
+
+    # --- 6) Run inference ---
+    infer = get_gssc_engine(use_cuda=False, n_threads=n_threads, precision=precision)
+    with precision_context(precision, infer.use_cuda):
+        stages, times, probs = infer.mne_infer(inst=raw, eeg=[], eog=EOG_CHANS, eog_drop=False, filter=False)
+    
+    df = _stage_frame(times, stages, probs)
+
+    # --- 7-8) Trim to lights-off/lights-on window and save ---
+    df = _save_stages(df, session_id, out_dir, lights_path)
+
+    # Return the trimmed dataframe so callers (e.g. extract_rems_from_edf)
+    # can reuse it directly, so there is no need to run GSSC a second time.
+    return df
+
+
+def GSSC_batch_to_csv(
+        sessions:     list[tuple[Path, Path | None]],
+        out_dir:      Path = GSSC_DIR,
+        batch_epochs: int = BATCH_EPOCHS,
+        n_threads:    int | None = None,
+        precision:    str = "fp32",
+        ) -> dict[str, pd.DataFrame]:
+    """
+    Run GSSC staging on several sessions at once and save one ``{session_id}_gssc.csv`` per session. \\
+    The 30 s epochs of all nights (LOC and ROC) are packed into large batches for the per-epoch signal
+    network, and the representations are scattered back per night for the context GRU, which is
+    sequence-dependent and therefore still runs one night at a time.
+
+    Parameters
+    ----------
+    sessions : list[tuple[Path, Path | None]]
+        ``(edf_path, lights_path)`` per session. The session id is the EDF's parent folder name.
+    out_dir : Path
+        The directory where the output CSV files will be saved.
+    batch_epochs : int
+        Maximum number of epochs per signal-network forward pass. Default is **4096**.
+    n_threads : int | None
+        Torch intra-op threads, see :func:`get_gssc_engine`. Default is **None**.
+    precision : str
+        Inference precision, one of ``PRECISIONS``. Default is **"fp32"**.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        The trimmed staging dataframe per session id.
+    """
+    infer = get_gssc_engine(use_cuda=False, n_threads=n_threads, precision=precision)
+
+    # --- 1) Prepare every night: (n_epochs, 2, SIG_LEN) z-scored LOC/ROC ---
+    prepared = []
+    for edf_path, lights_path in sessions:
+        edf_path = Path(edf_path)
+        if not edf_path.exists():
+            raise FileNotFoundError(f"EDF file not found: {edf_path}")
+        print(f"\nPreparing: {edf_path}")
+        # Decode only LOC/ROC at their native rate (see preprocessing.edf_reader)
+        x, start_time = _session_epochs(infer, _load_eog_raw(edf_path, raw=read_raw_eog(edf_path)))
+        prepared.append((edf_path.parent.name, lights_path, x, start_time))
+
+    # --- 2) Batched inference ---
+    outputs = infer_nights(infer, [x for _, _, x, _ in prepared], batch_epochs, precision)
+
+    # --- 3) Save per night ---
+    results = {}
+    for (session_id, lights_path, _, start_time), (stages, probs) in zip(prepared, outputs):
+        times = start_time + 30.0 * np.arange(len(stages))
+        df = _stage_frame(times, stages, probs)
+        results[session_id] = _save_stages(df, session_id, out_dir, lights_path)
+
+    return results
+
+
+def infer_nights(
+        infer:        EEGInfer,
+        nights:       list[torch.Tensor],
+        batch_epochs: int = BATCH_EPOCHS,
+        precision:    str = "fp32",
+        ) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Stage prepared nights (``(n_epochs, 2, SIG_LEN)`` tensors from :func:`_session_epochs`). \\
+    Epochs of all nights and both channels are packed for the signal network; the context GRU
+    runs per night and channel, and the most confident channel wins per epoch.
+
+    Returns
+    -------
+    list[tuple[np.ndarray, np.ndarray]]
+        ``(stages, probs)`` per night — integer stages and ``(n_epochs, 5)`` probabilities.
+    """
+    device = "cuda" if infer.use_cuda else "cpu"
+
+    # --- Signal network on all (night, channel) blocks packed together ---
+    blocks = [x[:, c:c + 1, :] for x in nights for c in range(len(EOG_CHANS))]
+    packed = torch.cat(blocks)
+    n_total = len(packed)
+    print(f"\nGSSC: {len(nights)} nights, {n_total} epoch-channels in batches of {batch_epochs} ({precision})")
+
+    reps = []
+    with torch.no_grad(), precision_context(precision, infer.use_cuda):
+        for i in range(0, n_total, batch_epochs):
+            chunk = packed[i:i + batch_epochs].to(device)
+            reps.append(infer.net({"eog": chunk}, rep_output="rep_only"))
+    reps = torch.cat(reps)
+    del packed
+
+    # --- Scatter back: context GRU per night and channel, loudest vote across channels ---
+    rep_blocks = iter(torch.split(reps, [len(b) for b in blocks]))
+    outputs = []
+    for _ in nights:
+        logits = []
+        with torch.no_grad(), precision_context(precision, infer.use_cuda):
+            for _ in EOG_CHANS:
+                hidden = torch.zeros(10, 1, 256, device=device)
+                y, _ = infer.con_net(next(rep_blocks).swapaxes(-1, 1), hidden)
+                logits.append(y[:, 0, ].float().cpu().numpy())
+        outputs.append(_loudest_vote(np.array(logits)))
+
+    return outputs
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Helpers
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+def _load_eog_raw(edf_path: Path, raw: mne.io.Raw | None = None, pre_load: bool = False) -> mne.io.Raw:
+    """
+    Load the EDF (or use ``raw``) and return LOC/ROC as EOG channels band-passed 0.1–30 Hz.
+
+    The filtered night comes from the per-session cache in ``filtering.py``, so EM detection
+    on the same night reuses it. It is shared: do not modify the returned Raw in place.
+    """
     # --- 1) Load EDF ---
     if raw is None:
         raw = mne.io.read_raw_edf(edf_path, preload=pre_load, verbose=False)
@@ -87,46 +323,49 @@ def GSSC_to_csv(
 
         if rename_map:
             raw.rename_channels(rename_map)
-    else:
-        raw = raw.copy()
 
-    # --- 2) Pick channels ---
-    picks = ["LOC", "ROC"]
-    missing = [ch for ch in picks if ch not in raw.ch_names]
+    # --- 2) Check channels ---
+    missing = [ch for ch in EOG_CHANS if ch not in raw.ch_names]
     if missing:
         raise ValueError(f"Missing expected channels: {missing}. Available: {raw.ch_names}")
 
-    raw.pick(picks)
+    # --- 3) Pick, set as EOG (helps GSSC choose), load and filter 0.1–30 Hz — once per session ---
+    return filtered_eog(raw, session_key=edf_path, channels=tuple(EOG_CHANS))
 
-    # --- 3) Set channel types (Helps GSSC choose) ---
-    raw.set_channel_types({"ROC": "eog", "LOC": "eog"})
 
-    # --- 4) Load data (Required for GSSC) ---
-    raw.load_data()
+def _session_epochs(infer: EEGInfer, raw: mne.io.Raw) -> tuple[torch.Tensor, float]:
+    """Epoch, resample and z-score one night the same way ``EEGInfer.mne_infer`` does."""
+    epo, start_time = prepare_inst(raw, infer.sig_len, infer.cut)
+    data = epo_arr_zscore(epo.get_data(picks=EOG_CHANS) * 1e+6)
+    return torch.tensor(data[..., :infer.sig_len], dtype=torch.float32), float(start_time)
 
-    # --- 5) Filter signal manually ---
-    raw.filter(0.1,30, picks = picks) 
 
-    # --- 6) Run inference ---
-    infer = EEGInfer(use_cuda = False)
-    stages, times, probs = infer.mne_infer(inst=raw, eeg=[], eog=["LOC", "ROC"], eog_drop=False, filter=False)
-    
+def _loudest_vote(logits: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Per epoch, keep the channel whose log-probabilities are most confident (lowest NLL of its own
+    argmax, as ``gssc.utils.loudest_vote``) and return its stages and probabilities.
+    """
+    best   = np.argmax(logits.max(axis=-1), axis=0)
+    chosen = logits[best, np.arange(logits.shape[1])]
+    return chosen.argmax(axis=-1), np.exp(chosen)
+
+
+def _stage_frame(times, stages, probs) -> pd.DataFrame:
+    """Build the per-epoch staging dataframe with string stage labels."""
     df = pd.DataFrame(data={
         "epoch_start": times, 
         "stage": stages,
         })
     
     # Add probalities to dataframe and rename stages to string
-    df[["prob_w", "prob_n1", "prob_n2", "prob_n3", "prob_rem"]] = probs
+    df[PROB_COLS] = probs
 
-    df["stage"] = df["stage"].map({
-        0: "W",
-        1: "N1",
-        2: "N2",
-        3: "N3",
-        4: "REM",
-    })
+    df["stage"] = df["stage"].map(STAGE_NAMES)
+    return df
 
+
+def _save_stages(df: pd.DataFrame, session_id: str, out_dir: Path, lights_path: Path | None) -> pd.DataFrame:
+    """Trim to the lights-off/lights-on window (if available) and save ``{session_id}_gssc.csv``."""
     # --- 7) Trim to lights-off/lights-on window
     if lights_path is not None:
         result = parse_lights_txt(lights_path)
@@ -138,11 +377,9 @@ def GSSC_to_csv(
             print(f"    Lights times unavailable — using full recording.")
 
     # --- 8) Save as CSV ---
+    out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{session_id}_gssc.csv"
     df.to_csv(out_path, index=False)
 
     print(f"Saved: {out_path}") 
-
-    # Return the trimmed dataframe so callers (e.g. extract_rems_from_edf)
-    # can reuse it directly, so there is no need to run GSSC a second time.
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,230 @@
+# Filename: edf_reader.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Channel-selective EDF reader. Parses the EDF header, resolves LOC/ROC through
+#              build_rename_map, and decodes only those two signals from the data records at
+#              their native sampling rate (MNE's reader upsamples every channel to the highest
+#              sfreq in the file and decodes all of them on load_data()).
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from preprocessing.channel_standardization import build_rename_map
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Data container
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+@dataclass(frozen=True)
+class EdfHeader:
+    """
+    Fields of an EDF/EDF+ header needed to locate and scale the signals.
+
+    Attributes
+    ----------
+    path : Path
+        Path to the EDF file.
+    start : datetime | None
+        Recording start (UTC-naive, as written in the header). None if unparsable.
+    header_bytes : int
+        Size of the header; the data records start at this offset.
+    n_records : int
+        Number of complete data records in the file.
+    record_duration : float
+        Duration of one data record in seconds.
+    labels : list[str]
+        Signal labels (stripped).
+    units : list[str]
+        Physical dimension per signal (e.g. "uV").
+    phys_min, phys_max, dig_min, dig_max : np.ndarray
+        Calibration per signal.
+    samples_per_record : np.ndarray
+        Number of samples per data record per signal.
+    """
+    path:               Path
+    start:              datetime | None
+    header_bytes:       int
+    n_records:          int
+    record_duration:    float
+    labels:             list[str]
+    units:              list[str]
+    phys_min:           np.ndarray
+    phys_max:           np.ndarray
+    dig_min:            np.ndarray
+    dig_max:            np.ndarray
+    samples_per_record: np.ndarray
+
+    @property
+    def sfreqs(self) -> np.ndarray:
+        """Sampling frequency per signal in Hz."""
+        return self.samples_per_record / self.record_duration
+
+    @property
+    def duration(self) -> float:
+        """Recording duration in seconds."""
+        return self.n_records * self.record_duration
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+EOG_CHANNELS = ("LOC", "ROC")
+
+# Physical dimension -> scale to volts (same convention as MNE)
+UNIT_TO_VOLT = {"V": 1.0, "MV": 1e-3, "UV": 1e-6, "µV": 1e-6, "μV": 1e-6, "NV": 1e-9}
+
+# Two-digit start years from this one are 19xx, below it 20xx (EDF spec; strptime's %y pivots at 69)
+EDF_YEAR_PIVOT = 85
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Parse the header
+# 1 —————————————————————————————————————————————————————————————————————
+def read_edf_header(edf_path: str | Path) -> EdfHeader:
+    """
+    Parse the fixed and per-signal parts of an EDF header without touching the data records.
+
+    The number of data records is taken from the file size when the header says -1
+    or when the last record is incomplete. Two-digit start years 85-99 are read as
+    19xx and 00-84 as 20xx, as the EDF specification defines.
+    """
+    edf_path = Path(edf_path)
+    with open(edf_path, "rb") as f:
+        fixed = f.read(256)
+        if len(fixed) < 256:
+            raise ValueError(f"Not an EDF file (header too short): {edf_path}")
+        ns = int(fixed[252:256].decode("ascii").strip())
+        sig = f.read(256 * ns)
+
+    def _field(offset: int, width: int) -> list[str]:
+        start = offset * ns
+        return [sig[start + i * width:start + (i + 1) * width].decode("latin-1").strip() for i in range(ns)]
+
+    labels    = _field(0, 16)
+    units     = _field(16 + 80, 8)
+    phys_min  = np.array(_field(16 + 80 + 8, 8), dtype=float)
+    phys_max  = np.array(_field(16 + 80 + 16, 8), dtype=float)
+    dig_min   = np.array(_field(16 + 80 + 24, 8), dtype=float)
+    dig_max   = np.array(_field(16 + 80 + 32, 8), dtype=float)
+    spr       = np.array(_field(16 + 80 + 40 + 80, 8), dtype=int)
+
+    header_bytes    = int(fixed[184:192].decode("ascii").strip())
+    record_duration = float(fixed[244:252].decode("ascii").strip())
+    n_records       = int(fixed[236:244].decode("ascii").strip())
+
+    record_bytes = 2 * int(spr.sum())
+    n_on_disk = (edf_path.stat().st_size - header_bytes) // record_bytes
+    if n_records < 0 or n_records > n_on_disk:
+        n_records = int(n_on_disk)
+
+    try:
+        start = datetime.strptime(fixed[168:184].decode("ascii"), "%d.%m.%y%H.%M.%S")
+        yy    = start.year % 100
+        start = start.replace(year=yy + (1900 if yy >= EDF_YEAR_PIVOT else 2000))
+    except ValueError:
+        start = None
+
+    return EdfHeader(
+        path=edf_path, start=start, header_bytes=header_bytes, n_records=n_records,
+        record_duration=record_duration, labels=labels, units=units,
+        phys_min=phys_min, phys_max=phys_max, dig_min=dig_min, dig_max=dig_max,
+        samples_per_record=spr,
+    )
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Decode selected signals
+# 2 —————————————————————————————————————————————————————————————————————
+def read_edf_signals(
+        edf_path: str | Path,
+        channels: tuple[str, ...] = EOG_CHANNELS,
+        header:   EdfHeader | None = None,
+        ) -> tuple[dict[str, np.ndarray], dict[str, float], EdfHeader]:
+    """
+    Decode only ``channels`` from the EDF data records, in volts at their native sampling rate.
+
+    Channel names are canonical (after ``build_rename_map``), so "LOC"/"ROC" resolve to
+    e.g. "EOG V"/"EOG H" in DCSM files. The data records are memory-mapped; only the
+    samples of the requested signals are scaled and copied into contiguous arrays.
+
+    Parameters
+    ----------
+    edf_path : str | Path
+        The path to the EDF file.
+    channels : tuple[str, ...]
+        Canonical channel names to decode. Default is **("LOC", "ROC")**.
+    header : EdfHeader | None
+        Pre-parsed header. Default is **None** (parse it here).
+
+    Returns
+    -------
+    signals : dict[str, np.ndarray]
+        float64 signal in volts per requested channel.
+    sfreqs : dict[str, float]
+        Native sampling frequency per requested channel in Hz.
+    header : EdfHeader
+        The parsed header.
+    """
+    header = header or read_edf_header(edf_path)
+
+    rename_map = build_rename_map(header.labels)
+    canonical  = [rename_map.get(lab, lab) for lab in header.labels]
+    missing = [ch for ch in channels if ch not in canonical]
+    if missing:
+        raise ValueError(f"Missing expected channels: {missing}. Available: {header.labels}")
+
+    spr     = header.samples_per_record
+    offsets = np.concatenate([[0], np.cumsum(spr)])
+    records = np.memmap(header.path, dtype="<i2", mode="r", offset=header.header_bytes,
+                        shape=(header.n_records, int(offsets[-1])))
+
+    signals, sfreqs = {}, {}
+    for ch in channels:
+        i = canonical.index(ch)
+        gain   = (header.phys_max[i] - header.phys_min[i]) / (header.dig_max[i] - header.dig_min[i])
+        offset = header.phys_min[i] - gain * header.dig_min[i]
+        scale  = UNIT_TO_VOLT.get(header.units[i].upper(), UNIT_TO_VOLT.get(header.units[i], 1.0))
+
+        digital = records[:, offsets[i]:offsets[i + 1]].reshape(-1)   # copies just this signal
+        signals[ch] = (digital * (gain * scale) + offset * scale).astype(np.float64, copy=False)
+        sfreqs[ch]  = float(header.sfreqs[i])
+
+    del records
+    return signals, sfreqs, header
+
+
+# 3 —————————————————————————————————————————————————————————————————————
+# 3 MNE Raw with only the EOG channels
+# 3 —————————————————————————————————————————————————————————————————————
+def read_raw_eog(edf_path: str | Path, channels: tuple[str, ...] = EOG_CHANNELS):
+    """
+    Build an ``mne.io.RawArray`` holding only ``channels`` (canonical names, type EOG) at their
+    native sampling rate — a drop-in for ``read_raw_edf`` + ``rename_channels`` in the stages,
+    which only ever pick LOC/ROC.
+
+    The channels must share one sampling rate (true for EOG pairs in practice); otherwise
+    a ValueError is raised so the caller can fall back to ``mne.io.read_raw_edf``.
+    """
+    import mne
+
+    signals, sfreqs, header = read_edf_signals(edf_path, channels)
+    rates = set(sfreqs.values())
+    if len(rates) != 1:
+        raise ValueError(f"Channels {channels} have different sampling rates: {sfreqs}")
+
+    info = mne.create_info(list(channels), sfreq=rates.pop(), ch_types="eog")
+    raw  = mne.io.RawArray(np.vstack([signals[ch] for ch in channels]), info, verbose=False)
+    if header.start is not None:
+        raw.set_meas_date(header.start.replace(tzinfo=timezone.utc))
+    return raw
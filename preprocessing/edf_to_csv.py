@@ -17,18 +17,19 @@ import mne
 
 from preprocessing.index_file import index_sessions, parse_lights_txt
 from preprocessing.channel_standardization import build_rename_map
+from preprocessing.remove_artefacts import mask_signals
+from preprocessing.resample import resample_raw
 
 # – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
 # Constants
 # – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
 RAW_ROOT = Path("L:/Auditdata/RBD PD/PD-RBD Glostrup Database_ok")
 OUT_DIR = Path("eog_csv")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # Target sampling frequency for all saved EOG CSVs.
 # MNE upsamples all channels to the highest sfreq found in the EDF,
 # so files with mixed-rate channels (e.g. 1000 Hz) must be resampled
-# down to a consistent rate before saving.
+# down to a consistent rate before saving (polyphase, see resample.py).
 FS_TARGET = 250  # Hz
 
 # =====================================================================
@@ -108,7 +109,7 @@ def edf_to_csv(
         raw.load_data()
     if sf != fs_target:
         print(f"\nResampling from {sf} [Hz] to {fs_target} [Hz].")
-        raw = raw.resample(fs_target)
+        raw = resample_raw(raw, fs_target)
 
     # --- 5) Extract data for LOC and ROC channels ---
     loc = raw.get_data(picks=["LOC"])[0] * 1e6 # Convert V to µV
@@ -121,10 +122,7 @@ def edf_to_csv(
     n_masked = int(artefact_mask.sum())
     n_total  = len(loc)
 
-    loc = loc.astype(float)
-    roc = roc.astype(float)
-    loc[artefact_mask] = np.nan
-    roc[artefact_mask] = np.nan
+    loc, roc = mask_signals(artefact_mask, loc, roc)  # no copy when nothing is masked
 
     print(f"    Artefact samples masked: {n_masked:,} / {n_total:,} "
           f"({n_masked / n_total:.2%}) — threshold: {ARTEFACT_THRESH_UV:.0f} µV")
@@ -167,6 +165,7 @@ def edf_to_csv(
 
     # --- 8) Save to CSV ---
     patient_id = edf_path.parent.name
+    out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{patient_id}_{edf_path.stem}_eog.csv"
 
     df.to_csv(out_path, index=False)
@@ -12,13 +12,12 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 
-from Tests.test_eeg_signals_from_eog import eeg_signals_from_eog
+from analysis.eeg_from_eog import eeg_signals_from_eog
 
 # =====================================================================
 # Constants
 # =====================================================================
 EEG_DIR = Path("extracted_eeg")
-EEG_DIR.mkdir(parents=True, exist_ok=True)
 
 # =====================================================================
 # Function
@@ -100,7 +99,8 @@ def eeg_to_csv(
 
     # --- 2) Extract EEG signals ---
     def _interp_nans(arr: np.ndarray) -> np.ndarray:
-        arr = arr.copy().astype(float)
+        # Keep float32 signals in float32 — only non-float inputs are promoted
+        arr = arr.astype(arr.dtype if np.issubdtype(arr.dtype, np.floating) else float)
         nans = np.isnan(arr)
         if nans.any():
             idx = np.arange(len(arr))
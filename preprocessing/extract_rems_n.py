@@ -16,19 +16,17 @@ import os
 import pandas as pd
 from pathlib import Path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from gssc.infer import EEGInfer
 
 from preprocessing.channel_standardization import build_rename_map
 from preprocessing.index_file import parse_lights_txt
 from extract_rems import detect_rem_jaec
-from preprocessing.GSSC_to_csv import GSSC_to_csv
 from preprocessing.remove_artefacts import remove_artefacts
+from preprocessing.resample import resample_raw
 
 # =====================================================================
 # Constants
 # =====================================================================
 EXTRACT_REMS_DIR = Path("extracted_rems")
-EXTRACT_REMS_DIR.mkdir(parents=True, exist_ok=True)
 
 # =====================================================================
 # Function
@@ -40,6 +38,7 @@ def extract_rems_from_edf(
         out_dir:     Path = EXTRACT_REMS_DIR,
         lights_path: Path | None = None,
         gssc_df:     pd.DataFrame | None = None,
+        dtype:       type | None = None,
         ) -> pd.DataFrame | None:
     """
     Load one EDF file, rename EOG channels to canonical names, run GSSC sleep staging using EOG channels, detect REM events, and save the extracted REM events as a CSV file.\\
@@ -65,6 +64,10 @@ def extract_rems_from_edf(
     gssc_df : Path | None
         Pre-computed GSSC staging dataframe (output of GSSC_to_csv).
         Pass this in to avoid running GSSC a second time.
+    dtype : type | None
+        Working precision of the detection path, e.g. ``np.float32``. \\
+        Applies to the returned signals and the DTCWT coefficients inside ``detect_rem_jaec``. \\
+        Default is **None** (float64, as returned by MNE).
 
     Returns
     -------
@@ -130,6 +133,7 @@ def extract_rems_from_edf(
 
     # --- 6) GSSC staging EOG only ---
     if gssc_df is None:
+        from preprocessing.GSSC_to_csv import GSSC_to_csv   # torch/GSSC only when staging is needed
         gssc_df = GSSC_to_csv(edf_path, lights_path=lights_path)
     stage_map = {"W": 0, "N1": 1, "N2": 2, "N3": 3, "REM": 4}
     hypno_int = gssc_df["stage"].map(stage_map).fillna(0).astype(int).values
@@ -143,10 +147,13 @@ def extract_rems_from_edf(
     sf = raw.info["sfreq"]
     if sf != 128:
         print(f"\nResampling from {sf} [Hz] to 128 [Hz]")
-        raw = raw.copy().resample(128)
+        raw = resample_raw(raw, 128)
         sf = 128
     loc = raw.get_data(picks=["LOC"])[0] * 1e6 # V to uV
     roc = raw.get_data(picks=["ROC"])[0] * 1e6
+    if dtype is not None:
+        loc = loc.astype(dtype, copy=False)
+        roc = roc.astype(dtype, copy=False)
 
     print(f"    Signal length: {len(loc)} samples at {sf} [Hz] = {len(loc)/sf:.1f} [s]")
     print(f"    hypno_int epochs: {len(hypno_int)} epochs = {len(hypno_int) * 30:.1f} [s]")
@@ -176,7 +183,7 @@ def extract_rems_from_edf(
 
 
     # --- 10) Rem detection ---
-    result = detect_rem_jaec(loc, roc, hypno_up, method = 'ssc_threshold')
+    result = detect_rem_jaec(loc, roc, hypno_up, method = 'ssc_threshold', dtype = dtype)
 
     # --- 11) Extract cleaned signals before artefact detection ---
     loc_clean = result._data_filt[0]
@@ -209,6 +216,7 @@ def extract_rems_from_edf(
             if col in df.columns:
                 df[col] = df[col] + lights_off
 
+    out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{session_id}_extracted_rems.csv"
     df.to_csv(out_path, index=False)
 
@@ -0,0 +1,141 @@
+# Filename: filtering.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Zero-phase 0.1–30 Hz EOG band-pass shared by the stages. The SOS design is cached
+#              per (band, sfreq, order) and the filtered LOC/ROC night is cached per session and
+#              sampling rate, so GSSC staging and EM detection filter each night once instead of
+#              each running its own FIR over the whole recording.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+EOG_BAND     = (0.1, 30.0)   # Hz
+FILTER_ORDER = 6             # Butterworth order per direction (sosfiltfilt doubles it)
+
+# Filtered nights kept in memory (an 8 h LOC/ROC night at 256 Hz is ~120 MB in float64)
+MAX_CACHED_SESSIONS = 2
+
+_FILTERED: OrderedDict[tuple, object] = OrderedDict()
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Filter design and application
+# 1 —————————————————————————————————————————————————————————————————————
+def _cutoffs(l_freq: float, h_freq: float, sfreq: float) -> tuple[float, float]:
+    """-6 dB points of MNE's default ('auto' transition) FIR band-pass for the same band."""
+    l_trans = min(max(l_freq * 0.25, 2.0), l_freq)
+    h_trans = min(max(h_freq * 0.25, 2.0), sfreq / 2.0 - h_freq)
+    return l_freq - l_trans / 2, h_freq + h_trans / 2
+
+
+@lru_cache(maxsize=None)
+def sos_bandpass(l_freq: float, h_freq: float, sfreq: float, order: int = FILTER_ORDER) -> np.ndarray:
+    """
+    Butterworth band-pass as second-order sections, cached per parameters (shared — do not modify).
+
+    Applied forward-backward, a Butterworth is -6 dB at its corners; they are placed where
+    ``raw.filter(l_freq, h_freq)`` has its -6 dB points (0.05 and 33.75 Hz for 0.1–30 Hz),
+    so the pass band matches the MNE filter the stages used before.
+    """
+    return butter(order, _cutoffs(l_freq, h_freq, sfreq), btype="bandpass", fs=sfreq, output="sos")
+
+
+def bandpass(
+        data:   np.ndarray,
+        sfreq:  float,
+        l_freq: float = EOG_BAND[0],
+        h_freq: float = EOG_BAND[1],
+        order:  int = FILTER_ORDER,
+        ) -> np.ndarray:
+    """
+    Zero-phase (forward-backward) band-pass of ``data`` along the last axis.
+
+    Within 1% of ``raw.filter(l_freq, h_freq)`` in the pass band on EOG rates.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        Signal(s), time on the last axis.
+    sfreq : float
+        Sampling frequency in Hz.
+    l_freq, h_freq : float
+        Pass band in Hz. Default is **0.1–30 Hz**.
+    order : int
+        Butterworth order per direction. Default is **6**.
+    """
+    sos = sos_bandpass(float(l_freq), float(h_freq), float(sfreq), order)
+
+    # Pad by two periods of the high-pass corner so its start-up transient stays out of the night
+    padlen = min(data.shape[-1] - 1, int(2 * sfreq / _cutoffs(l_freq, h_freq, sfreq)[0]))
+    return sosfiltfilt(sos, data, axis=-1, padtype="odd", padlen=padlen)
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Filtered LOC/ROC per session
+# 2 —————————————————————————————————————————————————————————————————————
+def filtered_eog(
+        raw,
+        session_key: str | Path,
+        l_freq:      float = EOG_BAND[0],
+        h_freq:      float = EOG_BAND[1],
+        channels:    tuple[str, ...] = ("LOC", "ROC"),
+        ):
+    """
+    Return LOC/ROC of ``raw`` band-passed over the whole night, cached per session and sampling rate.
+
+    The first call for ``(session_key, sfreq, band)`` copies and filters the two channels;
+    later calls (e.g. GSSC staging, then EM detection) get the same object back. The
+    result is shared — callers must ``.copy()`` before cropping or modifying it. Its
+    ``info["highpass"]``/``info["lowpass"]`` are set to the band, as ``raw.filter`` does.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Recording with canonical channel names. Not modified.
+    session_key : str | Path
+        Identifies the night, e.g. the EDF path.
+    l_freq, h_freq : float
+        Pass band in Hz. Default is **0.1–30 Hz**.
+    channels : tuple[str, ...]
+        Channels to keep; set to type EOG. Default is **("LOC", "ROC")**.
+    """
+    sfreq = float(raw.info["sfreq"])
+    key   = (str(session_key), sfreq, float(l_freq), float(h_freq), tuple(channels))
+    if key in _FILTERED:
+        _FILTERED.move_to_end(key)
+        return _FILTERED[key]
+
+    filt = raw.copy().pick(list(channels)).load_data()
+    filt.set_channel_types({ch: "eog" for ch in channels})
+    filt.apply_function(bandpass, picks=list(channels), channel_wise=False,
+                        sfreq=sfreq, l_freq=l_freq, h_freq=h_freq)
+    # Record the band as raw.filter does, so GSSC and later readers of info see filtered data
+    with filt.info._unlock():
+        filt.info["highpass"], filt.info["lowpass"] = float(l_freq), float(h_freq)
+
+    _FILTERED[key] = filt
+    while len(_FILTERED) > MAX_CACHED_SESSIONS:
+        _FILTERED.popitem(last=False)
+    return filt
+
+
+def clear_filter_cache() -> None:
+    """Drop all cached filtered nights (the SOS designs are kept)."""
+    _FILTERED.clear()
@@ -8,6 +8,77 @@
 import numpy as np
 import pandas as pd
 
+# =====================================================================
+# Helpers
+# =====================================================================
+def interval_mask(
+        starts:    np.ndarray,
+        ends:      np.ndarray,
+        n_samples: int,
+        ) -> np.ndarray:
+    """
+    Build a boolean sample mask that is True inside any of the half-open intervals ``[start, end)``.
+
+    Uses a difference array (``np.add.at`` on starts/ends, then ``cumsum``), so the cost is
+    O(n_samples + n_intervals) regardless of how many intervals overlap.
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Interval start sample indices (inclusive). Clamped to ``[0, n_samples]``.
+    ends : np.ndarray
+        Interval end sample indices (exclusive). Clamped to ``[0, n_samples]``.
+    n_samples : int
+        Length of the signal the mask is built for.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask of length ``n_samples``.
+    """
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, n_samples)
+    ends   = np.clip(np.asarray(ends,   dtype=np.int64), 0, n_samples)
+    keep   = starts < ends
+
+    diff = np.zeros(n_samples + 1, dtype=np.int32)
+    np.add.at(diff, starts[keep],  1)
+    np.add.at(diff, ends[keep],   -1)
+    return np.cumsum(diff[:-1]) > 0
+
+
+def mask_signals(mask: np.ndarray, *signals: np.ndarray) -> tuple[np.ndarray, ...]:
+    """
+    Return the signals with samples where ``mask`` is True set to NaN.
+
+    If nothing is masked, floating-point signals are returned as-is (no copy).
+    Otherwise each signal is copied (integer signals promoted to float64, float32 kept) before NaN-filling,
+    so the caller's arrays are never modified.
+
+    Parameters
+    ----------
+    mask : np.ndarray
+        Boolean sample mask, same length as every signal (e.g. from :func:`interval_mask`).
+    *signals : np.ndarray
+        One or more 1-D signals to mask.
+
+    Returns
+    -------
+    tuple[np.ndarray, ...]
+        The masked signals, in the same order.
+    """
+    any_masked = bool(mask.any())
+    out = []
+    for sig in signals:
+        sig = np.asarray(sig)
+        work_dtype = sig.dtype if np.issubdtype(sig.dtype, np.floating) else np.float64
+        if not any_masked:
+            out.append(sig.astype(work_dtype, copy=False))
+            continue
+        sig = sig.astype(work_dtype)
+        sig[mask] = np.nan
+        out.append(sig)
+    return tuple(out)
+
 # =====================================================================
 # Function
 # =====================================================================
@@ -41,9 +112,10 @@ def remove_artefacts(
     df : pd.DataFrame
         The input DataFrame with artefact rows removed and index reset.
     loc_masked : np.ndarray
-        Copy of `loc` with artefact samples set to NaN.
+        Copy of `loc` with artefact samples set to NaN, or `loc` itself if no samples are masked.
+        Floating-point inputs keep their dtype (e.g. float32), integer inputs are promoted to float64.
     roc_masked : np.ndarray
-        Copy of `roc` with artefact samples set to NaN.
+        Copy of `roc` with artefact samples set to NaN, or `roc` itself if no samples are masked.
     """
 
     # --- Validate inputs ---
@@ -68,7 +140,8 @@ def remove_artefacts(
     # --- Handle empty DataFrame gracefully ---
     if df.empty:
         print("Warning: DataFrame is empty — nothing to remove.")
-        return df.copy().reset_index(drop=True), loc.copy().astype(float), roc.copy().astype(float)
+        loc_masked, roc_masked = mask_signals(np.zeros(len(loc), dtype=bool), loc, roc)
+        return df.copy().reset_index(drop=True), loc_masked, roc_masked
     # --- Create amplitude mask (True = clean, False = artefact) ---
     mask = (df["LOCAbsValPeak"] <= amplitude_thresh) & (df['ROCAbsValPeak'] <= amplitude_thresh)
 
@@ -82,24 +155,14 @@ def remove_artefacts(
     # --- Mask raw signals over the full duration of each aretfact event --- 
     # Floor start and ceil end to ensure the full event is captured in the masking, 
     # at the cost of occasionally masking one extra sample at either boundary.
-
-    loc_masked = loc.copy().astype(float)
-    roc_masked = roc.copy().astype(float)
-
-    n_samples = len(loc_masked)
+    # Bounds are clamped to the signal inside interval_mask().
     artefact_events = df.loc[~mask, ['Start', 'End']]
-
-    for _, event in artefact_events.iterrows():
-        start_idx = int(np.floor(event['Start'] * fs))
-        end_idx   = int(np.ceil(event['End'] * fs))
-
-        # Clamp to valid array bounds
-        start_idx = max(0, start_idx)
-        end_idx   = min(n_samples, end_idx)
-
-        loc_masked[start_idx:end_idx] = np.nan
-        roc_masked[start_idx:end_idx] = np.nan
-
+    sample_mask = interval_mask(
+        starts    = np.floor(artefact_events['Start'].to_numpy(dtype=float) * fs),
+        ends      = np.ceil(artefact_events['End'].to_numpy(dtype=float) * fs),
+        n_samples = len(loc),
+        )
+    loc_masked, roc_masked = mask_signals(sample_mask, loc, roc)
 
     return df[mask].reset_index(drop = True), loc_masked, roc_masked 
 
@@ -0,0 +1,134 @@
+# Filename: resample.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Polyphase resampling for the stage conversions (native -> 250 Hz for the EOG CSVs,
+#              native -> 128 Hz for detection). Detects the rational factor up/down between two
+#              rates and caches the anti-aliasing FIR design per (fs_in, fs_out), so every night
+#              at the same rates reuses one filter instead of MNE's FFT resampler on the full night.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import firwin, resample_poly
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Largest up/down factor accepted as "rational" (e.g. 256 -> 250 Hz is 125/128)
+MAX_FACTOR = 1000
+
+# Same design as scipy.signal.resample_poly's default
+FIR_WINDOW   = ("kaiser", 5.0)
+FIR_HALF_LEN = 10   # taps per side, per unit of max(up, down)
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Rational factor and FIR design
+# 1 —————————————————————————————————————————————————————————————————————
+def rational_factors(fs_in: float, fs_out: float, max_factor: int = MAX_FACTOR) -> tuple[int, int]:
+    """
+    Return the smallest integers ``(up, down)`` with ``fs_in * up / down == fs_out``.
+
+    Raises ValueError if the ratio is not rational with factors ``<= max_factor``
+    (e.g. a non-integer rate such as 200.03 Hz).
+    """
+    if fs_in <= 0 or fs_out <= 0:
+        raise ValueError(f"Sampling rates must be positive, got {fs_in} -> {fs_out}")
+
+    ratio = Fraction(fs_out / fs_in).limit_denominator(max_factor)
+    up, down = ratio.numerator, ratio.denominator
+    if up > max_factor or not np.isclose(fs_in * up / down, fs_out, rtol=0, atol=1e-6):
+        raise ValueError(f"No rational factor <= {max_factor} for {fs_in} -> {fs_out} [Hz]")
+    return up, down
+
+
+@lru_cache(maxsize=None)
+def fir_design(fs_in: float, fs_out: float) -> tuple[int, int, np.ndarray]:
+    """
+    Anti-aliasing low-pass FIR for resampling ``fs_in -> fs_out``, cached per rate pair.
+
+    Returns
+    -------
+    up, down : int
+        Rational resampling factor.
+    taps : np.ndarray
+        Read-only filter coefficients (not yet scaled by ``up``; ``resample_poly`` does that).
+    """
+    up, down = rational_factors(fs_in, fs_out)
+    max_rate = max(up, down)
+    taps = firwin(2 * FIR_HALF_LEN * max_rate + 1, 1.0 / max_rate, window=FIR_WINDOW)
+    taps.setflags(write=False)
+    return up, down, taps
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Resample arrays
+# 2 —————————————————————————————————————————————————————————————————————
+def resample_signal(x: np.ndarray, fs_in: float, fs_out: float, axis: int = -1) -> np.ndarray:
+    """
+    Polyphase-resample ``x`` from ``fs_in`` to ``fs_out`` along ``axis``.
+
+    The output has ``round(n * fs_out / fs_in)`` samples, the same length MNE's
+    ``Raw.resample`` produces, so sample indices and epoch counts do not change.
+    Returns ``x`` unchanged when the rates are equal.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Signal(s); float32 input stays float32.
+    fs_in, fs_out : float
+        Input and output sampling frequency in Hz.
+    axis : int
+        Time axis. Default is **-1**.
+    """
+    if fs_in == fs_out:
+        return x
+
+    up, down, taps = fir_design(float(fs_in), float(fs_out))
+    n_out = int(round(x.shape[axis] * up / down))
+    if x.dtype == np.float32:
+        taps = taps.astype(np.float32)
+    y = resample_poly(x, up, down, axis=axis, window=taps)
+    return np.take(y, np.arange(n_out), axis=axis) if y.shape[axis] != n_out else y
+
+
+# 3 —————————————————————————————————————————————————————————————————————
+# 3 Resample an MNE Raw
+# 3 —————————————————————————————————————————————————————————————————————
+def resample_raw(raw, fs_out: float):
+    """
+    Return a new preloaded Raw resampled to ``fs_out`` with :func:`resample_signal`.
+
+    Channel names/types, measurement date and annotations are carried over; the
+    caller's object is not modified. Rates without a rational factor fall back to
+    MNE's FFT resampler. Returns ``raw`` itself when it is already at ``fs_out``.
+    """
+    import mne
+
+    fs_in = raw.info["sfreq"]
+    if fs_in == fs_out:
+        return raw
+    try:
+        fir_design(float(fs_in), float(fs_out))
+    except ValueError as e:
+        print(f"    {e} — using MNE's resampler.")
+        return raw.copy().load_data().resample(fs_out)
+
+    data = resample_signal(raw.get_data(), fs_in, fs_out)
+    info = mne.create_info(raw.ch_names, sfreq=fs_out, ch_types=raw.get_channel_types())
+    out  = mne.io.RawArray(data, info, first_samp=int(round(raw.first_samp * fs_out / fs_in)), verbose=False)
+    out.set_meas_date(raw.info["meas_date"])
+    if len(raw.annotations):
+        out.set_annotations(raw.annotations)
+    return out
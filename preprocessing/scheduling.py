@@ -0,0 +1,125 @@
+# Filename: scheduling.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Longest-expected-first ordering of sessions for run_process. The expected cost of a
+#              session is predicted from its EDF header (duration, sampling rates, channel count,
+#              from the session catalog) with per-stage coefficients fitted on the stage timings
+#              recorded for already processed sessions.
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import heapq
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Cost drivers per session, all proportional to recording length:
+#   duration    — stages that run at a fixed rate (GSSC, 128 Hz detection, merge)
+#   eog_samples — LOC/ROC at the native rate (EDF decode, resample, filter)
+#   all_samples — every channel at the highest rate (MNE fallback reader)
+COST_FEATURES = ["duration", "eog_samples", "all_samples"]
+
+# Relative weights used until enough timings exist (only the resulting order matters)
+PRIOR_COEFS = np.array([1.0, 1.0 / 128, 1.0 / (128 * 64)])
+
+# Sessions with timings needed before a stage's coefficients are fitted
+MIN_HISTORY = 5
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Cost model
+# 1 —————————————————————————————————————————————————————————————————————
+def cost_features(catalog: pd.DataFrame) -> pd.DataFrame:
+    """Cost drivers per catalog row (``COST_FEATURES`` columns, indexed by patient_id)."""
+    duration = pd.to_numeric(catalog["duration"], errors="coerce").fillna(0.0).to_numpy(float)
+    eog_fs   = pd.to_numeric(catalog["eog_sfreq"], errors="coerce").fillna(0.0).to_numpy(float)
+    max_fs   = pd.to_numeric(catalog["max_sfreq"], errors="coerce").fillna(0.0).to_numpy(float)
+    n_ch     = pd.to_numeric(catalog["n_channels"], errors="coerce").fillna(0.0).to_numpy(float)
+    return pd.DataFrame({
+        "duration":    duration,
+        "eog_samples": duration * eog_fs * 2,
+        "all_samples": duration * max_fs * n_ch,
+    }, index=catalog["patient_id"].to_numpy())
+
+
+def fit_stage_costs(catalog: pd.DataFrame, timings: pd.DataFrame,
+                    min_history: int = MIN_HISTORY) -> dict[str, np.ndarray]:
+    """
+    Fit non-negative seconds-per-unit coefficients for each stage from recorded timings.
+
+    Parameters
+    ----------
+    catalog : pd.DataFrame
+        Session catalog (header fields of the timed sessions are looked up here).
+    timings : pd.DataFrame
+        ``patient_id, stage, seconds`` rows, as from ``load_stage_timings``.
+    min_history : int
+        Stages timed on fewer sessions are left out. Default is **5**.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        ``stage -> coefficients`` aligned with ``COST_FEATURES``.
+    """
+    if timings.empty:
+        return {}
+    feats = cost_features(catalog)
+    scale = feats.abs().max().replace(0, 1.0)      # condition the least-squares problem
+
+    coefs = {}
+    for stage, group in timings.groupby("stage"):
+        group = group[group["patient_id"].isin(feats.index)]
+        if group["patient_id"].nunique() < min_history:
+            continue
+        X = (feats.loc[group["patient_id"]] / scale).to_numpy(float)
+        coef, _ = nnls(X, group["seconds"].to_numpy(float))
+        coefs[stage] = coef / scale.to_numpy(float)
+    return coefs
+
+
+def expected_seconds(catalog: pd.DataFrame, timings: pd.DataFrame | None = None) -> pd.Series:
+    """
+    Predicted processing time per session (indexed by patient_id).
+
+    The sum over the fitted stages when timings are available; otherwise the
+    ``PRIOR_COEFS`` weighting of the header-based cost drivers (arbitrary units).
+    """
+    feats = cost_features(catalog).to_numpy(float)
+    coefs = fit_stage_costs(catalog, timings) if timings is not None else {}
+    total = sum(coefs.values()) if coefs else PRIOR_COEFS
+    return pd.Series(feats @ total, index=catalog["patient_id"].to_numpy(), name="expected_s")
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Ordering
+# 2 —————————————————————————————————————————————————————————————————————
+def longest_first(catalog: pd.DataFrame, timings: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Return ``catalog`` sorted by expected processing time, longest first, with an ``expected_s`` column.
+
+    Dispatching the longest sessions first keeps a long recording from being the last job
+    of a parallel batch (longest-processing-time-first scheduling).
+    """
+    expected = expected_seconds(catalog, timings)
+    out = catalog.assign(expected_s=expected.to_numpy())
+    return out.sort_values("expected_s", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def makespan(durations: list[float], workers: int) -> float:
+    """Finish time of ``durations`` dispatched in order to ``workers`` (each job to the first free worker)."""
+    free = [0.0] * max(1, workers)
+    for d in durations:
+        heapq.heapreplace(free, free[0] + d)
+    return max(free)
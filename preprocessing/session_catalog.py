@@ -0,0 +1,352 @@
+# Filename: session_catalog.py
+# Authors: Adam Klovborg & Rasmus Kleffel
+# Description: Persisted session catalog (SQLite) for the raw data root. Records per DCSM_x_y folder
+#              the EDF/CSV/TXT paths, EDF size and header fields (duration, channels, sampling
+#              rates, LOC/ROC rename map) and the lights-off/on times. It is updated incrementally
+#              from directory and file mtimes, so run_process can filter out unusable sessions and order
+#              work by size without opening every EDF on the (network) drive on each run.
+#              A second table keeps the per-stage timings of processed sessions (see scheduling.py).
+
+# NOTE: This pipeline was developed using data from the Danish Center for Sleep Medicine (DCSM).
+#       Some parts may need to be adapted if used with a different dataset or recording system.
+
+# =====================================================================
+# Imports
+# =====================================================================
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from preprocessing.channel_standardization import build_rename_map
+from preprocessing.edf_reader import EOG_CHANNELS, read_edf_header
+from preprocessing.index_file import (
+    CSV_NAME, EDF_NAME, SESSION_RE, TXT_NAME, SessionRecord, parse_lights_txt,
+)
+
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+# Constants
+# – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - – - –
+CATALOG_PATH    = Path("session_catalog.sqlite")
+CATALOG_VERSION = 2     # bump when the columns or their meaning change (forces a rebuild)
+
+# Shortest night the detection accepts (signals are trimmed to a multiple of 2^14 samples at 128 Hz)
+MIN_DURATION_S = 2 ** 14 / 128
+
+# Column name -> SQLite type. JSON columns hold lists/dicts.
+COLUMNS = {
+    "patient_id":     "TEXT PRIMARY KEY",
+    "patient_number": "INTEGER",
+    "session_type":   "TEXT",
+    "folder":         "TEXT",
+    "folder_mtime":   "REAL",
+    "edf_path":       "TEXT",
+    "edf_size":       "INTEGER",
+    "edf_mtime":      "REAL",
+    "csv_path":       "TEXT",
+    "txt_path":       "TEXT",
+    "txt_size":       "INTEGER",
+    "txt_mtime":      "REAL",
+    "start":          "TEXT",     # recording start from the EDF header (ISO)
+    "duration":       "REAL",     # [s]
+    "n_channels":     "INTEGER",
+    "labels":         "TEXT",     # JSON list
+    "sfreqs":         "TEXT",     # JSON list, [Hz] per channel
+    "rename_map":     "TEXT",     # JSON dict, build_rename_map(labels)
+    "has_eog":        "INTEGER",  # LOC and ROC resolved
+    "eog_sfreq":      "REAL",     # native LOC rate [Hz]
+    "max_sfreq":      "REAL",     # highest rate in the file [Hz] (what MNE loads everything at)
+    "lights_off":     "REAL",     # [s]
+    "lights_on":      "REAL",     # [s]
+    "error":          "TEXT",     # why a header/lights file could not be read
+}
+
+# Header fields reused as long as the EDF is unchanged
+_EDF_FIELDS = ["start", "duration", "n_channels", "labels", "sfreqs", "rename_map",
+               "has_eog", "eog_sfreq", "max_sfreq"]
+
+# =====================================================================
+# Functions
+# =====================================================================
+
+# 1 —————————————————————————————————————————————————————————————————————
+# 1 Database helpers
+# 1 —————————————————————————————————————————————————————————————————————
+def _connect(db_path: Path) -> sqlite3.Connection:
+    """Open the catalog and (re)create the schema if it is missing or from another version."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)   # parallel workers record timings concurrently
+    con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    if _get_meta(con, "version") != str(CATALOG_VERSION):
+        con.execute("DROP TABLE IF EXISTS sessions")
+        con.execute("DELETE FROM meta")
+        _set_meta(con, "version", CATALOG_VERSION)
+    cols = ", ".join(f"{name} {sql_type}" for name, sql_type in COLUMNS.items())
+    con.execute(f"CREATE TABLE IF NOT EXISTS sessions ({cols})")
+    # Kept across catalog rebuilds: it only grows with processed sessions
+    con.execute("CREATE TABLE IF NOT EXISTS stage_timings "
+                "(patient_id TEXT, stage TEXT, seconds REAL, recorded_at REAL)")
+    return con
+
+
+def _get_meta(con: sqlite3.Connection, key: str) -> str | None:
+    row = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(con: sqlite3.Connection, key: str, value) -> None:
+    con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def _read_sessions(con: sqlite3.Connection) -> list[dict]:
+    """All stored rows as dicts, NULL as None."""
+    cur = con.execute(f"SELECT {', '.join(COLUMNS)} FROM sessions")
+    return [dict(zip(COLUMNS, values)) for values in cur.fetchall()]
+
+
+def _missing(value) -> bool:
+    return value is None or value == "" or bool(pd.isna(value))
+
+
+# 2 —————————————————————————————————————————————————————————————————————
+# 2 Scan one session folder
+# 2 —————————————————————————————————————————————————————————————————————
+def _stat(path: Path) -> os.stat_result | None:
+    try:
+        return path.stat()
+    except OSError:
+        return None
+
+
+def _files_changed(folder: Path, old: dict) -> bool:
+    """True if the EDF or lights.txt was overwritten in place (size or mtime differ from ``old``)."""
+    for name, size_col, mtime_col in ((EDF_NAME, "edf_size", "edf_mtime"), (TXT_NAME, "txt_size", "txt_mtime")):
+        st  = _stat(folder / name)
+        now = (st.st_size, st.st_mtime) if st else (None, None)
+        if now != (old[size_col], old[mtime_col]):
+            return True
+    return False
+
+
+def _scan_session(folder: Path, folder_mtime: float, old: dict | None) -> dict:
+    """
+    Build the catalog row for one session folder.
+
+    The EDF header is re-read only if the EDF size/mtime changed since ``old``;
+    lights.txt is always re-parsed (it is tiny).
+    """
+    match = SESSION_RE.match(folder.name)
+    edf, csv, txt = folder / EDF_NAME, folder / CSV_NAME, folder / TXT_NAME
+    edf_st, txt_st = _stat(edf), _stat(txt)
+
+    row = {col: None for col in COLUMNS}
+    row.update({
+        "patient_id":     folder.name,
+        "patient_number": int(match.group(1)),
+        "session_type":   match.group(2),
+        "folder":         str(folder),
+        "folder_mtime":   folder_mtime,
+        "edf_path":       str(edf) if edf_st else None,
+        "edf_size":       edf_st.st_size if edf_st else None,
+        "edf_mtime":      edf_st.st_mtime if edf_st else None,
+        "csv_path":       str(csv) if csv.exists() else None,
+        "txt_path":       str(txt) if txt_st else None,
+        "txt_size":       txt_st.st_size if txt_st else None,
+        "txt_mtime":      txt_st.st_mtime if txt_st else None,
+    })
+    errors = []
+
+    # --- 1) EDF header (reused while the file is unchanged) ---
+    if edf_st and old and old["edf_size"] == edf_st.st_size and old["edf_mtime"] == edf_st.st_mtime \
+            and old["duration"] is not None:
+        row.update({k: old[k] for k in _EDF_FIELDS})
+    elif edf_st:
+        try:
+            header = read_edf_header(edf)
+            rename_map = build_rename_map(header.labels)
+            canonical  = [rename_map.get(lab, lab) for lab in header.labels]
+            sfreqs     = [float(f) for f in header.sfreqs]
+            row.update({
+                "start":      header.start.isoformat() if header.start else None,
+                "duration":   float(header.duration),
+                "n_channels": len(header.labels),
+                "labels":     json.dumps(header.labels),
+                "sfreqs":     json.dumps(sfreqs),
+                "rename_map": json.dumps(rename_map),
+                "has_eog":    int(all(ch in canonical for ch in EOG_CHANNELS)),
+                "eog_sfreq":  sfreqs[canonical.index("LOC")] if "LOC" in canonical else None,
+                "max_sfreq":  max(sfreqs) if sfreqs else None,
+            })
+        except (OSError, ValueError) as e:
+            errors.append(f"EDF header: {e}")
+
+    # --- 2) Lights off/on ---
+    if row["txt_path"]:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):   # parse_lights_txt prints per call
+                row["lights_off"], row["lights_on"] = parse_lights_txt(txt)
+        except (OSError, ValueError, RuntimeError, KeyError, pd.errors.ParserError) as e:
+            errors.append(f"lights.txt: {e}")
+
+    row["error"] = "; ".join(errors) or None
+    return row
+
+
+# 3 —————————————————————————————————————————————————————————————————————
+# 3 Build / update the catalog
+# 3 —————————————————————————————————————————————————————————————————————
+def update_catalog(root_dir: str | Path, db_path: str | Path = CATALOG_PATH, rescan: bool = True) -> pd.DataFrame:
+    """
+    Load the session catalog for ``root_dir``, rescanning only what changed.
+
+    The root folder is listed again only when its mtime changed (a session folder was
+    added or removed); each session folder is rescanned only when its own mtime changed
+    (a file in it was added, removed or renamed) or its EDF or lights.txt was overwritten
+    in place (size or mtime changed; two ``stat`` calls per folder). EDF headers are
+    re-read only for EDFs whose size or mtime changed.
+
+    Parameters
+    ----------
+    root_dir : str | Path
+        Root directory with the DCSM_x_y session folders.
+    db_path : str | Path
+        SQLite file. Default is **'session_catalog.sqlite'**.
+    rescan : bool
+        False returns the stored catalog without touching ``root_dir`` at all. Default is **True**.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per session folder (columns as in ``COLUMNS``), sorted by patient and session.
+    """
+    t0 = time.perf_counter()
+    root_dir, db_path = Path(root_dir), Path(db_path)
+    if not root_dir.is_dir():
+        raise FileNotFoundError(f"Root directory not found: {root_dir}")
+
+    with contextlib.closing(_connect(db_path)) as con, con:
+        if _get_meta(con, "root") != str(root_dir.resolve()):
+            con.execute("DELETE FROM sessions")
+            con.execute("DELETE FROM meta WHERE key = 'root_mtime'")
+            _set_meta(con, "root", root_dir.resolve())
+
+        old = {r["patient_id"]: r for r in _read_sessions(con)}
+        if not rescan and old:
+            return pd.DataFrame(list(old.values()), columns=list(COLUMNS)) \
+                     .sort_values(["patient_number", "session_type"]).reset_index(drop=True)
+
+        # --- 1) Session folders: from the catalog unless the root changed ---
+        root_mtime = root_dir.stat().st_mtime
+        if _get_meta(con, "root_mtime") == repr(root_mtime) and old:
+            folders = [Path(r["folder"]) for r in old.values()]
+        else:
+            folders = sorted(Path(e.path) for e in os.scandir(root_dir)
+                             if e.is_dir() and SESSION_RE.match(e.name))
+
+        # --- 2) Rescan folders whose mtime, EDF or lights.txt changed ---
+        rows, changed = [], []
+        for folder in folders:
+            st = _stat(folder)
+            if st is None:
+                continue
+            prev = old.get(folder.name)
+            if prev is not None and prev["folder_mtime"] == st.st_mtime and not _files_changed(folder, prev):
+                rows.append(prev)
+            else:
+                rows.append(_scan_session(folder, st.st_mtime, prev))
+                changed.append(rows[-1])
+
+        # --- 3) Persist ---
+        gone = set(old) - {r["patient_id"] for r in rows}
+        con.executemany("DELETE FROM sessions WHERE patient_id = ?", [(pid,) for pid in gone])
+        con.executemany(
+            f"INSERT OR REPLACE INTO sessions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            [tuple(r[c] for c in COLUMNS) for r in changed],
+        )
+        _set_meta(con, "root_mtime", repr(root_mtime))
+
+    catalog = pd.DataFrame(rows, columns=list(COLUMNS))
+    print(f"Session catalog: {len(catalog)} sessions ({len(changed)} rescanned, {len(gone)} removed) "
+          f"in {(time.perf_counter() - t0) * 1e3:.0f} ms — {db_path}")
+    return catalog.sort_values(["patient_number", "session_type"]).reset_index(drop=True)
+
+
+# 4 —————————————————————————————————————————————————————————————————————
+# 4 Filter and convert
+# 4 —————————————————————————————————————————————————————————————————————
+def unusable_reason(row: pd.Series | dict) -> str | None:
+    """Why a catalog row cannot be processed (None if it can)."""
+    missing = [name for name, col in ((EDF_NAME, "edf_path"), (CSV_NAME, "csv_path"), (TXT_NAME, "txt_path"))
+               if _missing(row[col])]
+    if missing:
+        return f"missing {missing}"
+    if _missing(row["duration"]):
+        return row["error"] if not _missing(row["error"]) else "unreadable EDF header"
+    if not row["has_eog"]:
+        return f"no LOC/ROC in {json.loads(row['labels'])}"
+    if row["duration"] < MIN_DURATION_S:
+        return f"recording too short ({row['duration']:.0f} s)"
+    return None
+
+
+def usable_sessions(catalog: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, str]]:
+    """
+    Split the catalog into processable sessions and the rest.
+
+    Returns
+    -------
+    usable : pd.DataFrame
+        Rows that can be processed.
+    skipped : dict[str, str]
+        ``patient_id -> reason`` for the others.
+    """
+    reasons = {r["patient_id"]: unusable_reason(r) for r in catalog.to_dict("records")}
+    skipped = {pid: why for pid, why in reasons.items() if why}
+    return catalog[~catalog["patient_id"].isin(skipped)].reset_index(drop=True), skipped
+
+
+def catalog_records(catalog: pd.DataFrame) -> list[SessionRecord]:
+    """Convert catalog rows to ``SessionRecord`` objects (in the row order of ``catalog``)."""
+    def _path(value) -> Path | None:
+        return None if _missing(value) else Path(value)
+
+    return [
+        SessionRecord(
+            patient_id=r["patient_id"],
+            patient_number=int(r["patient_number"]),
+            session_type=r["session_type"],
+            folder=Path(r["folder"]),
+            edf_path=_path(r["edf_path"]),
+            csv_path=_path(r["csv_path"]),
+            txt_path=_path(r["txt_path"]),
+        )
+        for r in catalog.to_dict("records")
+    ]
+
+
+# 5 —————————————————————————————————————————————————————————————————————
+# 5 Per-stage timings
+# 5 —————————————————————————————————————————————————————————————————————
+def record_stage_timings(patient_id: str, timings: dict[str, float], db_path: str | Path = CATALOG_PATH) -> None:
+    """Append the wall-clock seconds per stage of one processed session (replaces older entries)."""
+    with contextlib.closing(_connect(Path(db_path))) as con, con:
+        con.execute("DELETE FROM stage_timings WHERE patient_id = ?", (patient_id,))
+        now = time.time()
+        con.executemany("INSERT INTO stage_timings VALUES (?, ?, ?, ?)",
+                        [(patient_id, stage, float(sec), now) for stage, sec in timings.items()])
+
+
+def load_stage_timings(db_path: str | Path = CATALOG_PATH) -> pd.DataFrame:
+    """All recorded timings as ``patient_id, stage, seconds, recorded_at`` (empty if none)."""
+    cols = ["patient_id", "stage", "seconds", "recorded_at"]
+    if not Path(db_path).exists():
+        return pd.DataFrame(columns=cols)
+    with contextlib.closing(_connect(Path(db_path))) as con:
+        return pd.DataFrame(con.execute(f"SELECT {', '.join(cols)} FROM stage_timings").fetchall(), columns=cols)